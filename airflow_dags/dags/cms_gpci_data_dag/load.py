@@ -1,6 +1,7 @@
 from typing import List
 
 from common.utils.load import format_sql_row_item
+from common.utils.reference_version import write_reference_version
 
 from airflow.models import Variable
 from airflow.providers.postgres.hooks.postgres import PostgresHook
@@ -34,3 +35,15 @@ def load_data_to_db(**context) -> None:
     """
 
     hook.run(sql)
+
+
+def write_reference_version_to_db(**context) -> None:
+    """
+    # Write the reference version
+
+    Marks the reference tables as reloaded, the pricer workers then reload their reference caches.
+    """
+    conn_name = Variable.get('cms_gpci_db_conn_name')
+    hook = PostgresHook(postgres_conn_id=conn_name)
+
+    write_reference_version(hook, **context)
@@ -1,6 +1,8 @@
 from airflow.models import Variable
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 
+from common.utils.reference_version import create_reference_version_table_if_not_exists
+
 
 def create_table_if_not_exists() -> None:
     conn_name = Variable.get('cms_gpci_db_conn_name')
@@ -20,3 +22,4 @@ def create_table_if_not_exists() -> None:
         );
     """
     hook.run(create_table_sql)
+    create_reference_version_table_if_not_exists(hook)
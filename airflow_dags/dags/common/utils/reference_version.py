@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+from logging import getLogger
+
+from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+logger = getLogger(__name__)
+
+# Read by the MPFS pricer (REFERENCE_VERSION_TABLE): the workers reload their reference caches when a new row appears
+REFERENCE_VERSION_TABLE = 'internal_reference.reference_version'
+
+
+def create_reference_version_table_if_not_exists(hook: PostgresHook) -> None:
+    create_table_sql = f"""
+        CREATE TABLE IF NOT EXISTS {REFERENCE_VERSION_TABLE} (
+            version   text        NOT NULL,
+            loaded_at timestamptz NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS reference_version_loaded_at_idx ON {REFERENCE_VERSION_TABLE} (loaded_at DESC);
+    """
+    hook.run(create_table_sql)
+
+
+def write_reference_version(hook: PostgresHook, **context) -> str:
+    """
+    Inserts the version row of a load of the reference tables, named after the DAG run that loaded them.
+    """
+    version = f'{context["dag"].dag_id}:{context["run_id"]}:{datetime.now(timezone.utc).isoformat()}'
+
+    logger.info(f'Write reference version {version} to {REFERENCE_VERSION_TABLE}')
+    hook.run(f'INSERT INTO {REFERENCE_VERSION_TABLE} (version) VALUES (%s)', autocommit=True, parameters=(version,))
+
+    return version
@@ -19,6 +19,7 @@ from .extract import extract_metadata_from_csv
 from .extract import get_csv_from_zip
 from .load import create_db_table
 from .load import update_db_table
+from .load import write_reference_version_to_db
 from .load import upload_csv_from_s3_to_postgres
 from .notify import send_slack_failure
 from .notify import send_slack_success
@@ -135,6 +136,12 @@ with DAG(
         doc_md=update_db_table.__doc__,
         provide_context=True,
     )
+    write_reference_version_task = PythonOperator(
+        task_id='write_reference_version_task',
+        python_callable=write_reference_version_to_db,
+        doc_md=write_reference_version_to_db.__doc__,
+        provide_context=True,
+    )
     notify_success_task = PythonOperator(
         task_id='notify_slack_success_task',
         python_callable=send_slack_success,
@@ -191,6 +198,7 @@ with DAG(
             prepare_db_before_uploading_task >>
             upload_csv_from_s3_to_postgres_task >>
             prepare_db_after_uploading_task >>
+            write_reference_version_task >>
             cleanup >>
             dummy_done
     )
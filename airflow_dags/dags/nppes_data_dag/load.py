@@ -19,6 +19,8 @@ from botocore.exceptions import ClientError
 from common.utils.xcom import get_return_value_from_xcom, get_range
 
 from common.utils import get_param
+from common.utils.reference_version import create_reference_version_table_if_not_exists
+from common.utils.reference_version import write_reference_version
 
 logger = getLogger(__name__)
 
@@ -107,6 +109,21 @@ def update_db_table(**context):
     """, autocommit=True)
 
 
+def write_reference_version_to_db(**context):
+    """
+    Marks the providers table as reloaded, the pricer workers then reload their reference caches.
+
+    :param context:
+    :return:
+    """
+
+    conn_name = Variable.get('nppes_data_db_conn')
+    hook = PostgresHook(postgres_conn_id=conn_name)
+
+    create_reference_version_table_if_not_exists(hook)
+    write_reference_version(hook, **context)
+
+
 def get_s3_file_size(s3, bucket: str, key: str) -> int:
     """Gets the file size of S3 object by a HEAD request
 
@@ -11,6 +11,7 @@ from airflow.utils.trigger_rule import TriggerRule
 from common.utils import apply_readme, check_url, clean_up
 from .extract import get_all_download_urls, download_files
 from .load import load_pfs_rvu_to_db
+from .load import write_reference_version_to_db
 from .notify import send_slack_failure
 from .notify import send_slack_success
 from .setup import create_table_if_not_exists
@@ -89,6 +90,12 @@ with DAG(
         python_callable=load_pfs_rvu_to_db,
         doc_md=load_pfs_rvu_to_db.__doc__,
     )
+
+    main__write_reference_version__task = PythonOperator(
+        task_id='main__write_reference_version__task',
+        python_callable=write_reference_version_to_db,
+        doc_md=write_reference_version_to_db.__doc__,
+    )
     # endregion
 
     # region teardown
@@ -121,7 +128,8 @@ with DAG(
         setup__create_table_if_not_exists__task,
         setup__check_target_url__task
     ] >> main__get_all_download_urls__task >> main__download_files__task >> main__get_all_pfs_rvu__task >> \
-    main__load_pfs_rvu_to_db__task >> teardown__cleanup__task >> [
+    main__load_pfs_rvu_to_db__task >> main__write_reference_version__task >> \
+    teardown__cleanup__task >> [
         notify__slack_success__task,
         notify__slack_failure__task
     ]
@@ -0,0 +1,74 @@
+import random
+from typing import List
+
+LINE_COUNTS = (1, 10, 100, 500)
+
+# Codes, modifiers, rendering providers and places of service of each claim mix
+MIXES = {
+    'surgical': {
+        'codes': ['27254', '29807', '15757', '57112', '64451', '43235', '43239'],
+        'mods': ['', '', '', '50', 'LT', 'RT', '80', 'AS', '62', '54', '55', '59'],
+        'npis': ['1659327898', '1659327898', '1700883113'],
+        'places_of_service': ['11', '22', '24'],
+    },
+    'anesthesia': {
+        'codes': ['00100', '00102', '01999', '64451'],
+        'mods': ['', 'AA', 'QX', 'QK', 'QY', 'QZ', 'AD'],
+        'npis': ['1104863638'],
+        'places_of_service': ['21', '22', '24'],
+    },
+    'imaging': {
+        'codes': ['70482', '71045', '74177', '93306', '92004', '97162'],
+        'mods': ['', '', 'TC', '26', '59'],
+        'npis': ['1073640454', '1073640454', '1700883113'],
+        'places_of_service': ['11', '19', '22'],
+    },
+}
+
+SERVICE_DATES = ['09/01/2020', '09/02/2020', '09/03/2020', '10/05/2020']
+
+
+def make_line_item(rng: random.Random, mix: dict, service_date: str) -> dict:
+    mods = [rng.choice(mix['mods']) for _ in range(rng.choice([1, 1, 1, 2]))] + ['', '', '']
+    return {
+        'service_date': service_date,
+        'place_of_service': rng.choice(mix['places_of_service']),
+        'code': rng.choice(mix['codes']),
+        'mod1': mods[0],
+        'mod2': mods[1],
+        'mod3': mods[2],
+        'mod4': mods[3],
+        'charges': f'{rng.uniform(50.0, 3000.0):.2f}',
+        'quantity': str(rng.choice([1, 1, 1, 1, 2]) if rng.random() < 0.5 else rng.randint(1, 60)),
+        'rendering_provider_npi': rng.choice(mix['npis']),
+    }
+
+
+def make_claim(rng: random.Random, mix_name: str, line_count: int, claim_number: str = 'BENCH') -> dict:
+    """
+    Synthetic claim of `line_count` line items of one mix. Large claims span several service dates, the way
+    facility and anesthesia claims do.
+    """
+    mix = MIXES[mix_name]
+    service_dates = SERVICE_DATES[:1 + min(line_count // 10, len(SERVICE_DATES) - 1)]
+    line_items = [make_line_item(rng, mix, rng.choice(service_dates)) for _ in range(line_count)]
+    dates = sorted(line_item['service_date'] for line_item in line_items)
+    return {
+        'claim_number': claim_number,
+        'npi': mix['npis'][0],
+        'service_from': dates[0],
+        'service_to': dates[-1],
+        'line_items': line_items,
+    }
+
+
+def make_claims(seed: int = 2020) -> List[tuple]:
+    """
+    Returns (name, claim) of every benchmarked claim shape, always the same claims for a seed.
+    """
+    rng = random.Random(seed)
+    return [
+        (f'{mix_name}-{line_count}', make_claim(rng, mix_name, line_count))
+        for mix_name in MIXES
+        for line_count in LINE_COUNTS
+    ]
@@ -0,0 +1,125 @@
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+from mpfs_pricer import prefetch
+
+# (work, facility PE, non-facility PE, malpractice, multi_proc, bilat_surg, global days, endoscopic base)
+RVU_VALUES = {
+    # Surgical
+    '27254': (11.87, 9.79, 9.79, 2.35, 2, 1, '090', None),
+    '29807': (14.67, 10.53, 10.53, 2.86, 2, 1, '090', None),
+    '15757': (34.4, 20.26, 20.26, 6.73, 2, 0, '090', None),
+    '57112': (14.65, 8.39, 8.39, 2.04, 2, 0, '090', None),
+    '64451': (1.52, 0.61, 3.6, 0.15, 2, 1, '000', None),
+    '43235': (2.09, 1.11, 5.75, 0.19, 3, 0, '000', '43235'),
+    '43239': (2.39, 1.22, 8.27, 0.22, 3, 0, '000', '43235'),
+    # Imaging
+    '70482': (1.28, 5.08, 5.08, 0.08, 4, 0, 'XXX', None),
+    '71045': (0.18, 0.53, 0.53, 0.01, 0, 0, 'XXX', None),
+    '74177': (1.82, 7.62, 7.62, 0.1, 4, 0, 'XXX', None),
+    '93306': (1.3, 4.41, 4.41, 0.06, 6, 0, 'XXX', None),
+    '92004': (1.82, 0.88, 2.09, 0.06, 7, 0, 'XXX', None),
+    '97162': (1.54, 0.6, 1.57, 0.06, 5, 0, 'XXX', None),
+    # Anesthesia
+    '00100': (0.0, 0.0, 0.0, 0.0, 9, 9, 'XXX', None),
+    '00102': (0.0, 0.0, 0.0, 0.0, 9, 9, 'XXX', None),
+    '01999': (0.0, 0.0, 0.0, 0.0, 9, 9, 'XXX', None),
+}
+
+# Technical and professional components of the imaging codes
+COMPONENT_MODS = {'TC': (0.0, 0.9, 0.9, 0.2), '26': (1.0, 0.1, 0.1, 0.8)}
+
+BASE_UNITS = {'00100': 5, '00102': 6, '01999': 3}
+
+PROVIDERS = {
+    '1659327898': ('99501', '207XS0117X'),  # Orthopaedic surgeon, Alaska
+    '1073640454': ('10001', '2085R0202X'),  # Diagnostic radiologist, Manhattan
+    '1104863638': ('60601', '367500000X'),  # Nurse anesthetist, Chicago
+    '1700883113': ('90012', '363A00000X'),  # Physician assistant, Los Angeles
+}
+
+GPCI = {
+    ('02102', '01'): {'carrier': '02102', 'locality_code': '01',
+                      'locality_name': 'ALASKA', 'pw_gpci': 1.5, 'pe_gpci': 1.081, 'mp_gpci': 0.592},
+    ('13202', '01'): {'carrier': '13202', 'locality_code': '01',
+                      'locality_name': 'MANHATTAN', 'pw_gpci': 1.054, 'pe_gpci': 1.192, 'mp_gpci': 1.748},
+    ('06102', '16'): {'carrier': '06102', 'locality_code': '16',
+                      'locality_name': 'CHICAGO', 'pw_gpci': 1.009, 'pe_gpci': 1.039, 'mp_gpci': 2.097},
+    ('01182', '18'): {'carrier': '01182', 'locality_code': '18',
+                      'locality_name': 'LOS ANGELES', 'pw_gpci': 1.044, 'pe_gpci': 1.191, 'mp_gpci': 0.691},
+}
+
+NCCI_PAIRS = {('27254', '29807'): '1', ('43235', '43239'): '0', ('74177', '71045'): '1'}
+
+
+def get_rvus(cpt: str, mod: str):
+    values = RVU_VALUES.get(cpt)
+    if values is None:
+        return None
+    work_rvu, fac_pe_rvu, nonfac_pe_rvu, mp_rvu, multi_proc, bilat_surg, glob_days, endo_base = values
+
+    if mod in COMPONENT_MODS:
+        if cpt < '70000' or cpt >= '80000':
+            return None
+        work, pe, _, mp = COMPONENT_MODS[mod]
+        work_rvu, fac_pe_rvu, nonfac_pe_rvu, mp_rvu = work_rvu * work, fac_pe_rvu * pe, nonfac_pe_rvu * pe, mp_rvu * mp
+    elif mod != '':
+        return None
+
+    return {
+        'cpt': cpt, 'mod': mod or None, 'work_rvu': work_rvu, 'fac_pe_rvu': fac_pe_rvu,
+        'nonfac_pe_rvu': nonfac_pe_rvu, 'mp_rvu': mp_rvu, 'conv_factor': 32.4085, 'asst_surg': 2, 'co_surg': 1,
+        'team_surg': 1, 'multi_proc': multi_proc, 'bilat_surg': bilat_surg, 'pre_op': 0.1, 'intra_op': 0.8,
+        'post_op': 0.1, 'glob_days': glob_days, 'endo_base': endo_base,
+    }
+
+
+class FakeReferenceStore:
+    """
+    In-memory stand-in for the reference database. It answers the batched lookups of
+    prefetch_claims_reference, so the pricer runs unchanged without a database.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def find_providers_by_npis(self, db, npis, cache=None):
+        self.calls += 1
+        return {npi: PROVIDERS.get(npi, (None, None)) for npi in npis}
+
+    def get_gpci_many(self, db, keys, snapshot=None):
+        self.calls += 1
+        return {key: GPCI.get(key[:2]) for key in keys}
+
+    def get_rvus_many(self, db, keys, snapshot=None):
+        self.calls += 1
+        return {key: get_rvus(key[0], key[1]) for key in keys}
+
+    def get_base_units(self, db, keys, snapshot=None):
+        self.calls += 1
+        return {key: BASE_UNITS.get(key[0]) for key in keys}
+
+    def get_conversion_factors(self, db, keys, snapshot=None):
+        self.calls += 1
+        return {key: 22.0 if key[:2] in GPCI else None for key in keys}
+
+    def get_ncci_many(self, db, keys, snapshot=None):
+        self.calls += 1
+        ncci = {}
+        for key in keys:
+            modifier = NCCI_PAIRS.get(key[:2])
+            ncci[key] = [] if modifier is None else [{
+                'col_1': key[0], 'col_2': key[1], 'effective_date': None, 'deletion_date': None,
+                'modifier': modifier,
+            }]
+        return ncci
+
+    @contextmanager
+    def installed(self):
+        """
+        Serves the reference lookups of the pricer from this store while the context is active.
+        """
+        with ExitStack() as stack:
+            for name in ['find_providers_by_npis', 'get_gpci_many', 'get_rvus_many', 'get_base_units',
+                         'get_conversion_factors', 'get_ncci_many']:
+                stack.enter_context(mock.patch.object(prefetch, name, getattr(self, name)))
+            yield self
@@ -0,0 +1,241 @@
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+from mpfs_pricer import adjustments, claim_schema, pricer
+from mpfs_pricer.line_item import PricedLineItem
+from mpfs_pricer.prefetch import prefetch_claims_reference
+from benchmarks.claims import make_claims
+from benchmarks.reference_store import FakeReferenceStore
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# Every case is timed for about TARGET_SECONDS, within the iteration bounds
+TARGET_SECONDS = 0.5
+MIN_ITERATIONS = 5
+MAX_ITERATIONS = 1000
+
+ALLOCATION_RUNS = 3
+
+# Relative slowdown (or allocation growth) over the baseline reported as a regression
+REGRESSION_TOLERANCE = 0.25
+
+# Stands for the reference database connection, lookups are served by the FakeReferenceStore
+FAKE_DB = object()
+
+
+class Case:
+    def __init__(self, name: str, line_count: int, fn: Callable, make_args: Callable[[], tuple] = tuple):
+        self.name = name
+        self.line_count = line_count
+        self.fn = fn
+        self.make_args = make_args
+
+
+def copy_line_items(line_items: List[PricedLineItem]) -> List[PricedLineItem]:
+    return [PricedLineItem(**line_item.to_dict()) for line_item in line_items]
+
+
+def get_service_dates_args(line_items: List[PricedLineItem]) -> Callable[[], tuple]:
+    return lambda: (list(adjustments.group_by_service_date(copy_line_items(line_items)).values()),)
+
+
+def perform_line_adjustments(line_items: List[PricedLineItem], ncci_info: List[List[dict]]):
+    for data_item_index, line_item in enumerate(line_items):
+        adjustments.perform_adjustments(line_item, data_item_index, ncci_info)
+
+
+def perform_bilateral_surgery(service_dates: List[adjustments.ServiceDateLineItems]):
+    for service_date_line_items in service_dates:
+        adjustments.perform_adjustments_bilateral_surgery(service_date_line_items.line_items)
+
+
+def perform_multiple_procedures(service_dates: List[adjustments.ServiceDateLineItems]):
+    for service_date_line_items in service_dates:
+        adjustments.perform_adjustments_multiple(service_date_line_items)
+
+
+def perform_anesthesia_pricing(service_dates: List[adjustments.ServiceDateLineItems]):
+    for service_date_line_items in service_dates:
+        adjustments.perform_adjustments_anesthesia_pricing(service_date_line_items.line_items)
+
+
+def get_cases(shape: str, claim: dict) -> List[Case]:
+    """
+    Benchmarks of one claim shape: the whole pricing, pricing from prefetched reference data, every
+    adjustment pass on its own and the decoding and encoding of the claim in a /price_claim/ request.
+    """
+    line_count = len(claim['line_items'])
+    # Claims are validated when the payload is decoded (the decode_claims case), the pricer reads them as they are
+    validated_claim = claim_schema.validate_claims([claim])[0]
+    reference = prefetch_claims_reference(FAKE_DB, [claim['line_items']])
+    data, ncci_info = pricer.price_claim_prepare(validated_claim, reference)
+    # Line items as priced_claim_get passes them to the claim level adjustments
+    line_items = [pricer.price_line_item_get(data_item, data_item_index, ncci_info)
+                  for data_item_index, data_item in enumerate(data)]
+    payload = claim_schema.dumps([claim])
+    response = {"result": [pricer.priced_claim_to_dict(pricer.price_claim(claim, FAKE_DB))]}
+
+    return [
+        Case(f'price_claim/{shape}', line_count, lambda: pricer.price_claim(validated_claim, FAKE_DB)),
+        Case(f'price_claim_get/{shape}', line_count, lambda: pricer.price_claim_get(validated_claim, data, ncci_info)),
+        Case(f'line_adjustments/{shape}', line_count, perform_line_adjustments,
+             lambda: (copy_line_items(line_items), ncci_info)),
+        Case(f'claim_adjustments/{shape}', line_count, adjustments.perform_claim_adjustments,
+             lambda: (copy_line_items(line_items),)),
+        Case(f'bilateral_surgery/{shape}', line_count, perform_bilateral_surgery, get_service_dates_args(line_items)),
+        Case(f'multiple_procedures/{shape}', line_count, perform_multiple_procedures,
+             get_service_dates_args(line_items)),
+        Case(f'anesthesia_pricing/{shape}', line_count, perform_anesthesia_pricing,
+             get_service_dates_args(line_items)),
+        Case(f'decode_claims/{shape}', line_count, claim_schema.decode_claims, lambda: (payload,)),
+        Case(f'encode_response/{shape}', line_count, claim_schema.dumps, lambda: (response,)),
+    ]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def time_case(case: Case, iterations: int = None) -> List[int]:
+    args = case.make_args()
+    start = time.perf_counter_ns()
+    case.fn(*args)
+    first = time.perf_counter_ns() - start
+    if iterations is None:
+        iterations = min(max(int(TARGET_SECONDS * 1e9 / max(first, 1)), MIN_ITERATIONS), MAX_ITERATIONS)
+
+    gc.collect()
+    timings = []
+    for _ in range(iterations):
+        args = case.make_args()
+        start = time.perf_counter_ns()
+        case.fn(*args)
+        timings.append(time.perf_counter_ns() - start)
+    return timings
+
+
+def measure_allocations(case: Case) -> int:
+    """
+    Median over ALLOCATION_RUNS of the peak memory allocated by one call, in bytes.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOCATION_RUNS):
+            args = case.make_args()
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            case.fn(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    finally:
+        tracemalloc.stop()
+    return sorted(peaks)[len(peaks) // 2]
+
+
+def run_case(case: Case, iterations: int = None) -> dict:
+    timings = sorted(time_case(case, iterations))
+    total_seconds = sum(timings) / 1e9
+    return {
+        'iterations': len(timings),
+        'p50_us': percentile(timings, 0.5) / 1e3,
+        'p90_us': percentile(timings, 0.9) / 1e3,
+        'p99_us': percentile(timings, 0.99) / 1e3,
+        'lines_per_second': case.line_count * len(timings) / total_seconds,
+        'peak_kib': measure_allocations(case) / 1024,
+    }
+
+
+def run(name_filter: str = '', iterations: int = None) -> dict:
+    results = {}
+    with FakeReferenceStore().installed():
+        for shape, claim in make_claims():
+            for case in get_cases(shape, claim):
+                if name_filter in case.name:
+                    results[case.name] = run_case(case, iterations)
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> dict:
+    """
+    Returns the cases whose median latency or peak allocations grew more than `tolerance` over the baseline.
+    """
+    regressions = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        changes = [
+            f'{metric} {base[metric]:.1f} -> {result[metric]:.1f}'
+            for metric in ['p50_us', 'peak_kib']
+            if result[metric] > base[metric] * (1 + tolerance)
+        ]
+        if changes:
+            regressions[name] = ', '.join(changes)
+    return regressions
+
+
+def print_results(results: dict, baseline: dict, regressions: dict):
+    print(f"{'case':<40} {'iter':>6} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'lines/s':>11} "
+          f"{'peak KiB':>9} {'vs base':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = f"{result['p50_us'] / base['p50_us'] - 1:+.0%}" if base else ''
+        print(f"{name:<40} {result['iterations']:>6} {result['p50_us']:>10.1f} {result['p90_us']:>10.1f} "
+              f"{result['p99_us']:>10.1f} {result['lines_per_second']:>11.0f} {result['peak_kib']:>9.1f} "
+              f"{change:>8}{' REGRESSION' if name in regressions else ''}")
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path: Path, results: dict):
+    with open(path, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'results': {
+                name: {metric: round(value, 3) for metric, value in result.items()} for name, result in results.items()
+            },
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the pricing hot path against an in-memory reference store.")
+    parser.add_argument('--filter', default='', help="only run the cases whose name contains this text")
+    parser.add_argument('--iterations', type=int, help="iterations per case, by default each case runs ~0.5s")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument('--check', action='store_true', help="exit with status 1 when a case regressed")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    results = run(args.filter, args.iterations)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    print_results(results, baseline, regressions)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, {**baseline, **results})
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.baseline}:")
+        for name, change in regressions.items():
+            print(f"  {name}: {change}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -31,4 +31,4 @@ claims = [
 
 for claim in claims:
     result = pricer.price_claim(claim)
-    print(json.dumps(result, indent=2))
+    print(json.dumps(pricer.priced_claim_to_dict(result), indent=2))
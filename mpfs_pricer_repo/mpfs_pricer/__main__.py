@@ -0,0 +1,25 @@
+import argparse
+import logging
+from mpfs_pricer import bulk
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mpfs_pricer",
+        description="Prices the claims of a CSV, NDJSON or Parquet file into a CSV or Parquet file of priced line items.",
+    )
+    parser.add_argument("input", help="claims file (.csv, .ndjson or .parquet)")
+    parser.add_argument("output", help="priced line items file (.csv or .parquet)")
+    parser.add_argument("--input-format", choices=sorted(bulk.READERS), help="defaults to the input file extension")
+    parser.add_argument("--output-format", choices=sorted(bulk.WRITERS), help="defaults to the output file extension")
+    parser.add_argument("--processes", type=int, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument("--chunk-size", type=int, default=bulk.BULK_CHUNK_SIZE, help="claims priced together")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    bulk.price_file(args.input, args.output, args.input_format, args.output_format, args.processes, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from typing import List, Dict, Iterator, Callable
+from typing import List, Dict, Iterable, Iterator
+from mpfs_pricer import metrics
+from mpfs_pricer.line_item import PricedLineItem
 
 adjust_physician_assistant_multiplier = {
     0: 0.16 * 0.85,
@@ -19,8 +21,8 @@ def adjust_physician_assistant(line_item_payment_details):
     # - Physician Assistant at Surgery: 16% of 85% of MPFS allowed
     #     - Identified with Modifier (AS)
     return {
-        "multiplier": adjust_physician_assistant_multiplier[line_item_payment_details["asst_surg"]],
-        "comment": adjust_physician_assistant_comment[line_item_payment_details["asst_surg"]]
+        "multiplier": adjust_physician_assistant_multiplier[line_item_payment_details.asst_surg],
+        "comment": adjust_physician_assistant_comment[line_item_payment_details.asst_surg]
     }
 
 
@@ -42,8 +44,8 @@ adjust_assistant_at_surgery_comment = {
 def adjust_assistant_at_surgery(line_item_payment_details):
     # - Assistant at Surgery Services: Modifiers 80, 81, 82 will be appended to the HCPCS code. Payment is calculated at 16% of the fee schedule allowable
     return {
-        "multiplier": adjust_assistant_at_surgery_multiplier[line_item_payment_details["asst_surg"]],
-        "comment": adjust_assistant_at_surgery_comment[line_item_payment_details["asst_surg"]]
+        "multiplier": adjust_assistant_at_surgery_multiplier[line_item_payment_details.asst_surg],
+        "comment": adjust_assistant_at_surgery_comment[line_item_payment_details.asst_surg]
     }
 
 
@@ -65,8 +67,8 @@ adjust_co_surgeons_comment = {
 def adjust_co_surgeons(line_item_payment_details):
     # - Modifier 62: Co-surgeons. If payable, 62.5% of MPFS allowable
     return {
-        "multiplier": adjust_co_surgeons_multiplier[line_item_payment_details["co_surg"]],
-        "comment": adjust_co_surgeons_comment[line_item_payment_details["co_surg"]]
+        "multiplier": adjust_co_surgeons_multiplier[line_item_payment_details.co_surg],
+        "comment": adjust_co_surgeons_comment[line_item_payment_details.co_surg]
     }
 
 
@@ -88,8 +90,8 @@ adjust_team_surgeons_comment = {
 def adjust_team_surgeons(line_item_payment_details):
     # - Team Surgery (Modifier 66)
     return {
-        "multiplier": adjust_team_surgeons_multiplier[line_item_payment_details["team_surg"]],
-        "comment": adjust_team_surgeons_comment[line_item_payment_details["team_surg"]]
+        "multiplier": adjust_team_surgeons_multiplier[line_item_payment_details.team_surg],
+        "comment": adjust_team_surgeons_comment[line_item_payment_details.team_surg]
     }
 
 
@@ -165,14 +167,14 @@ def adjust_crna_mod_qy(line_item_payment_details):
 
 def adjust_bilateral_surgery_mod_50(line_item_payment_details):
     return {
-        "multiplier": 1.50 if line_item_payment_details["bilat_surg"] == 1 else 1.00,
+        "multiplier": 1.50 if line_item_payment_details.bilat_surg == 1 else 1.00,
         "comment": "Bilateral surgery: Final payment is the lower of the total submitted charge or 150% of the fee schedule amount for a single code."
     }
 
 
 def adjust_bilateral_surgery_2_units(line_item_payment_details):
     return {
-        "multiplier": 1.50 / 2 if line_item_payment_details["bilat_surg"] == 1 else 1.00,
+        "multiplier": 1.50 / 2 if line_item_payment_details.bilat_surg == 1 else 1.00,
         "comment": "Bilateral surgery: Final payment is the lower of the total submitted charge or 150% of the fee schedule amount for a single code."
     }
 
@@ -181,7 +183,7 @@ def adjust_surgical_care_only(line_item_payment_details):
     # - Modifier 54: Surgical care only
     #       Action: Multiply the MPFS allowable by the sum of pre- and intra-operative percentages
     return {
-        "multiplier": line_item_payment_details["pre_op"] + line_item_payment_details["intra_op"],
+        "multiplier": line_item_payment_details.pre_op + line_item_payment_details.intra_op,
         "comment": "Surgical care only: Multiply the MPFS allowable by the sum of pre- and intra-operative percentages"
     }
 
@@ -190,7 +192,7 @@ def adjust_post_op_care_only(line_item_payment_details):
     # - Modifier 55: Post op care only
     #       Action: Multiply MPFS allowable by post-operative percentage (from RVU table) divided by 90. Multiply result by number of days provider provided post-op care
     return {
-        "multiplier": line_item_payment_details["post_op"] / 90,
+        "multiplier": line_item_payment_details.post_op / 90,
         "comment": "Post op care only: Multiply MPFS allowable by post-operative percentage (from RVU table) divided by 90. Multiply result by number of days provider provided post-op care"
     }
 
@@ -198,17 +200,17 @@ def adjust_post_op_care_only(line_item_payment_details):
 def find_adjustments_taxonomy_codes(line_item_payment_details):
     adjustments = []
 
-    if line_item_payment_details["provider_taxonomy_code"] in ['175M00000X', '176B00000X', '367A00000X']:
+    if line_item_payment_details.provider_taxonomy_code in ['175M00000X', '176B00000X', '367A00000X']:
         # - Certified Nurse-Midwife: Payment is made at the lesser of 80% of the actual charge or 100% of MPFS
         #     - Identification of Nurse Midwives can be done through Taxonomy Code
         adjustments.append(adjust_taxonomy_code_nurse_midwife(line_item_payment_details))
 
-    if line_item_payment_details["provider_taxonomy_code"] in ['104100000X', '1041C0700X', '1041S0200X']:
+    if line_item_payment_details.provider_taxonomy_code in ['104100000X', '1041C0700X', '1041S0200X']:
         # - Licensed Clinical Social Worker: Allowed at 75% of MPFS
         #     - Identification of this provider type can be done through Taxonomy Code
         adjustments.append(adjust_taxonomy_code_licensed_clinical_social_worker(line_item_payment_details))
 
-    if line_item_payment_details["provider_taxonomy_code"] in [
+    if line_item_payment_details.provider_taxonomy_code in [
         '363L00000X', '363LA2100X', '363LA2200X', '363LC1500X', '363LC0200X', '363LF0000X', '363LG0600X', '363LN0000X',
         '363LN0005X', '363LX0001X', '363LX0106X', '363LP0200X', '363LP0222X', '363LP1700X', '363LP2300X', '363LP0808X',
         '363LS0200X', '363LW0102X',
@@ -223,7 +225,7 @@ def find_adjustments_taxonomy_codes(line_item_payment_details):
         #     - Identification of this provider type can be done through Taxonomy Code
         adjustments.append(adjust_taxonomy_code_nurse_practitioners(line_item_payment_details))
 
-    if line_item_payment_details["provider_taxonomy_code"] in [
+    if line_item_payment_details.provider_taxonomy_code in [
         '133N00000X', '133NN1002X',
         '133V00000X', '133VN1101X', '133VN1006X', '133VN1201X', '133VN1301X', '133VN1004X', '133VN1401X', '133VN1005X',
         '133VN1501X'
@@ -232,7 +234,7 @@ def find_adjustments_taxonomy_codes(line_item_payment_details):
         #     - Identification of this provider type can be done through Taxonomy Code
         adjustments.append(adjust_taxonomy_code_nutrition_and_dietician(line_item_payment_details))
 
-    if line_item_payment_details["provider_taxonomy_code"] in ['363A00000X', '363AM0700X', '363AS0400X']:
+    if line_item_payment_details.provider_taxonomy_code in ['363A00000X', '363AM0700X', '363AS0400X']:
         # - Physician Assistant Services: Reimbursement can occur in all POS settings as long as no facility charges are paid in connection with the service. Payment is lesser of 80% of submitted charge or 85% of MPFS
         adjustments.append(adjust_taxonomy_code_physician_assistant(line_item_payment_details))
 
@@ -260,21 +262,16 @@ def find_adjustments_bilateral_surgery(line_item_payment_details, mods):
         # - Modifier 50: Bilateral surgery
         adjustments.append(adjust_bilateral_surgery_mod_50(line_item_payment_details))
 
-    if line_item_payment_details["quantity"] == 2:
+    if line_item_payment_details.quantity == 2:
         # - 2 units: Bilateral surgery
         adjustments.append(adjust_bilateral_surgery_2_units(line_item_payment_details))
 
     return adjustments
 
 
-def perform_adjustments(line_item_payment_details: dict, data_item_index: int, ncci_info: List[List[dict]]):
+def perform_adjustments(line_item_payment_details: PricedLineItem, data_item_index: int, ncci_info: List[List[dict]]):
     adjustments = []
-    mods = [
-        line_item_payment_details["mod1"],
-        line_item_payment_details["mod2"],
-        line_item_payment_details["mod3"],
-        line_item_payment_details["mod4"],
-    ]
+    mods = line_item_payment_details.mods
 
     if "AS" in mods:
         # - Physician Assistant at Surgery: 16% of 85% of MPFS allowed
@@ -331,130 +328,144 @@ def perform_adjustments(line_item_payment_details: dict, data_item_index: int, n
     [adjustments.append(adjustment) for adjustment in
      find_adjustments_bilateral_surgery(line_item_payment_details, mods)]
 
-    charges = float(line_item_payment_details["charges"])
+    charges = float(line_item_payment_details.charges)
     # update with minimal adjustment multiplier
     if len(adjustments) > 0:
         adjustment = min(adjustments,
-                         key=lambda a: min(a["multiplier"] * line_item_payment_details["line_item_payment"],
+                         key=lambda a: min(a["multiplier"] * line_item_payment_details.line_item_payment,
                                            a.get("charges_multiplier", 1.00) * charges))
         if adjustment:
-            line_item_payment_details["line_item_payment"] = min(
-                adjustment["multiplier"] * line_item_payment_details["line_item_payment"],
+            line_item_payment_details.line_item_payment = min(
+                adjustment["multiplier"] * line_item_payment_details.line_item_payment,
                 adjustment.get("charges_multiplier", 1.00) * charges)
-            line_item_payment_details["comments"].append(adjustment["comment"])
+            line_item_payment_details.comments.append(adjustment["comment"])
 
     # compare calculated price with actual charges
-    if line_item_payment_details["line_item_payment"] > charges:
-        line_item_payment_details["line_item_payment"] = charges
+    if line_item_payment_details.line_item_payment > charges:
+        line_item_payment_details.line_item_payment = charges
 
     return line_item_payment_details
 
 
-def group_by_key(key_field: str, line_item_list: Iterator[dict]) -> Dict[str, List[dict]]:
+def group_by_key(key_field: str, line_item_list: Iterator[PricedLineItem]) -> Dict[str, List[PricedLineItem]]:
     result = {}
     for line_item in line_item_list:
-        key = line_item[key_field]
+        key = getattr(line_item, key_field)
         data = result.get(key)
         if not data:
             result[key] = [line_item]
         else:
             data.append(line_item)
     for key in result:
-        result[key] = sorted(result[key], key=lambda item: item["line_item_payment"], reverse=True)
+        result[key] = sort_by_payment(result[key])
     return result
 
 
-def group_by_date(multi_proc: int, line_item_list: List[dict], func: Callable[[dict], bool] = lambda item: True) -> \
-        Dict[str, List[dict]]:
-    return group_by_key("service_date",
-                        filter(lambda item: item["multi_proc"] == multi_proc and func(item), line_item_list))
+def sort_by_payment(line_item_list: Iterable[PricedLineItem]) -> List[PricedLineItem]:
+    return sorted(line_item_list, key=lambda item: item.line_item_payment, reverse=True)
 
 
-def perform_adjustments_multiple_2(line_item_list: List[dict]):
-    for line_items in group_by_key("service_date",
-                                   filter(lambda item: item["multi_proc"] in [2, 3], line_item_list)).values():
-        data_2 = []
-        data_3 = []
-        for line_item in line_items:
-            if line_item["multi_proc"] == 2:
-                data_2.append([line_item])
-            else:
-                data_3.append(line_item)
-        data = sorted(data_2 + [*group_by_key("endo_base", data_3).values()],
-                      key=lambda items: sum(row["line_item_payment"] for row in items), reverse=True)
-        if len(data) > 1:
-            for item_row in data[1]:
-                item_row["line_item_payment"] *= 0.5
-            if len(data) > 2:
-                for item_rows in data[2:]:
-                    for item_row in item_rows:
-                        item_row["line_item_payment"] *= 0.25
-
-
-def perform_adjustments_multiple_3(line_item_list: List[dict]):
-    for line_items in group_by_date(3, line_item_list).values():
-        for grouped_line_items in group_by_key("endo_base", line_items).values():
-            if len(grouped_line_items) > 1:
-                grouped_line_items[1]["line_item_payment"] *= 0.5
-                if len(grouped_line_items) > 2:
-                    for line_item in grouped_line_items[2:]:
-                        line_item["line_item_payment"] *= 0.25
-
-
-def perform_adjustments_multiple_4(line_item_list: List[dict]):
-    for line_items in group_by_date(4, line_item_list, lambda item: "TC" in [item["mod1"], item["mod2"], item["mod3"],
-                                                                             item["mod4"]]).values():
-        if len(line_items) > 1:
-            for line_item in line_items[1:]:
-                line_item["line_item_payment"] *= 0.5
+class ServiceDateLineItems:
+    """
+    Line items of a claim performed on one service date, in claim order, with a bucket per multiple procedure
+    indicator. Every claim level rule only compares line items of the same service date.
+    """
 
+    __slots__ = ("line_items", "multi_proc")
 
-def perform_adjustments_multiple_5(line_item_list: List[dict]):
-    for line_items in group_by_date(5, line_item_list).values():
-        for line_item in line_items:
-            line_item["line_item_payment"] *= 0.5
+    def __init__(self):
+        self.line_items = []
+        self.multi_proc = {}
 
+    def add(self, line_item: PricedLineItem):
+        self.line_items.append(line_item)
+        self.multi_proc.setdefault(line_item.multi_proc, []).append(line_item)
 
-def perform_adjustments_multiple_6(line_item_list: List[dict]):
-    for line_items in group_by_date(6, line_item_list).values():
-        if len(line_items) > 1:
-            for line_item in line_items[1:]:
-                line_item["line_item_payment"] *= 0.75
+    def get_multi_proc(self, multi_proc: int) -> List[PricedLineItem]:
+        return self.multi_proc.get(multi_proc, [])
 
 
-def perform_adjustments_multiple_7(line_item_list: List[dict]):
-    for line_items in group_by_date(7, line_item_list, lambda item: "TC" in [item["mod1"], item["mod2"], item["mod3"],
-                                                                             item["mod4"]]).values():
-        if len(line_items) > 1:
-            for line_item in line_items[1:]:
-                line_item["line_item_payment"] *= 0.8
+def group_by_service_date(line_item_list: List[PricedLineItem]) -> Dict[str, ServiceDateLineItems]:
+    result = {}
+    for line_item in line_item_list:
+        service_date_line_items = result.get(line_item.service_date)
+        if service_date_line_items is None:
+            service_date_line_items = result[line_item.service_date] = ServiceDateLineItems()
+        service_date_line_items.add(line_item)
+    return result
+
+
+def perform_adjustments_multiple_2(service_date_line_items: ServiceDateLineItems):
+    line_items = sort_by_payment(item for item in service_date_line_items.line_items if item.multi_proc in [2, 3])
+    data_2 = []
+    data_3 = []
+    for line_item in line_items:
+        if line_item.multi_proc == 2:
+            data_2.append([line_item])
+        else:
+            data_3.append(line_item)
+    data = sorted(data_2 + [*group_by_key("endo_base", data_3).values()],
+                  key=lambda items: sum(row.line_item_payment for row in items), reverse=True)
+    if len(data) > 1:
+        for item_row in data[1]:
+            item_row.line_item_payment *= 0.5
+        if len(data) > 2:
+            for item_rows in data[2:]:
+                for item_row in item_rows:
+                    item_row.line_item_payment *= 0.25
+
+
+def perform_adjustments_multiple_3(service_date_line_items: ServiceDateLineItems):
+    for grouped_line_items in group_by_key("endo_base", service_date_line_items.get_multi_proc(3)).values():
+        if len(grouped_line_items) > 1:
+            grouped_line_items[1].line_item_payment *= 0.5
+            if len(grouped_line_items) > 2:
+                for line_item in grouped_line_items[2:]:
+                    line_item.line_item_payment *= 0.25
 
 
-def perform_adjustments_multiple(line_item_list: List[dict]):
-    if len(line_item_list) < 2:
-        return
+def perform_adjustments_multiple_4(service_date_line_items: ServiceDateLineItems):
+    line_items = sort_by_payment(item for item in service_date_line_items.get_multi_proc(4) if "TC" in item.mods)
+    for line_item in line_items[1:]:
+        line_item.line_item_payment *= 0.5
+
+
+def perform_adjustments_multiple_5(service_date_line_items: ServiceDateLineItems):
+    for line_item in service_date_line_items.get_multi_proc(5):
+        line_item.line_item_payment *= 0.5
+
+
+def perform_adjustments_multiple_6(service_date_line_items: ServiceDateLineItems):
+    line_items = sort_by_payment(service_date_line_items.get_multi_proc(6))
+    for line_item in line_items[1:]:
+        line_item.line_item_payment *= 0.75
+
+
+def perform_adjustments_multiple_7(service_date_line_items: ServiceDateLineItems):
+    line_items = sort_by_payment(item for item in service_date_line_items.get_multi_proc(7) if "TC" in item.mods)
+    for line_item in line_items[1:]:
+        line_item.line_item_payment *= 0.8
+
+
+@metrics.timed(metrics.STAGE_MULTIPLE_PROCEDURES)
+def perform_adjustments_multiple(service_date_line_items: ServiceDateLineItems):
     # Run adjustment for multi_proc=3 before multi_proc=2
-    perform_adjustments_multiple_3(line_item_list)
+    perform_adjustments_multiple_3(service_date_line_items)
     # Run adjustment for multi_proc=2 including groups of multi_proc=3
-    perform_adjustments_multiple_2(line_item_list)
+    perform_adjustments_multiple_2(service_date_line_items)
     # Run adjustment for other multi_proc values
-    perform_adjustments_multiple_4(line_item_list)
-    perform_adjustments_multiple_5(line_item_list)
-    perform_adjustments_multiple_6(line_item_list)
-    perform_adjustments_multiple_7(line_item_list)
+    perform_adjustments_multiple_4(service_date_line_items)
+    perform_adjustments_multiple_5(service_date_line_items)
+    perform_adjustments_multiple_6(service_date_line_items)
+    perform_adjustments_multiple_7(service_date_line_items)
 
 
-def group_by_date_cpt(line_item_list: List[dict]) -> Dict[str, List[dict]]:
+def group_by_date_cpt(line_item_list: List[PricedLineItem]) -> Dict[str, List[PricedLineItem]]:
     result = {}
     for line_item in line_item_list:
-        mods = [
-            line_item["mod1"],
-            line_item["mod2"],
-            line_item["mod3"],
-            line_item["mod4"],
-        ]
-        if line_item["bilat_surg"] == 1 and ("LT" in mods or "RT" in mods):
-            key = line_item["service_date"] + "_" + line_item["code"]
+        mods = line_item.mods
+        if line_item.bilat_surg == 1 and ("LT" in mods or "RT" in mods):
+            key = line_item.service_date + "_" + line_item.code
             data = result.get(key)
             if not data:
                 result[key] = [line_item]
@@ -463,32 +474,34 @@ def group_by_date_cpt(line_item_list: List[dict]) -> Dict[str, List[dict]]:
     for key in result:
         result[key] = result[key] if len(
             list(
-                filter(lambda item: "LT" in [item["mod1"], item["mod2"], item["mod2"], item["mod2"]],
+                filter(lambda item: "LT" in [item.mod1, item.mod2, item.mod2, item.mod2],
                        result[key]))) == 1 and len(
             list(
-                filter(lambda item: "RT" in [item["mod1"], item["mod2"], item["mod2"], item["mod2"]],
+                filter(lambda item: "RT" in [item.mod1, item.mod2, item.mod2, item.mod2],
                        result[key]))) == 1 else []
     return result
 
 
-def perform_adjustments_bilateral_surgery(line_item_list: List[dict]):
+@metrics.timed(metrics.STAGE_BILATERAL_SURGERY)
+def perform_adjustments_bilateral_surgery(line_item_list: List[PricedLineItem]):
     for line_items in group_by_date_cpt(line_item_list).values():
         if len(line_items) > 1:
             for line_item in line_items:
-                line_item["line_item_payment"] *= 0.75
+                line_item.line_item_payment *= 0.75
     return
 
 
-def perform_adjustments_anesthesia_pricing(line_item_list: List[dict]) -> None:
+@metrics.timed(metrics.STAGE_ANESTHESIA_PRICING)
+def perform_adjustments_anesthesia_pricing(line_item_list: List[PricedLineItem]) -> None:
     for line_items in group_by_key("service_date",
-                                   filter(lambda item: "00100" <= item["code"] <= "01999", line_item_list)).values():
+                                   filter(lambda item: "00100" <= item.code <= "01999", line_item_list)).values():
         max_anes_base_unit = 0
         sum_units = 0
 
         line_items_AD_count = len(
             list(
                 filter(
-                    lambda item: 'AD' in [item['mod1'], item['mod2'], item['mod3'], item['mod4']],
+                    lambda item: 'AD' in item.mods,
                     line_items
                 )
             )
@@ -496,45 +509,60 @@ def perform_adjustments_anesthesia_pricing(line_item_list: List[dict]) -> None:
 
         for line_item in line_items:
             # If modifier = AD and more than 4 procedures are performed set Base Units = 3
-            anes_base_unit = 3 if line_items_AD_count > 4 else line_item["anes_base_unit"]
+            anes_base_unit = 3 if line_items_AD_count > 4 else line_item.anes_base_unit
 
             max_anes_base_unit = max(max_anes_base_unit, anes_base_unit)
-            sum_units += line_item["quantity"]
+            sum_units += line_item.quantity
 
         for line_item in line_items:
-            line_item["line_item_payment"] = (max_anes_base_unit + sum_units / 15) * line_item["anes_conversion_factor"]
+            line_item.line_item_payment = (max_anes_base_unit + sum_units / 15) * line_item.anes_conversion_factor
 
-            mods = [line_item['mod1'], line_item['mod2'], line_item['mod3'], line_item['mod4']]
+            mods = line_item.mods
 
             if any(x in mods for x in ['QZ', 'AA']):
                 continue
 
             # Reduce payment by 50% if modifiers QX, QS, QK and QY
             if any(x in mods for x in ['QX', 'QS', 'QK', 'QY']):
-                line_item["line_item_payment"] /= 2
-
+                line_item.line_item_payment /= 2
 
-def ncci_adjustments(line_item_payment_details: dict, data_item_index: int, ncci_info: List[List[dict]]):
-    mods = [
-        line_item_payment_details['mod1'],
-        line_item_payment_details['mod2'],
-        line_item_payment_details['mod3'],
-        line_item_payment_details['mod4'],
-    ]
 
-    for ncci_rows_index, ncci_rows in enumerate(ncci_info):
-        if ncci_rows_index != data_item_index:
-            continue
+def ncci_adjustments(line_item_payment_details: PricedLineItem, data_item_index: int, ncci_info: List[List[dict]]):
+    mods = line_item_payment_details.mods
 
-        for ncci_row in ncci_rows:
+    if 0 <= data_item_index < len(ncci_info):
+        for ncci_row in ncci_info[data_item_index]:
             # if Modifier Allowed value = 0 or value = 9
             if int(ncci_row['modifier']) in [0, 9]:
                 # set payment for Column2 code to $0
-                line_item_payment_details['line_item_payment'] = 0
+                line_item_payment_details.line_item_payment = 0
                 return
 
             # if Modifier Allowed value = 1, check Column2 code for Modifiers not in 59,XE,XS,XU or XP
             elif int(ncci_row['modifier']) == 1 and not any(x in mods for x in ['59', 'XE', 'XS', 'XU', 'XP']):
                 # set payment for Column2 code to $0
-                line_item_payment_details['line_item_payment'] = 0
+                line_item_payment_details.line_item_payment = 0
                 return
+
+
+def adjust_opps_cap(line_item_payment_details: PricedLineItem, opps_cap: float):
+    # - OPPS cap: the technical component of imaging services is paid the lower of the MPFS and OPPS amounts
+    cap = opps_cap * line_item_payment_details.quantity
+    if line_item_payment_details.line_item_payment > cap:
+        line_item_payment_details.line_item_payment = cap
+        line_item_payment_details.comments.append("OPPS cap: Payment is limited to the OPPS payment amount")
+
+
+def perform_claim_adjustments(line_item_list: List[PricedLineItem]) -> None:
+    """
+    Applies the bilateral surgery, multiple procedure and anesthesia rules to the line items of a claim.
+    The line items are grouped by service date once and every day is adjusted on its own.
+    """
+    # Multiple procedure reductions only apply to claims with more than one line item
+    multiple_procedures = len(line_item_list) >= 2
+
+    for service_date_line_items in group_by_service_date(line_item_list).values():
+        perform_adjustments_bilateral_surgery(service_date_line_items.line_items)
+        if multiple_procedures:
+            perform_adjustments_multiple(service_date_line_items)
+        perform_adjustments_anesthesia_pricing(service_date_line_items.line_items)
@@ -1,20 +1,32 @@
-from psycopg2 import sql
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer.database import Lookup, execute_statement
+from mpfs_pricer.lookup_cache import LookupCache, get_table_ttl
 
+BASE_UNIT_QUERY = """
+        SELECT
+            base_unit
+        FROM internal_reference.cms_pfs_anesthesia_base_units
+        where
+            code = %s and
+            beg_eff_date <= %s and
+            end_eff_date >= %s
 
-def get_base_unit(db, cpt, date_of_service):
-    query = """
-            SELECT
-                base_unit
-            FROM internal_reference.cms_pfs_anesthesia_base_units
-            where
-                code = %s and
-                beg_eff_date <= %s and
-                end_eff_date >= %s
+    """
+
+CONVERSION_FACTOR_QUERY = """
+        SELECT
+            "Conversion_Factor"
+        FROM internal_reference.cms_pfs_anes_conversion_factor
+        WHERE
+            TRIM(contractor) = %s AND
+            locality = %s AND
+            beg_eff_date <= %s AND
+            end_eff_date >= %s
+    """
 
-        """
 
-    cursor = db.cursor()
-    cursor.execute(query, [cpt, date_of_service, date_of_service])
+def get_base_unit(db, cpt, date_of_service):
+    cursor = execute_statement(db, "get_base_unit", BASE_UNIT_QUERY, [cpt, date_of_service, date_of_service])
 
     res = cursor.fetchone()
     if not res:
@@ -24,28 +36,44 @@ def get_base_unit(db, cpt, date_of_service):
 
 
 def get_conversion_factor(db, carrier_to_find, locality_code_to_find, date_of_service):
-    query = sql.SQL(
-        """
-            SELECT
-                "Conversion_Factor"
-            FROM internal_reference.cms_pfs_anes_conversion_factor
-            WHERE
-                TRIM(contractor) = {carrier_to_find} AND
-                locality = {locality_code_to_find} AND
-                beg_eff_date <= {date_of_service} AND
-                end_eff_date >= {date_of_service}
-        """
-    ).format(
-        carrier_to_find=sql.Literal(carrier_to_find),
-        locality_code_to_find=sql.Literal(locality_code_to_find),
-        date_of_service=sql.Literal(date_of_service)
+    cursor = execute_statement(
+        db, "get_conversion_factor", CONVERSION_FACTOR_QUERY,
+        [carrier_to_find, locality_code_to_find, date_of_service, date_of_service]
     )
 
-    cursor = db.cursor()
-    cursor.execute(query)
-
     res = cursor.fetchone()
     if not res:
         return None
 
     return res[0]
+
+
+BASE_UNIT_LOOKUP = Lookup(
+    "get_base_units", BASE_UNIT_QUERY,
+    lambda key: [key[0], key[1], key[1]],
+    lambda rows: rows[0][0] if rows else None,
+    cache=LookupCache("anes_base_units", get_table_ttl("anes_base_units", 604800)),
+)
+
+CONVERSION_FACTOR_LOOKUP = Lookup(
+    "get_conversion_factors", CONVERSION_FACTOR_QUERY,
+    lambda key: [key[0], key[1], key[2], key[2]],
+    lambda rows: rows[0][0] if rows else None,
+    cache=LookupCache("anes_conversion_factors", get_table_ttl("anes_conversion_factors", 604800)),
+)
+
+
+def get_base_units(db, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+    """
+    Batched get_base_unit: resolves every (cpt, date_of_service) key in one round trip.
+    Keys without a base unit map to None.
+    """
+    return BASE_UNIT_LOOKUP.fetch(db, keys)
+
+
+def get_conversion_factors(db, keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], float]:
+    """
+    Batched get_conversion_factor: resolves every (carrier, locality, date_of_service) key in one round trip.
+    Keys without a conversion factor map to None.
+    """
+    return CONVERSION_FACTOR_LOOKUP.fetch(db, keys)
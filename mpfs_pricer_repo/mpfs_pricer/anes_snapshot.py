@@ -0,0 +1,109 @@
+import os
+from array import array
+from datetime import date
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer import anes, metrics
+from mpfs_pricer.snapshots import IntervalIndex, Quarter, QuarterSnapshots, get_quarter_bounds, get_region_key
+from mpfs_pricer.utils import parse_date
+
+# Number of quarters kept in memory, least recently used quarters are evicted. 0 disables the snapshot.
+ANES_SNAPSHOT_MAX_QUARTERS = int(os.environ.get("ANES_SNAPSHOT_MAX_QUARTERS", "4"))
+
+BASE_UNIT_SNAPSHOT_QUERY = """
+        SELECT
+            code, base_unit, beg_eff_date, end_eff_date
+        FROM internal_reference.cms_pfs_anesthesia_base_units
+        where
+            beg_eff_date <= %s and
+            end_eff_date >= %s
+    """
+
+CONVERSION_FACTOR_SNAPSHOT_QUERY = """
+        SELECT
+            TRIM(contractor), locality, "Conversion_Factor", beg_eff_date, end_eff_date
+        FROM internal_reference.cms_pfs_anes_conversion_factor
+        WHERE
+            beg_eff_date <= %s AND
+            end_eff_date >= %s
+    """
+
+
+def to_interval_index(keys: list, rows: list) -> IntervalIndex:
+    # Last two columns of the rows are the effective date interval
+    return IntervalIndex(
+        keys, array("i", [row[-2].toordinal() for row in rows]), array("i", [row[-1].toordinal() for row in rows])
+    )
+
+
+class AnesQuarterSnapshot:
+    """
+    Copy of the anesthesia base units and conversion factors effective during one quarter.
+    """
+
+    def __init__(self, quarter: Quarter, base_unit_rows: list, conversion_factor_rows: list):
+        self.quarter = quarter
+
+        self.base_units = [row[1] for row in base_unit_rows]
+        self.base_unit_intervals = to_interval_index([row[0] for row in base_unit_rows], base_unit_rows)
+
+        self.conversion_factors = [row[2] for row in conversion_factor_rows]
+        self.conversion_factor_intervals = to_interval_index(
+            [get_region_key(row[0], row[1]) for row in conversion_factor_rows], conversion_factor_rows
+        )
+
+    def find_base_unit(self, cpt: str, service_date: date):
+        row_index = self.base_unit_intervals.find(cpt, service_date)
+        return self.base_units[row_index] if row_index is not None else None
+
+    def find_conversion_factor(self, carrier: str, locality: str, service_date: date):
+        row_index = self.conversion_factor_intervals.find(get_region_key(carrier, locality), service_date)
+        return self.conversion_factors[row_index] if row_index is not None else None
+
+
+class AnesSnapshot(QuarterSnapshots):
+    """
+    Per-process cache of anesthesia quarter snapshots.
+    """
+
+    def __init__(self, max_quarters: int = ANES_SNAPSHOT_MAX_QUARTERS):
+        super().__init__(max_quarters)
+
+    def load_quarter(self, db, quarter: Quarter) -> AnesQuarterSnapshot:
+        start, end = get_quarter_bounds(quarter)
+
+        cursor = db.cursor()
+        cursor.execute(BASE_UNIT_SNAPSHOT_QUERY, [end, start])
+        base_unit_rows = cursor.fetchall()
+        cursor.execute(CONVERSION_FACTOR_SNAPSHOT_QUERY, [end, start])
+        conversion_factor_rows = cursor.fetchall()
+
+        return AnesQuarterSnapshot(quarter, base_unit_rows, conversion_factor_rows)
+
+    def get_base_unit(self, db, cpt, date_of_service):
+        service_date = parse_date(date_of_service)
+        return self.get_service_date_snapshot(db, service_date).find_base_unit(cpt, service_date)
+
+    def get_conversion_factor(self, db, carrier, locality, date_of_service):
+        service_date = parse_date(date_of_service)
+        return self.get_service_date_snapshot(db, service_date).find_conversion_factor(carrier, locality, service_date)
+
+
+anes_snapshot = AnesSnapshot()
+
+
+@metrics.timed(metrics.STAGE_ANES_BASE_UNITS)
+def get_base_units(db, keys: Iterable[Tuple[str, str]],
+                   snapshot: AnesSnapshot = anes_snapshot) -> Dict[Tuple[str, str], float]:
+    if not snapshot.enabled:
+        return anes.get_base_units(db, keys)
+
+    return {key: snapshot.get_base_unit(db, *key) for key in dict.fromkeys(keys)}
+
+
+@metrics.timed(metrics.STAGE_ANES_CONVERSION_FACTORS)
+def get_conversion_factors(db, keys: Iterable[Tuple[str, str, str]],
+                           snapshot: AnesSnapshot = anes_snapshot) -> Dict[Tuple[str, str, str], float]:
+    if not snapshot.enabled:
+        return anes.get_conversion_factors(db, keys)
+
+    return {key: snapshot.get_conversion_factor(db, *key) for key in dict.fromkeys(keys)}
@@ -0,0 +1,112 @@
+import asyncio
+import weakref
+from datetime import date
+from typing import Callable, Hashable, Iterable, List
+import asyncpg
+from mpfs_pricer.database import DB_POOL_MAX_IDLE, DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE, DB_POOL_TIMEOUT, \
+    DB_PREPARED_STATEMENTS, Lookup, add_lookup_rows, get_db_config_from_env, get_lookup_statement, \
+    iter_lookup_batches, lookup_param_types, to_prepared_query
+from mpfs_pricer.lookup_cache import LookupCache
+
+# Pools are bound to the event loop that created them: event loop -> {db_name: pool task}
+async_db_pools = weakref.WeakKeyDictionary()
+
+
+async def init_connection(connection):
+    # Exchange dates and integers as text, the way psycopg2 interpolates them ("09/01/2020" for a date column,
+    # "1" for a locality); lookup keys are sent as text arrays the lookup statements cast themselves
+    await connection.set_type_codec(
+        "date", schema="pg_catalog", encoder=str, decoder=date.fromisoformat, format="text"
+    )
+    for type_name in ["int2", "int4", "int8"]:
+        await connection.set_type_codec(type_name, schema="pg_catalog", encoder=str, decoder=int, format="text")
+
+
+async def create_async_db_pool(db_name=None) -> asyncpg.Pool:
+    db_config = get_db_config_from_env(db_name)
+    return await asyncpg.create_pool(
+        host=db_config["host"],
+        port=db_config["port"],
+        database=db_config["database"],
+        user=db_config["user"],
+        password=db_config["password"],
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_POOL_MAX_IDLE,
+        timeout=DB_POOL_TIMEOUT,
+        # asyncpg prepares and caches statements itself, the cache has to be off behind pgbouncer
+        statement_cache_size=100 if DB_PREPARED_STATEMENTS else 0,
+        init=init_connection,
+    )
+
+
+async def get_async_db_pool(db_name=None) -> asyncpg.Pool:
+    """
+    Returns the asyncpg pool of the running event loop. Its DB_POOL_MAX_SIZE connections cap the number of
+    lookups in flight.
+    """
+    loop_pools = async_db_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = loop_pools.get(db_name)
+    if pool is None:
+        pool = loop_pools[db_name] = asyncio.ensure_future(create_async_db_pool(db_name))
+    try:
+        return await asyncio.shield(pool)
+    except Exception:
+        if loop_pools.get(db_name) is pool:
+            del loop_pools[db_name]
+        raise
+
+
+async def fetch_batch_async(pool: asyncpg.Pool, statement: str, params: list) -> List[tuple]:
+    async with pool.acquire() as connection:
+        records = await connection.fetch(statement, *params)
+    return [tuple(record) for record in records]
+
+
+async def get_param_types_async(pool: asyncpg.Pool, lookup: Lookup) -> List[str]:
+    # Async get_param_types, asyncpg describes the parameters of a prepared statement
+    param_types = lookup_param_types.get(lookup.name)
+    if param_types is None:
+        async with pool.acquire() as connection:
+            statement = await connection.prepare(to_prepared_query(lookup.query))
+        param_types = lookup_param_types[lookup.name] = [
+            f"{param.schema}.{param.name}" for param in statement.get_parameters()
+        ]
+    return param_types
+
+
+async def fetch_lookup_rows_async(pool: asyncpg.Pool, lookup: Lookup, keys: List[Hashable]) -> List[List[tuple]]:
+    results = [[] for _ in keys]
+    if not keys:
+        return results
+
+    param_types = await get_param_types_async(pool, lookup)
+    statement = to_prepared_query(get_lookup_statement(lookup.query, param_types, lookup.first_row_only))
+    batches = list(iter_lookup_batches(lookup.get_params_list(keys)))
+    batches_rows = await asyncio.gather(*[fetch_batch_async(pool, statement, params) for _, params in batches])
+    for (start, _), rows in zip(batches, batches_rows):
+        add_lookup_rows(results, start, rows)
+    return results
+
+
+async def call_lookup_cache(cache: LookupCache, method: Callable, *args):
+    # The Redis tier uses the blocking client, it is called off the event loop; the in-process tier isn't
+    if cache.redis_enabled:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def fetch_lookup_async(pool: asyncpg.Pool, lookup: Lookup, keys: Iterable[Hashable], version: str = None) -> dict:
+    """
+    Async Lookup.fetch: the batches of a lookup run concurrently, each on its own pooled connection. Given the
+    reference `version`, only the keys missing from the cache of the lookup are queried.
+    """
+    keys = list(dict.fromkeys(keys))
+    if version is None or lookup.cache is None or not lookup.cache.enabled:
+        return lookup.to_results(keys, await fetch_lookup_rows_async(pool, lookup, keys))
+
+    results, missing = await call_lookup_cache(lookup.cache, lookup.cache.get, keys, lookup.from_rows, version)
+    if missing:
+        rows = await fetch_lookup_rows_async(pool, lookup, missing)
+        results.update(await call_lookup_cache(lookup.cache, lookup.cache.add, missing, rows, lookup.from_rows, version))
+    return results
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Callable, Hashable, Iterable, List, Optional
+import asyncpg
+from mpfs_pricer import claim_schema, file_reference
+from mpfs_pricer.anes import BASE_UNIT_LOOKUP, CONVERSION_FACTOR_LOOKUP
+from mpfs_pricer.anes_snapshot import get_base_units, get_conversion_factors
+from mpfs_pricer.async_database import fetch_lookup_async, get_async_db_pool
+from mpfs_pricer.database import Lookup
+from mpfs_pricer.gpci import GPCI_LOOKUP
+from mpfs_pricer.gpci_snapshot import get_gpci_many
+from mpfs_pricer.ncci import NCCI_LOOKUP
+from mpfs_pricer.ncci_index import get_ncci_many
+from mpfs_pricer.nppes import PROVIDERS_LOOKUP
+from mpfs_pricer.nppes_cache import ProviderCache
+from mpfs_pricer.prefetch import ClaimReference, get_base_unit_keys, get_claims_ncci_keys, get_region_keys, \
+    get_rvu_keys, prefetch_claims_reference
+from mpfs_pricer.pricer import price_claims_with_reference
+from mpfs_pricer.reference_swap import swappable_reference
+from mpfs_pricer.reference_version import get_reference_version
+from mpfs_pricer.rvu import RVU_LOOKUP
+from mpfs_pricer.rvu_snapshot import get_rvus_many
+from mpfs_pricer.snapshots import QuarterSnapshots, get_service_quarter
+from mpfs_pricer.utils import parse_date
+
+LOOKUPS = [PROVIDERS_LOOKUP, RVU_LOOKUP, BASE_UNIT_LOOKUP, CONVERSION_FACTOR_LOOKUP, GPCI_LOOKUP, NCCI_LOOKUP]
+
+
+async def get_lookups_version() -> Optional[str]:
+    # The lookup caches are keyed by the reference version, read off the event loop through the database pool
+    if not any(lookup.cache is not None and lookup.cache.enabled for lookup in LOOKUPS):
+        return None
+    try:
+        return await asyncio.to_thread(get_reference_version)
+    except Exception:
+        logging.warning("Reference version unavailable, querying without the lookup caches", exc_info=True)
+        return None
+
+
+@asynccontextmanager
+async def acquire_reference():
+    """
+    swappable_reference.acquire() for coroutines. The first generation of the process is created off the event
+    loop: it loads the local reference data, or reads the version marker of the reference database.
+    """
+    if swappable_reference.generation is None:
+        await asyncio.to_thread(swappable_reference.get_generation)
+    with swappable_reference.acquire() as reference:
+        yield reference
+
+
+def is_loaded(snapshots: QuarterSnapshots, key: tuple) -> bool:
+    # Lookup keys end with their service date
+    service_date = key[-1] if isinstance(key[-1], date) else parse_date(key[-1])
+    return get_service_quarter(service_date) in snapshots.quarters
+
+
+async def find_providers_async(pool: asyncpg.Pool, npis: Iterable[str], version: Optional[str],
+                               providers: ProviderCache) -> dict:
+    if not providers.enabled:
+        return await fetch_lookup_async(pool, PROVIDERS_LOOKUP, npis, version)
+
+    found, missing = providers.get(npis)
+    if missing:
+        found.update(providers.add(await fetch_lookup_async(pool, PROVIDERS_LOOKUP, missing, version)))
+    return found
+
+
+async def fetch_snapshot_lookup_async(pool: asyncpg.Pool, lookup: Lookup, keys: Iterable[Hashable],
+                                      version: Optional[str], snapshots: QuarterSnapshots,
+                                      get_many: Callable) -> dict:
+    """
+    Resolves the keys of the quarters `snapshots` already hold with `get_many`, from memory, and queries the
+    others: quarters are only loaded by the sync pricer and the warm up.
+    """
+    if not snapshots.enabled:
+        return await fetch_lookup_async(pool, lookup, keys, version)
+
+    loaded = snapshots.get_loaded()
+    loaded_keys = []
+    missing = []
+    for key in dict.fromkeys(keys):
+        (loaded_keys if is_loaded(loaded, key) else missing).append(key)
+
+    results = get_many(None, loaded_keys, loaded) if loaded_keys else {}
+    if missing:
+        results.update(await fetch_lookup_async(pool, lookup, missing, version))
+    return results
+
+
+async def prefetch_claims_reference_async(pool: asyncpg.Pool, claims_line_items: List[List[dict]]) -> ClaimReference:
+    """
+    Async prefetch_claims_reference. Local reference data (REFERENCE_BACKEND=files or snapshot) is read from
+    memory. Otherwise keys are resolved from the snapshots and provider cache of the current reference generation
+    and from the lookup caches first, and only the misses are queried. Lookups that don't depend on each other run
+    concurrently: providers, RVUs, anesthesia base units and NCCI edits first, then GPCI and conversion factors
+    once the provider regions are known.
+    """
+    if file_reference.is_local_backend():
+        async with acquire_reference() as local_reference:
+            return prefetch_claims_reference(local_reference, claims_line_items)
+
+    reference = ClaimReference()
+    line_items = [line_item for claim_line_items in claims_line_items for line_item in claim_line_items]
+    version = await get_lookups_version()
+
+    async with acquire_reference() as snapshots:
+        reference.providers, reference.rvus, reference.anes_base_units, reference.ncci = await asyncio.gather(
+            find_providers_async(pool, [line_item["rendering_provider_npi"] for line_item in line_items], version,
+                                 snapshots.providers),
+            fetch_snapshot_lookup_async(pool, RVU_LOOKUP, get_rvu_keys(line_items), version, snapshots.rvus,
+                                        get_rvus_many),
+            fetch_snapshot_lookup_async(pool, BASE_UNIT_LOOKUP, get_base_unit_keys(line_items), version,
+                                        snapshots.anes, get_base_units),
+            fetch_snapshot_lookup_async(pool, NCCI_LOOKUP, get_claims_ncci_keys(claims_line_items), version,
+                                        snapshots.ncci, get_ncci_many),
+        )
+
+        region_keys = get_region_keys(reference, line_items)
+        reference.gpci, reference.anes_conversion_factors = await asyncio.gather(
+            fetch_snapshot_lookup_async(pool, GPCI_LOOKUP, region_keys, version, snapshots.gpci, get_gpci_many),
+            fetch_snapshot_lookup_async(pool, CONVERSION_FACTOR_LOOKUP, region_keys, version, snapshots.anes,
+                                        get_conversion_factors),
+        )
+
+    return reference
+
+
+async def price_claims_async(claims: List[dict], pool: asyncpg.Pool = None) -> List[dict]:
+    """
+    Async price_claims: only the reference lookups are awaited, the claims are priced with the same code
+    as the sync path.
+    """
+    claims = claim_schema.validate_claims(claims)
+    if pool is None and not file_reference.is_local_backend():
+        pool = await get_async_db_pool("t_data")
+
+    reference = await prefetch_claims_reference_async(pool, [claim['line_items'] for claim in claims])
+
+    return price_claims_with_reference(claims, reference)
+
+
+async def price_claim_async(claim: dict, pool: asyncpg.Pool = None) -> dict:
+    return (await price_claims_async([claim], pool))[0]
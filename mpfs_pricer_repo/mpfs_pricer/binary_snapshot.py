@@ -0,0 +1,598 @@
+import argparse
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from mpfs_pricer import file_reference, gpci, metrics, ncci, rvu
+from mpfs_pricer.anes_snapshot import BASE_UNIT_SNAPSHOT_QUERY, CONVERSION_FACTOR_SNAPSHOT_QUERY
+from mpfs_pricer.data_files import ZPLC_REGION_WIDTH, ZplcIndex, get_zplc_data_file
+from mpfs_pricer.database import get_db_pool
+from mpfs_pricer.gpci_snapshot import GPCI_SNAPSHOT_QUERY
+from mpfs_pricer.ncci_index import NCCI_INDEX_FETCH_SIZE, NCCI_INDEX_QUERY
+from mpfs_pricer.prefetch import ReferenceBackend
+from mpfs_pricer.rvu_snapshot import RVU_SNAPSHOT_QUERY
+from mpfs_pricer.snapshots import Quarter, get_quarter_bounds, get_region_key, get_service_quarter
+from mpfs_pricer.utils import parse_date
+
+# Directory of the snapshots built by `python -m mpfs_pricer.binary_snapshot`, one file per quarter
+REFERENCE_SNAPSHOT_DIR = os.environ.get("REFERENCE_SNAPSHOT_DIR", "")
+
+SNAPSHOT_MAGIC = b"MPFSSNAP"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Magic, format version, year, quarter, number of sections
+HEADER = struct.Struct("<8sIHHI")
+# Name, array typecode, offset and size in bytes of a section
+SECTION = struct.Struct("<32sc3xQQ")
+SECTION_ALIGNMENT = 8
+
+SNAPSHOT_FILE = re.compile(r"reference_(\d{4})Q([1-4])\.mpfs")
+
+# Column kinds: ids into the string table, floats, date ordinals, and the integer key of a row, which is only
+# stored in the key section of its table
+TEXT = "I"
+FLOAT = "d"
+DATE = "i"
+INT_KEY = "Q"
+
+NULL_STRING = 0xFFFFFFFF
+NULL_DATE = 0
+
+_snapshot_reference = None
+_snapshot_reference_lock = Lock()
+
+
+def get_region_name(carrier, locality) -> str:
+    # Regions match like in the quarter snapshots, whatever the zero padding of their values
+    return ":".join(str(value) for value in get_region_key(carrier, locality))
+
+
+class Table:
+    """
+    Layout of a snapshot table: the kinds of its columns, the key of its rows (up to two strings, or an int
+    when `key_size` is 0) and the columns of their effective date interval.
+    """
+
+    def __init__(self, name: str, kinds: List[str], get_key: Callable[[tuple], object], key_size: int,
+                 interval: Optional[Tuple[int, int]] = None):
+        self.name = name
+        self.kinds = kinds
+        self.get_key = get_key
+        self.key_size = key_size
+        self.interval = interval
+
+
+RVU_TABLE = Table(
+    "rvu",
+    [
+        FLOAT if name.strip().strip('"') in file_reference.RVU_FLOAT_COLUMNS else TEXT
+        for name in rvu.RVU_COLUMNS.split(",")
+    ] + [DATE, DATE],
+    lambda row: (row[0], row[1] or ""), 2, (-2, -1),
+)
+GPCI_TABLE = Table(
+    "gpci", [TEXT, TEXT, TEXT, FLOAT, FLOAT, FLOAT, DATE, DATE], lambda row: (get_region_name(row[0], row[1]),), 1,
+    (-2, -1),
+)
+BASE_UNITS_TABLE = Table("anes_base_units", [TEXT, FLOAT, DATE, DATE], lambda row: (row[0],), 1, (-2, -1))
+CONVERSION_FACTORS_TABLE = Table(
+    "anes_conversion_factors", [TEXT, TEXT, FLOAT, DATE, DATE], lambda row: (get_region_name(row[0], row[1]),), 1,
+    (-2, -1),
+)
+NCCI_TABLE = Table("ncci", [TEXT, TEXT, DATE, DATE, TEXT], lambda row: (row[0], row[1]), 2, (2, 3))
+ZIP_REGIONS_TABLE = Table("zip_regions", [INT_KEY, TEXT, TEXT], lambda row: row[0], 0)
+PROVIDERS_TABLE = Table("providers", [INT_KEY, TEXT, TEXT], lambda row: int(row[0]), 0)
+
+TABLES = [
+    RVU_TABLE, GPCI_TABLE, BASE_UNITS_TABLE, CONVERSION_FACTORS_TABLE, NCCI_TABLE, ZIP_REGIONS_TABLE, PROVIDERS_TABLE
+]
+
+
+def get_snapshot_file_name(quarter: Quarter) -> str:
+    return f"reference_{quarter[0]}Q{quarter[1]}.mpfs"
+
+
+def to_numpy(values: array, dtype) -> np.ndarray:
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+
+class SnapshotWriter:
+    """
+    Compiles the rows of the reference tables of a quarter into fixed-width columns.
+
+    Strings are stored once, in a string table sorted by their UTF-8 bytes, so string ids compare like the
+    strings. Every key is a uint64 and the rows of a table are sorted by key and effective date, so a lookup
+    is a binary search of the key section.
+    """
+
+    def __init__(self):
+        self.string_ids = {}
+        self.tables = {}
+
+    def get_string_id(self, value) -> int:
+        if value is None:
+            return NULL_STRING
+        value = str(value)
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = self.string_ids[value] = len(self.string_ids)
+        return string_id
+
+    def add_rows(self, table: Table, rows: Iterable[tuple]):
+        columns = [array(kind) for kind in table.kinds]
+        keys = array("Q") if table.key_size == 0 else [array("I") for _ in range(table.key_size)]
+
+        for row in rows:
+            key = table.get_key(row)
+            if table.key_size == 0:
+                keys.append(key)
+            else:
+                for key_column, value in zip(keys, key):
+                    key_column.append(self.get_string_id(value))
+
+            for column, kind, value in zip(columns, table.kinds, row):
+                if kind == TEXT:
+                    column.append(self.get_string_id(value))
+                elif kind == FLOAT:
+                    column.append(float(value) if value is not None else math.nan)
+                elif kind == DATE:
+                    column.append(value.toordinal() if value is not None else NULL_DATE)
+
+        self.tables[table.name] = (table, columns, keys)
+
+    def get_string_sections(self) -> Tuple[np.ndarray, list]:
+        strings = sorted(self.string_ids, key=lambda value: value.encode())
+        remap = np.zeros(len(strings), dtype=np.uint32)
+        offsets = array("Q", [0])
+        for string_id, value in enumerate(strings):
+            remap[self.string_ids[value]] = string_id
+            offsets.append(offsets[-1] + len(value.encode()))
+
+        return remap, [("strings.offsets", "Q", offsets.tobytes()), ("strings.data", "B", "".join(strings).encode())]
+
+    @staticmethod
+    def remap_ids(remap: np.ndarray, ids: array) -> np.ndarray:
+        # Ids are assigned in insertion order, the string table is sorted
+        ids = to_numpy(ids, np.uint32)
+        is_null = ids == NULL_STRING
+        return np.where(is_null, NULL_STRING, remap[np.where(is_null, 0, ids)]).astype(np.uint32)
+
+    def get_table_sections(self, remap: np.ndarray, table: Table, columns: list, keys) -> list:
+        if table.key_size == 0:
+            key = to_numpy(keys, np.uint64)
+        else:
+            key = np.zeros(len(keys[0]), dtype=np.uint64)
+            for position, key_column in enumerate(keys):
+                key |= self.remap_ids(remap, key_column).astype(np.uint64) << np.uint64(32 * (1 - position))
+
+        values = {}
+        for index, (column, kind) in enumerate(zip(columns, table.kinds)):
+            if kind == TEXT:
+                values[index] = self.remap_ids(remap, column)
+            elif kind != INT_KEY:
+                values[index] = to_numpy(column, np.dtype(kind))
+
+        if table.interval is not None:
+            order = np.lexsort((values[table.interval[0] % len(table.kinds)], key))
+        else:
+            order = np.argsort(key, kind="stable")
+
+        return [(f"{table.name}.key", INT_KEY, key[order].tobytes())] + [
+            (f"{table.name}.{index}", table.kinds[index], column[order].tobytes()) for index, column in values.items()
+        ]
+
+    def write(self, path: Path, quarter: Quarter):
+        """
+        Writes the snapshot to `path`. The file is replaced atomically: processes that mapped the former file
+        keep reading it.
+        """
+        remap, sections = self.get_string_sections()
+        for table, columns, keys in self.tables.values():
+            sections.extend(self.get_table_sections(remap, table, columns, keys))
+
+        entries = []
+        offset = HEADER.size + SECTION.size * len(sections)
+        for name, typecode, data in sections:
+            offset += -offset % SECTION_ALIGNMENT
+            entries.append(SECTION.pack(name.encode(), typecode.encode(), offset, len(data)))
+            offset += len(data)
+
+        temporary_path = path.with_name(f".{path.name}.tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, quarter[0], quarter[1], len(sections)))
+            f.write(b"".join(entries))
+            for _, _, data in sections:
+                f.write(b"\0" * (-f.tell() % SECTION_ALIGNMENT))
+                f.write(data)
+        os.replace(temporary_path, path)
+
+
+class BinarySnapshot:
+    """
+    Reference data of one quarter, read from a snapshot file through a shared memory map.
+
+    Sections are typed memoryviews of the map: opening a snapshot reads its header only, nothing is copied
+    and every process mapping the file reads the same page cache pages.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, year, quarter_number, section_count = HEADER.unpack_from(self.mmap, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION or sys.byteorder != "little":
+            self.mmap.close()
+            raise ValueError(f"{self.path} isn't a reference snapshot of format version {SNAPSHOT_FORMAT_VERSION}.")
+        self.quarter = (year, quarter_number)
+
+        self.view = memoryview(self.mmap)
+        self.sections = {}
+        for index in range(section_count):
+            name, typecode, offset, size = SECTION.unpack_from(self.mmap, HEADER.size + index * SECTION.size)
+            self.sections[name.rstrip(b"\0").decode()] = self.view[offset:offset + size].cast(typecode.decode())
+
+        self.string_offsets = self.sections["strings.offsets"]
+        self.string_data = self.sections["strings.data"]
+        self.string_ids = {}  # string -> string id, memoized per process
+
+    def will_need(self):
+        # Asks the kernel to read the file ahead, before lookups fault its pages in
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self.mmap.madvise(mmap.MADV_WILLNEED)
+
+    def close(self):
+        # The map can only be closed once no view of it is left
+        for section in self.sections.values():
+            section.release()
+        self.view.release()
+        self.mmap.close()
+
+    def get_string(self, string_id: int) -> Optional[str]:
+        if string_id == NULL_STRING:
+            return None
+        return str(self.string_data[self.string_offsets[string_id]:self.string_offsets[string_id + 1]], "utf-8")
+
+    def find_string_id(self, value: str) -> Optional[int]:
+        string_id = self.string_ids.get(value, -1)
+        if string_id != -1:
+            return string_id
+
+        encoded = value.encode()
+        low, high = 0, len(self.string_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.string_data[self.string_offsets[middle]:self.string_offsets[middle + 1]].tobytes() < encoded:
+                low = middle + 1
+            else:
+                high = middle
+
+        string_id = None
+        if low < len(self.string_offsets) - 1 and self.get_string(low) == value:
+            string_id = low
+        self.string_ids[value] = string_id
+        return string_id
+
+    def get_key(self, *values: str) -> Optional[int]:
+        key = 0
+        for position, value in enumerate(values):
+            string_id = self.find_string_id(value)
+            if string_id is None:
+                return None
+            key |= string_id << (32 * (1 - position))
+        return key
+
+    def find_rows(self, table: Table, key: Optional[int]) -> Tuple[int, int]:
+        # Range of the rows of `key`
+        if key is None:
+            return 0, 0
+        keys = self.sections[f"{table.name}.key"]
+        low = bisect_left(keys, key)
+        return low, bisect_right(keys, key, low)
+
+    def get_row(self, table: Table, row_index: int) -> tuple:
+        row = []
+        for index, kind in enumerate(table.kinds):
+            if kind == INT_KEY:
+                continue
+            value = self.sections[f"{table.name}.{index}"][row_index]
+            if kind == TEXT:
+                row.append(self.get_string(value))
+            elif kind == FLOAT:
+                row.append(value if not math.isnan(value) else None)
+            else:
+                row.append(date.fromordinal(value) if value != NULL_DATE else None)
+        return tuple(row)
+
+    def find_effective_row(self, table: Table, key: Optional[int], service_date: date) -> Optional[tuple]:
+        # Latest starting row of `key` effective on `service_date`, like IntervalIndex.find
+        low, high = self.find_rows(table, key)
+        starts = self.sections[f"{table.name}.{table.interval[0] % len(table.kinds)}"]
+        ends = self.sections[f"{table.name}.{table.interval[1] % len(table.kinds)}"]
+
+        day = service_date.toordinal()
+        position = bisect_right(starts, day, low, high)
+        while position > low:
+            position -= 1
+            if ends[position] >= day:
+                return self.get_row(table, position)
+        return None
+
+    def find_rvus(self, cpt: str, mod: Optional[str], service_date: date) -> Optional[dict]:
+        row = self.find_effective_row(RVU_TABLE, self.get_key(cpt, mod or ""), service_date)
+        return rvu.rvus_from_row(row[:-2]) if row is not None else None
+
+    def find_gpci(self, carrier: str, locality: str, service_date: date) -> Optional[dict]:
+        row = self.find_effective_row(GPCI_TABLE, self.get_key(get_region_name(carrier, locality)), service_date)
+        return gpci.gpci_from_row(row[:-2]) if row is not None else None
+
+    def find_base_unit(self, cpt: str, service_date: date) -> Optional[float]:
+        row = self.find_effective_row(BASE_UNITS_TABLE, self.get_key(cpt), service_date)
+        return row[1] if row is not None else None
+
+    def find_conversion_factor(self, carrier: str, locality: str, service_date: date) -> Optional[float]:
+        key = self.get_key(get_region_name(carrier, locality))
+        row = self.find_effective_row(CONVERSION_FACTORS_TABLE, key, service_date)
+        return row[2] if row is not None else None
+
+    def find_ncci(self, code_1: str, code_2: str, service_date: date) -> List[dict]:
+        low, high = self.find_rows(NCCI_TABLE, self.get_key(code_1, code_2))
+        ends = self.sections["ncci.3"]
+
+        # Edits without a deletion date are still active
+        day = service_date.toordinal()
+        high = bisect_right(self.sections["ncci.2"], day, low, high)
+        return ncci.ncci_from_rows([
+            self.get_row(NCCI_TABLE, row_index) for row_index in range(low, high)
+            if ends[row_index] == NULL_DATE or ends[row_index] >= day
+        ])
+
+    def find_provider(self, npi: str) -> Tuple[Optional[str], Optional[str]]:
+        low, high = self.find_rows(PROVIDERS_TABLE, int(npi) if npi and npi.isascii() and npi.isdigit() else None)
+        return self.get_row(PROVIDERS_TABLE, low) if low < high else (None, None)
+
+    def find_region_by_zip(self, provider_zip: Optional[str]) -> Optional[dict]:
+        # Same contract as data_files.find_region_by_zip
+        if provider_zip is None:
+            return None
+        if not isinstance(provider_zip, str):
+            raise ValueError("Invalid zipcode data.")
+
+        zip5 = provider_zip[0:5]
+        if len(zip5) != 5 or not zip5.isascii() or not zip5.isdigit():
+            return None
+        low, high = self.find_rows(ZIP_REGIONS_TABLE, int(zip5))
+        if low == high:
+            return None
+
+        carrier, locality = self.get_row(ZIP_REGIONS_TABLE, low)
+        return {"zip": zip5, "carrier": carrier, "locality": locality}
+
+
+def get_zip_region_rows() -> Iterator[tuple]:
+    index = ZplcIndex(get_zplc_data_file())
+    for position, zip_value in enumerate(index.zips):
+        region = index.regions[position * ZPLC_REGION_WIDTH:(position + 1) * ZPLC_REGION_WIDTH].decode()
+        yield zip_value, region[0:5], region[5:7]
+
+
+def get_provider_rows(rows: Iterable[tuple]) -> Iterator[tuple]:
+    # NPIs are 10 digit numbers, anything else can't be priced anyway
+    return (row for row in rows if row[0] and str(row[0]).isascii() and str(row[0]).isdigit())
+
+
+def stream_rows(db, name: str, query: str, parameters: list = None) -> Iterator[tuple]:
+    # Named cursors stream the large tables instead of materializing them client side
+    cursor = db.cursor(name=name)
+    cursor.itersize = NCCI_INDEX_FETCH_SIZE
+    try:
+        cursor.execute(query, parameters)
+        yield from cursor
+    finally:
+        cursor.close()
+
+
+def write_database_snapshot(db, quarter: Quarter, path: Path):
+    """
+    Writes the snapshot of the reference data of the reference database effective during `quarter`.
+    """
+    start, end = get_quarter_bounds(quarter)
+    writer = SnapshotWriter()
+
+    cursor = db.cursor()
+    for table, query in [(RVU_TABLE, RVU_SNAPSHOT_QUERY), (GPCI_TABLE, GPCI_SNAPSHOT_QUERY),
+                         (BASE_UNITS_TABLE, BASE_UNIT_SNAPSHOT_QUERY),
+                         (CONVERSION_FACTORS_TABLE, CONVERSION_FACTOR_SNAPSHOT_QUERY)]:
+        cursor.execute(query, [end, start])
+        writer.add_rows(table, cursor.fetchall())
+    cursor.close()
+
+    writer.add_rows(NCCI_TABLE, stream_rows(db, "snapshot_ncci", NCCI_INDEX_QUERY, [end, start]))
+    writer.add_rows(PROVIDERS_TABLE, get_provider_rows(stream_rows(
+        db, "snapshot_providers", file_reference.EXPORT_QUERIES[file_reference.PROVIDERS_FILE]
+    )))
+    writer.add_rows(ZIP_REGIONS_TABLE, get_zip_region_rows())
+    writer.write(path, quarter)
+
+
+def write_files_snapshot(directory: str, quarter: Quarter, path: Path):
+    """
+    Writes the snapshot of the reference files of `directory` (see FileReference) effective during `quarter`.
+    """
+    start, end = get_quarter_bounds(quarter)
+    reference = Path(directory)
+    writer = SnapshotWriter()
+
+    def read_quarter_rows(name: str, converters: list, interval: Tuple[int, int] = (-2, -1)) -> Iterator[tuple]:
+        for row in file_reference.read_rows(reference / name, converters):
+            if row[interval[0]] is not None and row[interval[0]] <= end and (row[interval[1]] or end) >= start:
+                yield row
+
+    to_text, to_float, to_date = file_reference.to_text, file_reference.to_float, file_reference.to_date
+    writer.add_rows(RVU_TABLE, read_quarter_rows(file_reference.RVU_FILE, file_reference.get_rvu_converters()))
+    writer.add_rows(GPCI_TABLE, read_quarter_rows(
+        file_reference.GPCI_FILE, [to_text, to_text, to_text, to_float, to_float, to_float, to_date, to_date]
+    ))
+    writer.add_rows(BASE_UNITS_TABLE, read_quarter_rows(
+        file_reference.BASE_UNITS_FILE, [to_text, to_float, to_date, to_date]
+    ))
+    if (reference / file_reference.CONVERSION_FACTORS_FILE).exists():
+        conversion_factor_rows = read_quarter_rows(
+            file_reference.CONVERSION_FACTORS_FILE, [to_text, to_text, to_float, to_date, to_date]
+        )
+    else:
+        conversion_factor_rows = [
+            row for row in file_reference.read_bundled_conversion_factors() if row[-2] <= end and row[-1] >= start
+        ]
+    writer.add_rows(CONVERSION_FACTORS_TABLE, conversion_factor_rows)
+    writer.add_rows(NCCI_TABLE, read_quarter_rows(
+        file_reference.NCCI_FILE, [to_text, to_text, to_date, to_date, to_text], (2, 3)
+    ))
+    writer.add_rows(PROVIDERS_TABLE, get_provider_rows(
+        file_reference.read_rows(reference / file_reference.PROVIDERS_FILE, [str, to_text, to_text])
+    ))
+    writer.add_rows(ZIP_REGIONS_TABLE, get_zip_region_rows())
+    writer.write(path, quarter)
+
+
+class SnapshotReference(ReferenceBackend):
+    """
+    Reference data served from the binary snapshots of `directory`. Lookups are routed to the snapshot of the
+    quarter of their service date, which is mapped the first time it is needed; providers and ZIP regions
+    come from the latest quarter. Service dates without a snapshot have no reference data.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.paths = {}
+        for path in self.directory.glob("reference_*.mpfs"):
+            match = SNAPSHOT_FILE.fullmatch(path.name)
+            if match:
+                self.paths[(int(match.group(1)), int(match.group(2)))] = path
+        if not self.paths:
+            raise ValueError(f"No reference snapshot found in {self.directory}.")
+
+        self.snapshots = {}
+        self.lock = Lock()
+
+    def get_snapshot(self, quarter: Quarter) -> Optional[BinarySnapshot]:
+        snapshot = self.snapshots.get(quarter)
+        if snapshot is None and quarter in self.paths:
+            with self.lock:
+                snapshot = self.snapshots.get(quarter)
+                if snapshot is None:
+                    snapshot = self.snapshots[quarter] = BinarySnapshot(self.paths[quarter])
+        return snapshot
+
+    def get_latest_snapshot(self) -> BinarySnapshot:
+        return self.get_snapshot(max(self.paths))
+
+    def find(self, service_date: date, name: str, *args, default=None):
+        snapshot = self.get_snapshot(get_service_quarter(service_date))
+        return getattr(snapshot, name)(*args, service_date) if snapshot is not None else default
+
+    def reload(self) -> "SnapshotReference":
+        # The quarters mapped by this reference are mapped and read ahead by the new one
+        reloaded = SnapshotReference(self.directory)
+        for quarter in list(self.snapshots):
+            snapshot = reloaded.get_snapshot(quarter)
+            if snapshot is not None:
+                snapshot.will_need()
+        return reloaded
+
+    def close(self):
+        with self.lock:
+            for snapshot in self.snapshots.values():
+                snapshot.close()
+            self.snapshots.clear()
+
+    @metrics.timed(metrics.STAGE_NPI)
+    def find_providers_by_npis(self, npis: List[str]) -> Dict[str, Tuple[str, str]]:
+        snapshot = self.get_latest_snapshot()
+        return {npi: snapshot.find_provider(npi) for npi in dict.fromkeys(npis)}
+
+    def find_regions_by_zips(self, zips: List[str]) -> dict:
+        snapshot = self.get_latest_snapshot()
+        return {provider_zip: snapshot.find_region_by_zip(provider_zip) for provider_zip in dict.fromkeys(zips)}
+
+    @metrics.timed(metrics.STAGE_GPCI)
+    def get_gpci_many(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+        return {key: self.find(parse_date(key[2]), "find_gpci", key[0], key[1]) for key in dict.fromkeys(keys)}
+
+    @metrics.timed(metrics.STAGE_RVU)
+    def get_rvus_many(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+        return {key: self.find(parse_date(key[2]), "find_rvus", key[0], key[1]) for key in dict.fromkeys(keys)}
+
+    @metrics.timed(metrics.STAGE_ANES_BASE_UNITS)
+    def get_base_units(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        return {key: self.find(parse_date(key[1]), "find_base_unit", key[0]) for key in dict.fromkeys(keys)}
+
+    @metrics.timed(metrics.STAGE_ANES_CONVERSION_FACTORS)
+    def get_conversion_factors(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], float]:
+        return {
+            key: self.find(parse_date(key[2]), "find_conversion_factor", key[0], key[1]) for key in dict.fromkeys(keys)
+        }
+
+    @metrics.timed(metrics.STAGE_NCCI)
+    def get_ncci_many(self, keys: List[Tuple[str, str, date]]) -> Dict[Tuple[str, str, date], List[dict]]:
+        return {key: self.find(key[2], "find_ncci", key[0], key[1], default=[]) for key in dict.fromkeys(keys)}
+
+
+def get_snapshot_reference() -> SnapshotReference:
+    """
+    Returns the snapshots of REFERENCE_SNAPSHOT_DIR, opened once per process.
+    """
+    global _snapshot_reference
+
+    if _snapshot_reference is not None:
+        return _snapshot_reference
+
+    with _snapshot_reference_lock:
+        if _snapshot_reference is None:
+            if not REFERENCE_SNAPSHOT_DIR:
+                raise ValueError("Set REFERENCE_SNAPSHOT_DIR to the directory of the reference snapshots.")
+            _snapshot_reference = SnapshotReference(REFERENCE_SNAPSHOT_DIR)
+        return _snapshot_reference
+
+
+def parse_quarter(value: str) -> Quarter:
+    match = re.fullmatch(r"(\d{4})Q([1-4])", value.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"{value} isn't a quarter like 2020Q3")
+    return int(match.group(1)), int(match.group(2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mpfs_pricer.binary_snapshot",
+        description="Builds the binary reference snapshot of a quarter for REFERENCE_BACKEND=snapshot.",
+    )
+    parser.add_argument("quarter", type=parse_quarter, help="quarter of the snapshot, like 2020Q3")
+    parser.add_argument("directory", help="directory of the reference snapshots")
+    parser.add_argument("--files", help="build from the reference files of this directory instead of the database")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    Path(args.directory).mkdir(parents=True, exist_ok=True)
+    path = Path(args.directory) / get_snapshot_file_name(args.quarter)
+    if args.files:
+        write_files_snapshot(args.files, args.quarter, path)
+    else:
+        with get_db_pool("t_data").connection() as db:
+            write_database_snapshot(db, args.quarter, path)
+    logging.info(f"Wrote {path} ({path.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
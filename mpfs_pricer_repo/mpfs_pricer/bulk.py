@@ -0,0 +1,255 @@
+import csv
+import logging
+import os
+import time
+from collections import deque
+from itertools import groupby, islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List
+from mpfs_pricer import claim_schema, file_reference, metrics, pricer
+from mpfs_pricer.line_item import PRICED_LINE_ITEM_FIELDS
+
+# Claims priced together by a worker process, reference lookups are shared within a chunk
+BULK_CHUNK_SIZE = 500
+
+# Chunks queued per worker process, bounds the claims held in memory
+BULK_PENDING_CHUNKS = 2
+
+# Rows buffered before a Parquet row group is written
+PARQUET_ROW_GROUP_SIZE = 100000
+
+# Seconds between throughput reports
+PROGRESS_INTERVAL = 10.0
+
+PARQUET_READ_BATCH_SIZE = 65536
+
+CLAIM_FIELDS = ("claim_number", "npi", "service_from", "service_to")
+
+LINE_ITEM_FIELDS = ("service_date", "place_of_service", "code", "mod1", "mod2", "mod3", "mod4", "charges",
+                    "quantity", "rendering_provider_npi")
+
+PRICED_CLAIM_FIELDS = CLAIM_FIELDS + ("total_claim_charges", "total_claim_payment")
+
+OUTPUT_FIELDS = PRICED_CLAIM_FIELDS + PRICED_LINE_ITEM_FIELDS + ("error",)
+
+FLOAT_OUTPUT_FIELDS = {
+    "total_claim_charges", "total_claim_payment", "charges", "quantity", "wrvu", "pe_rvu", "mp_rvu", "pw_gpci",
+    "pe_gpci", "mp_gpci", "conversion_factor", "line_item_payment", "pre_op", "intra_op", "post_op",
+    "anes_base_unit", "anes_conversion_factor",
+}
+
+INT_OUTPUT_FIELDS = {"asst_surg", "co_surg", "team_surg", "multi_proc", "bilat_surg"}
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+
+
+def get_format(path: str) -> str:
+    file_format = FORMATS.get(os.path.splitext(path)[1].lower())
+    if file_format is None:
+        raise ValueError(f"Unknown file format of {path}, expected one of {', '.join(FORMATS)}")
+    return file_format
+
+
+def import_parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet files need pyarrow, install it with: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def group_claims(rows: Iterable[dict]) -> Iterator[dict]:
+    """
+    Builds claims from flat rows, one per line item. The line items of a claim have to be consecutive.
+    """
+    for _, claim_rows in groupby(rows, key=lambda row: row["claim_number"]):
+        claim_rows = list(claim_rows)
+        claim = {field: claim_rows[0].get(field, "") for field in CLAIM_FIELDS}
+        claim["line_items"] = [{field: row.get(field, "") for field in LINE_ITEM_FIELDS} for row in claim_rows]
+        yield claim
+
+
+def read_csv(path: str) -> Iterator[dict]:
+    with open(path, newline="") as f:
+        yield from group_claims(csv.DictReader(f))
+
+
+def read_ndjson(path: str) -> Iterator[dict]:
+    # One claim per line, in the /price_claim/ payload format
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield claim_schema.loads(line)
+
+
+def read_parquet(path: str) -> Iterator[dict]:
+    _, parquet = import_parquet()
+
+    def iter_rows():
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=PARQUET_READ_BATCH_SIZE):
+            columns = batch.to_pydict()
+            for values in zip(*columns.values()):
+                yield {name: "" if value is None else str(value) for name, value in zip(columns, values)}
+
+    yield from group_claims(iter_rows())
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "parquet": read_parquet}
+
+
+def get_priced_rows(priced_claim: dict) -> List[dict]:
+    claim_row = {field: priced_claim[field] for field in PRICED_CLAIM_FIELDS}
+    return [
+        {**claim_row, **line_item.to_dict(), "comments": "; ".join(line_item.comments), "error": ""}
+        for line_item in priced_claim["line_items"]
+    ]
+
+
+def get_error_row(claim: dict, error: Exception) -> dict:
+    return {**{field: claim.get(field, "") for field in CLAIM_FIELDS}, "error": str(error)}
+
+
+def price_chunk(claims: List[dict]) -> List[dict]:
+    """
+    Prices a chunk of claims into output rows. Claims that can't be priced get a single row with the error.
+    """
+    try:
+        priced_claims = pricer.price_claims(claims)
+    except Exception as e:
+        if len(claims) > 1:
+            # Price the claims one by one to isolate the ones that failed
+            return [row for claim in claims for row in price_chunk([claim])]
+        return [get_error_row(claims[0], e)]
+
+    return [row for priced_claim in priced_claims for row in get_priced_rows(priced_claim)]
+
+
+def price_chunks(chunks: Iterable[List[dict]], processes: int) -> Iterator[tuple]:
+    """
+    Yields (claims count, rows) of every chunk in input order. Chunks are priced by a pool of `processes`
+    worker processes, each with its own database pool and reference caches; at most BULK_PENDING_CHUNKS
+    chunks per process are read ahead.
+    """
+    if processes <= 1:
+        metrics.start_flusher()
+        for chunk in chunks:
+            yield len(chunk), price_chunk(chunk)
+        return
+
+    with Pool(processes, initializer=metrics.start_flusher) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.apply_async(price_chunk, (chunk,))))
+            if len(pending) >= processes * BULK_PENDING_CHUNKS:
+                claims_count, result = pending.popleft()
+                yield claims_count, result.get()
+
+        while pending:
+            claims_count, result = pending.popleft()
+            yield claims_count, result.get()
+
+
+class CsvWriter:
+    def __init__(self, path: str):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, OUTPUT_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, rows: List[dict]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def to_output_value(field: str, value):
+    if value is None or value == "":
+        return None
+    if field in FLOAT_OUTPUT_FIELDS:
+        return float(value)
+    if field in INT_OUTPUT_FIELDS:
+        return int(value)
+    return str(value)
+
+
+class ParquetWriter:
+    def __init__(self, path: str, row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        self.pyarrow, parquet = import_parquet()
+        self.schema = self.pyarrow.schema([
+            (field, self.pyarrow.float64() if field in FLOAT_OUTPUT_FIELDS else
+             self.pyarrow.int64() if field in INT_OUTPUT_FIELDS else self.pyarrow.string())
+            for field in OUTPUT_FIELDS
+        ])
+        self.writer = parquet.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def write(self, rows: List[dict]):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = {field: [to_output_value(field, row.get(field)) for row in self.rows] for field in OUTPUT_FIELDS}
+        self.writer.write_table(self.pyarrow.Table.from_pydict(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter}
+
+
+class Progress:
+    def __init__(self):
+        self.started = self.reported = time.monotonic()
+        self.claims = 0
+        self.rows = 0
+
+    def add(self, claims_count: int, rows_count: int):
+        self.claims += claims_count
+        self.rows += rows_count
+        if time.monotonic() - self.reported >= PROGRESS_INTERVAL:
+            self.report()
+
+    def report(self):
+        self.reported = time.monotonic()
+        elapsed = max(self.reported - self.started, 1e-9)
+        logging.info(f"{self.claims} claims ({self.rows} rows) priced in {elapsed:.1f}s, "
+                     f"{self.claims / elapsed:.0f} claims/s")
+
+
+def price_file(input_path: str, output_path: str, input_format: str = None, output_format: str = None,
+               processes: int = None, chunk_size: int = BULK_CHUNK_SIZE) -> Progress:
+    """
+    Prices the claims of a CSV, NDJSON or Parquet file into a CSV or Parquet file of priced line items.
+    Claims are streamed: only the chunks in flight are held in memory.
+    """
+    input_format = input_format or get_format(input_path)
+    output_format = output_format or get_format(output_path)
+    if output_format not in WRITERS:
+        raise ValueError(f"Priced line items can't be written as {output_format}")
+
+    claims = READERS[input_format](input_path)
+    chunks = iter(lambda: list(islice(claims, chunk_size)), [])
+
+    if file_reference.is_local_backend():
+        # Load the reference files (or map the snapshots) before the worker processes fork so they share them
+        file_reference.get_local_reference()
+
+    progress = Progress()
+    writer = WRITERS[output_format](output_path)
+    try:
+        for claims_count, rows in price_chunks(chunks, processes or os.cpu_count()):
+            writer.write(rows)
+            progress.add(claims_count, len(rows))
+    finally:
+        writer.close()
+
+    progress.report()
+    return progress
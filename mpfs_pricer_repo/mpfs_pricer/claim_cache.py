@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+from mpfs_pricer import metrics
+from mpfs_pricer.line_item import PRICED_LINE_ITEM_FIELDS, PricedLineItem
+from mpfs_pricer.redis_client import get_redis
+from mpfs_pricer.reference_version import get_reference_version
+
+# Number of priced claims kept in the in-process LRU cache. 0 disables the in-process tier.
+CLAIM_CACHE_SIZE = int(os.environ.get("CLAIM_CACHE_SIZE", "0"))
+
+# Seconds priced claims are kept in Redis, shared by every uWSGI and Celery process. 0 disables the Redis tier.
+CLAIM_CACHE_REDIS_TTL = int(os.environ.get("CLAIM_CACHE_REDIS_TTL", "0"))
+
+# Bump when the cached priced claim format or the pricing rules change
+CLAIM_CACHE_KEY_PREFIX = "mpfs_pricer:claim:1:"
+
+# Line item fields the price of a claim depends on
+LINE_ITEM_KEY_FIELDS = ("service_date", "place_of_service", "code", "mod1", "mod2", "mod3", "mod4", "charges",
+                        "quantity", "rendering_provider_npi")
+
+# Claim fields echoed in the priced claim
+CLAIM_KEY_FIELDS = ("npi", "service_from", "service_to")
+
+
+def get_claim_key(claim: dict, reference_version: str) -> str:
+    """
+    Returns the cache key of a claim: a hash of the reference version and of the claim fields its price depends
+    on. The claim number isn't part of it, resubmitted claims share their price.
+    """
+    values = [reference_version, [claim.get(field) for field in CLAIM_KEY_FIELDS], [
+        [line_item.get(field) for field in LINE_ITEM_KEY_FIELDS] for line_item in claim['line_items']
+    ]]
+    digest = hashlib.blake2b(json.dumps(values, separators=(",", ":")).encode(), digest_size=16)
+    return CLAIM_CACHE_KEY_PREFIX + digest.hexdigest()
+
+
+def encode_priced_claim(priced_claim: dict) -> bytes:
+    claim = {name: value for name, value in priced_claim.items() if name not in ("claim_number", "line_items")}
+    line_items = [[getattr(line_item, field) for field in PRICED_LINE_ITEM_FIELDS]
+                  for line_item in priced_claim["line_items"]]
+    return json.dumps([claim, line_items], separators=(",", ":")).encode()
+
+
+def decode_priced_claim(value: bytes, claim_number: str) -> dict:
+    claim, line_items = json.loads(value)
+    return {
+        "claim_number": claim_number,
+        **claim,
+        "line_items": [PricedLineItem(**dict(zip(PRICED_LINE_ITEM_FIELDS, values))) for values in line_items],
+    }
+
+
+class ClaimCache:
+    """
+    Priced claims by claim key: a per-process LRU cache in front of Redis. Priced claims are stored encoded,
+    so every hit returns new line items.
+    """
+
+    def __init__(self, max_size: int = CLAIM_CACHE_SIZE, redis_ttl: int = CLAIM_CACHE_REDIS_TTL):
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self.values = OrderedDict()
+        self.lock = Lock()
+        self.redis = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 or self.redis_ttl > 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def get_redis(self):
+        return self.redis if self.redis is not None else get_redis()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        values = []
+        missing = []
+        with self.lock:
+            for index, key in enumerate(keys):
+                value = self.values.get(key)
+                if value is None:
+                    missing.append(index)
+                else:
+                    self.values.move_to_end(key)
+                values.append(value)
+
+        redis_hits = 0
+        if missing and self.redis_ttl > 0:
+            from redis import RedisError
+
+            try:
+                fetched = self.get_redis().mget([keys[index] for index in missing])
+            except RedisError:
+                logging.warning("Claim cache Redis tier unavailable", exc_info=True)
+                fetched = [None] * len(missing)
+            found = {keys[index]: value for index, value in zip(missing, fetched) if value is not None}
+            for index in missing:
+                values[index] = found.get(keys[index])
+            redis_hits = len(found)
+            self.add_local(found)
+
+        if metrics.METRICS_ENABLED:
+            metrics.recorder.count(metrics.COUNTER_CLAIM_CACHE_HITS, len(keys) - len(missing))
+            metrics.recorder.count(metrics.COUNTER_CLAIM_CACHE_REDIS_HITS, redis_hits)
+            metrics.recorder.count(metrics.COUNTER_CLAIM_CACHE_MISSES, sum(value is None for value in values))
+
+        return values
+
+    def add_local(self, values: dict):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.values.update(values)
+            for key in values:
+                self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+
+    def set_many(self, values: dict):
+        self.add_local(values)
+
+        if values and self.redis_ttl > 0:
+            from redis import RedisError
+
+            try:
+                pipeline = self.get_redis().pipeline(transaction=False)
+                for key, value in values.items():
+                    pipeline.setex(key, self.redis_ttl, value)
+                pipeline.execute()
+            except RedisError:
+                logging.warning("Claim cache Redis tier unavailable", exc_info=True)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+claim_cache = ClaimCache()
+
+
+def price_claims_cached(claims: List[dict], reference_database_connection, price_claims) -> List[dict]:
+    """
+    Returns the priced claims found in the claim cache and prices the others (once per claim key) with
+    `price_claims`. Claims are priced without the cache when the reference version is unavailable.
+    """
+    try:
+        reference_version = get_reference_version(reference_database_connection)
+    except Exception:
+        logging.warning("Reference version unavailable, pricing without the claim cache", exc_info=True)
+        return price_claims(claims, reference_database_connection)
+
+    keys = [get_claim_key(claim, reference_version) for claim in claims]
+    values = claim_cache.get_many(keys)
+
+    # Duplicated claims of the batch are priced once
+    missing = {}
+    for claim, key, value in zip(claims, keys, values):
+        if value is None and key not in missing:
+            missing[key] = claim
+
+    priced = {}
+    encoded = {}
+    if missing:
+        priced = dict(zip(missing, price_claims(list(missing.values()), reference_database_connection)))
+        encoded = {key: encode_priced_claim(priced_claim) for key, priced_claim in priced.items()}
+        claim_cache.set_many(encoded)
+
+    priced_claims = []
+    for claim, key, value in zip(claims, keys, values):
+        if value is None and missing[key] is claim:
+            priced_claims.append(priced[key])
+        else:
+            priced_claims.append(decode_priced_claim(value or encoded[key], claim['claim_number']))
+    return priced_claims
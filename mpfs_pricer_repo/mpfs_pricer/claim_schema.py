@@ -0,0 +1,172 @@
+import math
+import operator
+from typing import List, Union
+import orjson
+from mpfs_pricer.utils import parse_date
+
+CLAIM_FIELDS = ("claim_number", "npi", "service_from", "service_to")
+# Field order of the claims in the compact form: the text fields of a line item come before its numbers
+LINE_ITEM_FIELDS = (
+    "service_date", "place_of_service", "code", "mod1", "mod2", "mod3", "mod4", "rendering_provider_npi",
+    "charges", "quantity",
+)
+get_line_item_values = operator.itemgetter(*LINE_ITEM_FIELDS)
+
+# Kinds of the claim and line item fields. Modifiers may be left out or null, they default to ""
+TEXT = "a string"
+DATE = "a date"
+MODIFIER = "a string or null"
+NUMBER = "a number"
+
+CLAIM_SCHEMA = (("claim_number", TEXT), ("npi", TEXT), ("service_from", DATE), ("service_to", DATE))
+LINE_ITEM_SCHEMA = (
+    ("service_date", DATE), ("place_of_service", TEXT), ("code", TEXT), ("mod1", MODIFIER), ("mod2", MODIFIER),
+    ("mod3", MODIFIER), ("mod4", MODIFIER), ("rendering_provider_npi", TEXT), ("charges", NUMBER),
+    ("quantity", NUMBER),
+)
+NUMBER_TYPES = (str, float, int)
+
+
+class ValidatedClaim(dict):
+    """
+    Claim checked against the claim schema: its line items have float charges and quantities and string
+    modifiers, so the pricer reads them as they are. Claims of any other type are validated by the pricer first.
+    """
+
+    __slots__ = ()
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value)
+
+
+def loads(payload: Union[bytes, str]):
+    return orjson.loads(payload)
+
+
+def to_number(value, location: str) -> float:
+    if type(value) is str:
+        try:
+            number = float(value)
+        except ValueError:
+            number = math.nan
+    elif type(value) in (float, int):
+        number = float(value)
+    else:
+        number = math.nan
+    if not math.isfinite(number):
+        raise ValueError(f"{location}: expected {NUMBER}, got {value!r}")
+    return number
+
+
+def check_date(value: str, location: str, dates: set):
+    if value not in dates:
+        try:
+            parse_date(value)
+        except (ValueError, OverflowError):
+            raise ValueError(f"{location}: expected {DATE}, got {value!r}")
+        dates.add(value)
+
+
+def validate_fields(value, schema: tuple, location: str, dates: set) -> dict:
+    if type(value) is not dict:
+        raise ValueError(f"{location}: expected an object, got {value!r}")
+
+    validated = {}
+    for field, kind in schema:
+        field_value = value.get(field)
+        if kind is NUMBER:
+            field_value = to_number(field_value, f"{location}.{field}")
+        elif field_value is None and kind is MODIFIER:
+            field_value = ""
+        elif type(field_value) is not str:
+            error = "is missing" if field not in value else f"expected {kind}, got {field_value!r}"
+            raise ValueError(f"{location}.{field}: {error}")
+        elif kind is DATE:
+            check_date(field_value, f"{location}.{field}", dates)
+        validated[field] = field_value
+    return validated
+
+
+def validate_line_item(line_item, location: str, index: int, dates: set) -> dict:
+    # Fast path for complete line items of well typed fields, anything else is checked field by field
+    try:
+        values = get_line_item_values(line_item)
+        # Joining fails on any text field that isn't a string
+        "".join(values[:-2])
+        charges, quantity = values[-2:]
+        if values[0] in dates and type(charges) in NUMBER_TYPES and type(quantity) in NUMBER_TYPES:
+            charges, quantity = float(charges), float(quantity)
+            if math.isfinite(charges + quantity):
+                return {**line_item, "charges": charges, "quantity": quantity}
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    return validate_fields(line_item, LINE_ITEM_SCHEMA, f"{location}.line_items[{index}]", dates)
+
+
+def validate_claims(data) -> List[ValidatedClaim]:
+    """
+    Checks claims against the claim schema and returns them as ValidatedClaims, with charges and quantities as
+    floats and missing modifiers as "". Claims that are already ValidatedClaims are kept as they are. Raises
+    ValueError naming the first invalid field.
+    """
+    if type(data) is not list:
+        raise ValueError(f"claims: expected a list of claims, got {type(data).__name__}")
+
+    # Dates repeat across line items, each distinct one is parsed once
+    dates = set()
+    claims = []
+    for claim_index, value in enumerate(data):
+        if type(value) is ValidatedClaim:
+            claims.append(value)
+            continue
+        location = f"claims[{claim_index}]"
+        claim = ValidatedClaim(validate_fields(value, CLAIM_SCHEMA, location, dates))
+        line_items = value.get("line_items")
+        if type(line_items) is not list:
+            raise ValueError(f"{location}.line_items: expected a list of line items, got {line_items!r}")
+        claim["line_items"] = [
+            validate_line_item(line_item, location, index, dates) for index, line_item in enumerate(line_items)
+        ]
+        claims.append(claim)
+    return claims
+
+
+def decode_claims(payload: Union[bytes, str]) -> List[ValidatedClaim]:
+    """
+    Parses and validates a /price_claim/ payload in one pass, so malformed claims are rejected before any
+    reference data is looked up.
+    """
+    try:
+        data = orjson.loads(payload)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    return validate_claims(data)
+
+
+def to_compact(claims: List[ValidatedClaim]) -> list:
+    """
+    Returns validated claims as nested lists in the CLAIM_FIELDS and LINE_ITEM_FIELDS order, the form the
+    Celery tasks receive: field names aren't repeated for every line item.
+    """
+    return [
+        [*(claim[field] for field in CLAIM_FIELDS),
+         [[line_item[field] for field in LINE_ITEM_FIELDS] for line_item in claim["line_items"]]]
+        for claim in claims
+    ]
+
+
+def from_compact(claims: list) -> list:
+    """
+    Turns claims in the compact form, built by to_compact from validated claims, back into ValidatedClaims.
+    Claims that are already dicts, sent by former clients of the task, are kept as they are and validated by
+    the pricer.
+    """
+    return [
+        claim if isinstance(claim, dict) else ValidatedClaim(
+            zip(CLAIM_FIELDS, claim),
+            line_items=[dict(zip(LINE_ITEM_FIELDS, line_item)) for line_item in claim[-1]],
+        )
+        for claim in claims
+    ]
@@ -1,4 +1,16 @@
+import time
+from array import array
+from bisect import bisect_left
 from pathlib import Path
+from threading import Lock
+
+# How often (in seconds) the ZPLC file is stat-ed to detect that it was replaced
+ZPLC_RELOAD_CHECK_INTERVAL = 5.0
+
+ZPLC_REGION_WIDTH = 7  # carrier (5) + locality (2)
+
+_zplc_index = None
+_zplc_index_lock = Lock()
 
 
 def get_zplc_data_file():
@@ -10,6 +22,75 @@ def get_zplc_data_file():
     return full_path
 
 
+class ZplcIndex:
+    """
+    Sorted, array-backed ZIP -> (carrier, locality) table built from a ZPLC file.
+
+    Zip codes are kept in a typed int array and regions in a single bytes blob of fixed-width
+    records, so the whole index is a couple of hundred KB and lookups are a binary search.
+    """
+    __slots__ = ("path", "zips", "regions", "signature", "checked_at")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.signature = self.get_signature()
+        self.checked_at = time.monotonic()
+
+        rows = {}
+        with open(path, "rb") as f:
+            for row in f:
+                row_zip, region = row[2:7], row[7:7 + ZPLC_REGION_WIDTH]
+                # The linear scan returned the first matching row, keep the same precedence
+                if row_zip.isdigit() and int(row_zip) not in rows:
+                    rows[int(row_zip)] = region
+
+        self.zips = array("i", sorted(rows))
+        self.regions = b"".join(rows[row_zip] for row_zip in self.zips)
+
+    def get_signature(self):
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_stale(self) -> bool:
+        now = time.monotonic()
+        if now - self.checked_at < ZPLC_RELOAD_CHECK_INTERVAL:
+            return False
+        self.checked_at = now
+        try:
+            return self.get_signature() != self.signature
+        except FileNotFoundError:
+            return False
+
+    def find(self, zip: str):
+        if len(zip) != 5 or not zip.isascii() or not zip.isdigit():
+            return None
+
+        zip_value = int(zip)
+        index = bisect_left(self.zips, zip_value)
+        if index == len(self.zips) or self.zips[index] != zip_value:
+            return None
+
+        region = self.regions[index * ZPLC_REGION_WIDTH:(index + 1) * ZPLC_REGION_WIDTH].decode()
+        return {
+            "zip": zip,
+            "carrier": region[0:5],
+            "locality": region[5:7],
+        }
+
+
+def get_zplc_index() -> ZplcIndex:
+    global _zplc_index
+
+    index = _zplc_index
+    if index is not None and not index.is_stale():
+        return index
+
+    with _zplc_index_lock:
+        if _zplc_index is index:
+            _zplc_index = ZplcIndex(get_zplc_data_file())
+        return _zplc_index
+
+
 def find_region_by_zip(zip):
     if zip is None:
         return None
@@ -17,18 +98,4 @@ def find_region_by_zip(zip):
     if not isinstance(zip, str):
         raise ValueError("Invalid zipcode data.")
 
-    zip = zip[0:5]
-
-    file = get_zplc_data_file()
-
-    with open(file) as f:
-        for row in f:
-            row_zip, carrier, locality = row[2:7], row[7:12], row[12:14]
-            if row_zip == zip:
-                return {
-                    "zip": row_zip,
-                    "carrier": carrier,
-                    "locality": locality,
-                }
-
-    return None
+    return get_zplc_index().find(zip[0:5])
@@ -1,6 +1,11 @@
 import os
-import psycopg2
+import time
 import logging
+import weakref
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, Sequence, Tuple
+from mpfs_pricer.lookup_cache import LookupCache
 
 DEFAULT_USER = "pricer_read_only"
 DEFAULT_HOST = ""
@@ -28,6 +33,366 @@ def get_db_config_from_env(db_name=None):
 
 
 def get_db(db_config):
+    # psycopg2 is imported with the first connection, pricing from local reference data never needs it
+    import psycopg2
+
     conn = psycopg2.connect(
         f"host={db_config['host']} dbname={db_config['database']} user={db_config['user']} port={db_config['port']} password={db_config['password']}")
     return conn
+
+
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "5"))
+# Seconds to wait for a free connection when the pool is exhausted
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Connections idle for longer than this are closed (down to DB_POOL_MIN_SIZE)
+DB_POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", "300"))
+# Connections idle for longer than this are pinged before being handed out
+DB_POOL_HEALTH_CHECK_AFTER = float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of reference database connections.
+
+    Connections are health checked before reuse when they sat idle, idle connections above the minimum
+    size are recycled, and a forked child never reuses (or closes) the connections of its parent.
+    """
+
+    def __init__(self, db_config: dict, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT, max_idle: float = DB_POOL_MAX_IDLE,
+                 health_check_after: float = DB_POOL_HEALTH_CHECK_AFTER):
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.condition = Condition(Lock())
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.idle = []  # (connection, returned_at), most recently returned last
+        self.size = 0
+
+    def check_fork(self):
+        if self.pid != os.getpid():
+            # Keep the inherited connections referenced: closing them would terminate the parent's sessions
+            inherited_connections.extend(connection for connection, _ in self.idle)
+            self.condition = Condition(Lock())
+            self.reset()
+
+    def discard(self, connection):
+        import psycopg2
+
+        self.size -= 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def is_healthy(self, connection, returned_at: float) -> bool:
+        import psycopg2
+
+        if connection.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_after:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def recycle_idle(self):
+        now = time.monotonic()
+        while len(self.idle) > 0 and self.size > self.min_size and now - self.idle[0][1] > self.max_idle:
+            connection, _ = self.idle.pop(0)
+            self.discard(connection)
+
+    def open(self):
+        # Opens connections up to the minimum pool size
+        self.check_fork()
+        while True:
+            with self.condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            try:
+                connection = get_db(self.db_config)
+            except Exception:
+                with self.condition:
+                    self.size -= 1
+                raise
+            self.putconn(connection)
+
+    def reserve(self, deadline: float):
+        """
+        Takes the most recently returned idle connection, or reserves room for a new one (returns None).
+        Called with the condition held.
+        """
+        while True:
+            if self.idle:
+                return self.idle.pop()
+            if self.size < self.max_size:
+                self.size += 1
+                return None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.condition.wait(remaining):
+                import psycopg2.pool
+
+                raise psycopg2.pool.PoolError(f"No database connection available after {self.timeout}s")
+
+    def getconn(self):
+        self.check_fork()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.condition:
+                self.recycle_idle()
+                idle = self.reserve(deadline)
+            if idle is None:
+                break
+
+            # The health check talks to the server, other threads keep using the pool meanwhile
+            connection, returned_at = idle
+            if self.is_healthy(connection, returned_at):
+                return connection
+            with self.condition:
+                self.discard(connection)
+                self.condition.notify()
+
+        try:
+            return get_db(self.db_config)
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def putconn(self, connection):
+        if self.pid != os.getpid():
+            # Connection was checked out before a fork, it belongs to the parent
+            return
+
+        import psycopg2
+
+        with self.condition:
+            broken = bool(connection.closed)
+            if not broken:
+                try:
+                    # Reference queries are read-only, end the implicit transaction before reuse
+                    connection.rollback()
+                except psycopg2.Error:
+                    broken = True
+
+            if broken:
+                self.discard(connection)
+            else:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        connection = self.getconn()
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    def close(self):
+        self.check_fork()
+        with self.condition:
+            while self.idle:
+                connection, _ = self.idle.pop()
+                self.discard(connection)
+
+
+inherited_connections = []
+db_pools = {}
+db_pools_lock = Lock()
+
+
+def get_db_pool(db_name=None) -> ConnectionPool:
+    with db_pools_lock:
+        pool = db_pools.get(db_name)
+        if pool is None:
+            pool = ConnectionPool(get_db_config_from_env(db_name))
+            db_pools[db_name] = pool
+        return pool
+
+
+# Set DB_PREPARED_STATEMENTS=false when connecting through a transaction pooling proxy (e.g. pgbouncer)
+DB_PREPARED_STATEMENTS = os.environ.get("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+
+# Names of the statements already prepared on each connection
+prepared_statements = weakref.WeakKeyDictionary()
+
+
+def to_prepared_query(query: str) -> str:
+    # Replaces the psycopg2 placeholders with positional parameters: "a = %s and b = %s" -> "a = $1 and b = $2"
+    parts = query.split("%s")
+    return "".join(part + (f"${index}" if index < len(parts) else "") for index, part in enumerate(parts, 1))
+
+
+def execute_statement(db, name: str, query: str, params: Sequence):
+    """
+    Executes a lookup query as a server-side prepared statement. The statement is PREPAREd the first time
+    it runs on a connection and EXECUTEd afterwards, so Postgres parses and plans it once per connection.
+    """
+    cursor = db.cursor()
+
+    if not DB_PREPARED_STATEMENTS:
+        cursor.execute(query, params)
+        return cursor
+
+    names = prepared_statements.setdefault(db, set())
+    if name not in names:
+        cursor.execute(f"PREPARE {name} AS {to_prepared_query(query)}")
+        names.add(name)
+
+    cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    return cursor
+
+
+# Maximum number of keys resolved by a single batched lookup statement
+LOOKUP_BATCH_SIZE = 512
+
+PARAM_TYPES_QUERY = "SELECT parameter_types::text[] FROM pg_prepared_statements WHERE name = %s"
+
+# Lookup name -> Postgres types of the parameters of its query, the same on every connection
+lookup_param_types = {}
+
+
+def get_param_types(db, name: str, query: str) -> List[str]:
+    """
+    Returns the types Postgres infers for the parameters of a single-key lookup query, from the columns they
+    are compared with. They are read once per process from a statement prepared for the purpose.
+    """
+    param_types = lookup_param_types.get(name)
+    if param_types is None:
+        statement = f"{name}_types"
+        cursor = db.cursor()
+        cursor.execute(f"PREPARE {statement} AS {to_prepared_query(query)}")
+        try:
+            cursor.execute(PARAM_TYPES_QUERY, [statement])
+            param_types = lookup_param_types[name] = cursor.fetchone()[0]
+        finally:
+            cursor.execute(f"DEALLOCATE {statement}")
+    return param_types
+
+
+def to_param_text(value):
+    # Parameters are sent as text arrays and cast to the parameter types, like untyped literals would be
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def iter_lookup_batches(params_list: List[Sequence]) -> Iterator[Tuple[int, list]]:
+    """
+    Splits the keys of a lookup into batches. Yields (index of the first key, params), the params being one
+    text array per parameter of the single-key query.
+    """
+    for start in range(0, len(params_list), LOOKUP_BATCH_SIZE):
+        chunk = params_list[start:start + LOOKUP_BATCH_SIZE]
+        yield start, [[to_param_text(value) for value in values] for values in zip(*chunk)]
+
+
+def get_lookup_statement(query: str, param_types: Sequence[str], first_row_only: bool = True) -> str:
+    """
+    Runs a single-key lookup query once per key of the unnested parameter arrays. The key parameters are cast
+    from text to the types Postgres infers for the single-key query, so every key keeps the semantics of the
+    single lookup; rows come with the 0-based index of their key.
+    """
+    columns = [f"p{index}" for index in range(len(param_types))]
+    parts = query.split("%s")
+    key_query = "".join(part + (f"k.{columns[index]}" if index < len(columns) else "") for index, part in enumerate(parts))
+    arrays = ", ".join(f"%s::text[]::{param_type}[]" for param_type in param_types)
+    limit = " LIMIT 1" if first_row_only else ""
+    return (
+        f"SELECT k.key_index - 1, q.* FROM unnest({arrays}) WITH ORDINALITY AS k({', '.join(columns)}, key_index) "
+        f"CROSS JOIN LATERAL ({key_query}{limit}) AS q"
+    )
+
+
+def add_lookup_rows(results: List[List[tuple]], start: int, rows: Iterable[Sequence]):
+    for row in rows:
+        results[start + row[0]].append(tuple(row[1:]))
+
+
+def fetch_lookups(db, name: str, query: str, params_list: List[Sequence],
+                  first_row_only: bool = True) -> List[List[tuple]]:
+    """
+    Runs a single-key lookup query for many keys in one round trip per LOOKUP_BATCH_SIZE keys, with a single
+    prepared statement whatever the number of keys. Returns the rows of each key in the same order as
+    `params_list`.
+    """
+    results = [[] for _ in params_list]
+    if not params_list:
+        return results
+
+    statement = get_lookup_statement(query, get_param_types(db, name, query), first_row_only)
+    for start, params in iter_lookup_batches(params_list):
+        cursor = execute_statement(db, name, statement, params)
+        add_lookup_rows(results, start, cursor)
+
+    return results
+
+
+def rollback(db):
+    """
+    Ends the transaction a failed query left `db` in, so the next queries of the connection can run.
+    """
+    import psycopg2
+
+    if db is None or db.closed:
+        return
+    try:
+        db.rollback()
+    except psycopg2.Error:
+        pass
+
+
+class Lookup:
+    """
+    A single-key reference lookup that can be resolved for many keys at once, by fetch_lookups here or by
+    the async driver. `get_params` turns a key into the query parameters and `from_rows` turns the rows of
+    a key into its value. With a `cache`, fetch only queries the keys missing from the cache of the reference
+    version of `db`.
+    """
+
+    def __init__(self, name: str, query: str, get_params: Callable[[Hashable], list],
+                 from_rows: Callable[[List[tuple]], Any], first_row_only: bool = True, cache: LookupCache = None):
+        self.name = name
+        self.query = query
+        self.get_params = get_params
+        self.from_rows = from_rows
+        self.first_row_only = first_row_only
+        self.cache = cache
+
+    def get_params_list(self, keys: List[Hashable]) -> List[list]:
+        return [self.get_params(key) for key in keys]
+
+    def to_results(self, keys: List[Hashable], rows: List[List[tuple]]) -> dict:
+        return {key: self.from_rows(key_rows) for key, key_rows in zip(keys, rows)}
+
+    def fetch_rows(self, db, keys: List[Hashable]) -> List[List[tuple]]:
+        return fetch_lookups(db, self.name, self.query, self.get_params_list(keys), self.first_row_only)
+
+    def fetch(self, db, keys: Iterable[Hashable]) -> dict:
+        keys = list(dict.fromkeys(keys))
+        if self.cache is not None and self.cache.enabled:
+            # Imported here: the reference version is read through the database pool
+            from mpfs_pricer.reference_version import get_reference_version
+
+            try:
+                version = get_reference_version(db)
+            except Exception:
+                logging.warning(f"Reference version unavailable, querying {self.name} without the lookup cache",
+                                exc_info=True)
+                rollback(db)
+            else:
+                return self.cache.fetch(keys, lambda missing: self.fetch_rows(db, missing), self.from_rows, version)
+        return self.to_results(keys, self.fetch_rows(db, keys))
@@ -0,0 +1,335 @@
+import argparse
+import csv
+import logging
+import os
+import re
+from array import array
+from bisect import bisect_right
+from datetime import date
+from pathlib import Path
+from sys import intern
+from threading import Lock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from mpfs_pricer import metrics, rvu
+from mpfs_pricer.anes_snapshot import AnesQuarterSnapshot
+from mpfs_pricer.database import get_db_pool
+from mpfs_pricer.gpci_snapshot import GpciQuarterSnapshot
+from mpfs_pricer.ncci_index import NcciQuarterIndex
+from mpfs_pricer.prefetch import ReferenceBackend
+from mpfs_pricer.rvu_snapshot import RvuQuarterSnapshot
+from mpfs_pricer.utils import parse_date
+
+DATABASE_BACKEND = "database"
+FILES_BACKEND = "files"
+SNAPSHOT_BACKEND = "snapshot"
+
+# Source of the reference data when no database connection is given: "database", "files" or "snapshot"
+REFERENCE_BACKEND = os.environ.get("REFERENCE_BACKEND", DATABASE_BACKEND)
+
+# Directory of the reference tables exported by `python -m mpfs_pricer.file_reference`
+REFERENCE_FILES_DIR = os.environ.get("REFERENCE_FILES_DIR", "")
+
+# Set REFERENCE_FILES_FALLBACK=true to price from the reference files while the reference database can't be reached
+REFERENCE_FILES_FALLBACK = os.environ.get("REFERENCE_FILES_FALLBACK", "false").lower() == "true"
+
+BUNDLED_DATA_DIR = Path(__file__).parent / "data" / "pfs_relative_value_data_files"
+
+# Anesthesia conversion factors bundled per calendar year
+ANES_CONVERSION_FACTOR_FILE = re.compile(r"ANES(\d{4})\.csv")
+
+PROVIDERS_FILE = "providers.csv"
+GPCI_FILE = "gpci.csv"
+RVU_FILE = "rvu.csv"
+BASE_UNITS_FILE = "anes_base_units.csv"
+CONVERSION_FACTORS_FILE = "anes_conversion_factors.csv"
+NCCI_FILE = "ncci.csv"
+
+# Reference tables exported to the reference files, the columns are read back in this order
+EXPORT_QUERIES = {
+    PROVIDERS_FILE: """
+        SELECT npi, "Provider Business Practice Location Address Postal Code", "Healthcare Provider Taxonomy Code_1"
+        FROM internal_reference.cms_nppes_npidata_pfile_20210411
+        ORDER BY npi
+    """,
+    GPCI_FILE: """
+        SELECT
+            "Medicare Administrative Contractor", "Locality Number", "Locality Name", "PW GPCI",
+            "PE GPCI", "MP GPCI", eff_start_dt, eff_end_dt
+        FROM internal_reference.cms_gpci
+    """,
+    RVU_FILE: f"""
+        SELECT
+            {rvu.RVU_COLUMNS}, eff_start_dt, eff_end_dt
+        FROM internal_reference.cms_pfs_rvu
+    """,
+    BASE_UNITS_FILE: """
+        SELECT code, base_unit, beg_eff_date, end_eff_date
+        FROM internal_reference.cms_pfs_anesthesia_base_units
+    """,
+    CONVERSION_FACTORS_FILE: """
+        SELECT TRIM(contractor), locality, "Conversion_Factor", beg_eff_date, end_eff_date
+        FROM internal_reference.cms_pfs_anes_conversion_factor
+    """,
+    NCCI_FILE: """
+        SELECT col1, col2, effective_date, deletion_date, modifier
+        FROM internal_reference.cms_ncci_ptp_practitioner_edits
+        WHERE effective_date IS NOT NULL
+        ORDER BY col1, col2, effective_date
+    """,
+}
+
+RVU_FLOAT_COLUMNS = {
+    "WORK RVU", "NON-FAC PE RVU", "FACILITY PE RVU", "MP RVU", "NON-FACILITY TOTAL", "FACILITY TOTAL", "PRE OP",
+    "INTRA OP", "POST OP", "CONV FACTOR", "NON-FACILITY PE USED FOR OPPS PAYMENT AMOUNT",
+    "FACILITY PE USED FOR OPPS PAYMENT AMOUNT", "MP USED FOR OPPS PAYMENT AMOUNT",
+}
+
+_file_reference = None
+_file_reference_lock = Lock()
+
+
+def to_text(value: str) -> Optional[str]:
+    # Exported NULLs are empty fields
+    return intern(value) if value != "" else None
+
+
+def to_float(value: str) -> Optional[float]:
+    return float(value) if value != "" else None
+
+
+def to_date(value: str) -> Optional[date]:
+    return parse_date(value) if value != "" else None
+
+
+def get_rvu_converters() -> List[Callable[[str], object]]:
+    names = [name.strip().strip('"') for name in rvu.RVU_COLUMNS.split(",")]
+    return [to_float if name in RVU_FLOAT_COLUMNS else to_text for name in names] + [to_date, to_date]
+
+
+def read_rows(path: Path, converters: Sequence[Callable[[str], object]]) -> Iterator[tuple]:
+    """
+    Reads a CSV file with a header line into rows of typed values.
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if row:
+                yield tuple(converter(value) for converter, value in zip(converters, row))
+
+
+def read_bundled_conversion_factors(data_dir: Path = BUNDLED_DATA_DIR) -> List[tuple]:
+    """
+    Reads the ANES<year>.csv files shipped with the package into (contractor, locality, conversion factor,
+    start, end) rows effective for their whole year.
+    """
+    rows = []
+    for path in sorted(data_dir.glob("ANES*.csv")):
+        match = ANES_CONVERSION_FACTOR_FILE.fullmatch(path.name)
+        if not match:
+            continue
+        year = int(match.group(1))
+        start, end = date(year, 1, 1), date(year, 12, 31)
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 4 and row[0].strip() and row[3].strip():
+                    rows.append((row[0].strip(), row[1].strip(), float(row[3]), start, end))
+    return rows
+
+
+def to_npi_number(npi: str) -> Optional[int]:
+    # NPIs are 10 digit numbers, anything else can't be priced anyway
+    return int(npi) if npi and len(npi) <= 18 and npi.isascii() and npi.isdigit() else None
+
+
+class ProviderIndex:
+    """
+    Compact copy of the providers table. NPIs are kept as a sorted array of integers, ZIP codes and taxonomy
+    codes as indexes into their distinct values, so a provider costs 16 bytes instead of a dict entry and a
+    tuple of strings. Rows exported in NPI order are loaded without sorting.
+    """
+
+    def __init__(self, rows: Iterable[tuple]):
+        self.npis = array("Q")
+        self.zip_ids = array("I")
+        self.taxonomy_ids = array("I")
+        self.values = []
+        value_ids = {}
+
+        def get_value_id(value: Optional[str]) -> int:
+            value_id = value_ids.get(value)
+            if value_id is None:
+                value_id = value_ids[value] = len(self.values)
+                self.values.append(value)
+            return value_id
+
+        ordered = True
+        for npi, zip_code, taxonomy_code in rows:
+            number = to_npi_number(npi)
+            if number is None:
+                continue
+            if self.npis and number < self.npis[-1]:
+                ordered = False
+            self.npis.append(number)
+            self.zip_ids.append(get_value_id(zip_code))
+            self.taxonomy_ids.append(get_value_id(taxonomy_code))
+
+        if not ordered:
+            # The sort is stable: like a dict, the last row of a duplicated NPI wins
+            order = sorted(range(len(self.npis)), key=self.npis.__getitem__)
+            self.npis = array("Q", (self.npis[position] for position in order))
+            self.zip_ids = array("I", (self.zip_ids[position] for position in order))
+            self.taxonomy_ids = array("I", (self.taxonomy_ids[position] for position in order))
+
+    def __len__(self):
+        return len(self.npis)
+
+    def find(self, npi: str) -> Tuple[Optional[str], Optional[str]]:
+        number = to_npi_number(npi)
+        if number is not None:
+            position = bisect_right(self.npis, number) - 1
+            if position >= 0 and self.npis[position] == number:
+                return self.values[self.zip_ids[position]], self.values[self.taxonomy_ids[position]]
+        return None, None
+
+
+def is_ordered(rows: Iterable[tuple]) -> bool:
+    previous = None
+    for row in rows:
+        if previous is not None and row < previous:
+            return False
+        previous = row
+    return True
+
+
+class FileReference(ReferenceBackend):
+    """
+    Reference data served from local files: the reference tables exported to `directory` and the anesthesia
+    conversion factors bundled with the package (unless the export includes them). Everything is loaded into
+    the same indexes as the quarter snapshots, covering every effective date of the files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+        self.providers = ProviderIndex(read_rows(self.get_path(PROVIDERS_FILE), [str, to_text, to_text]))
+        self.gpci = GpciQuarterSnapshot(None, list(read_rows(
+            self.get_path(GPCI_FILE), [to_text, to_text, to_text, to_float, to_float, to_float, to_date, to_date]
+        )))
+        self.rvus = RvuQuarterSnapshot(None, list(read_rows(self.get_path(RVU_FILE), get_rvu_converters())))
+
+        base_unit_rows = list(read_rows(self.get_path(BASE_UNITS_FILE), [to_text, to_float, to_date, to_date]))
+        if (self.directory / CONVERSION_FACTORS_FILE).exists():
+            conversion_factor_rows = list(read_rows(
+                self.directory / CONVERSION_FACTORS_FILE, [to_text, to_text, to_float, to_date, to_date]
+            ))
+        else:
+            conversion_factor_rows = read_bundled_conversion_factors()
+        self.anes = AnesQuarterSnapshot(None, base_unit_rows, conversion_factor_rows)
+
+        # The index is built from rows ordered by code pair and effective date. Exports are ordered and streamed
+        # into it: only files exported before the ORDER BY are sorted in memory.
+        ncci_path = self.get_path(NCCI_FILE)
+        ncci_rows = read_rows(ncci_path, [to_text, to_text, to_date, to_date, to_text])
+        if not is_ordered(read_rows(ncci_path, [to_text, to_text, to_date])):
+            logging.warning(f"{ncci_path} is not ordered by code pair and effective date, export it again.")
+            ncci_rows = sorted(ncci_rows, key=lambda row: (row[0], row[1], row[2]))
+        self.ncci = NcciQuarterIndex(None, ncci_rows)
+
+    def reload(self) -> "FileReference":
+        return FileReference(self.directory)
+
+    def get_path(self, name: str) -> Path:
+        path = self.directory / name
+        if not path.exists():
+            raise ValueError(f"No {name} reference file found in {self.directory}.")
+        return path
+
+    @metrics.timed(metrics.STAGE_NPI)
+    def find_providers_by_npis(self, npis: List[str]) -> Dict[str, Tuple[str, str]]:
+        return {npi: self.providers.find(npi) for npi in npis}
+
+    @metrics.timed(metrics.STAGE_GPCI)
+    def get_gpci_many(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+        return {key: self.gpci.find(key[0], key[1], parse_date(key[2])) for key in dict.fromkeys(keys)}
+
+    @metrics.timed(metrics.STAGE_RVU)
+    def get_rvus_many(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+        return {key: self.rvus.find(key[0], key[1] or None, parse_date(key[2])) for key in dict.fromkeys(keys)}
+
+    @metrics.timed(metrics.STAGE_ANES_BASE_UNITS)
+    def get_base_units(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        return {key: self.anes.find_base_unit(key[0], parse_date(key[1])) for key in dict.fromkeys(keys)}
+
+    @metrics.timed(metrics.STAGE_ANES_CONVERSION_FACTORS)
+    def get_conversion_factors(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], float]:
+        return {
+            key: self.anes.find_conversion_factor(key[0], key[1], parse_date(key[2])) for key in dict.fromkeys(keys)
+        }
+
+    @metrics.timed(metrics.STAGE_NCCI)
+    def get_ncci_many(self, keys: List[Tuple[str, str, date]]) -> Dict[Tuple[str, str, date], List[dict]]:
+        return {key: self.ncci.find(*key) for key in dict.fromkeys(keys)}
+
+
+def get_file_reference() -> FileReference:
+    """
+    Returns the reference files of REFERENCE_FILES_DIR, loaded once per process.
+    """
+    global _file_reference
+
+    if _file_reference is not None:
+        return _file_reference
+
+    with _file_reference_lock:
+        if _file_reference is None:
+            if not REFERENCE_FILES_DIR:
+                raise ValueError("Set REFERENCE_FILES_DIR to the directory of the exported reference files.")
+            _file_reference = FileReference(REFERENCE_FILES_DIR)
+        return _file_reference
+
+
+def is_local_backend() -> bool:
+    return REFERENCE_BACKEND in (FILES_BACKEND, SNAPSHOT_BACKEND)
+
+
+def get_local_reference() -> ReferenceBackend:
+    """
+    Returns the reference backend of REFERENCE_BACKEND=files or REFERENCE_BACKEND=snapshot.
+    """
+    if REFERENCE_BACKEND == SNAPSHOT_BACKEND:
+        from mpfs_pricer.binary_snapshot import get_snapshot_reference
+
+        return get_snapshot_reference()
+    return get_file_reference()
+
+
+def export_reference(db, directory: str):
+    """
+    Exports the reference tables needed by FileReference to CSV files in `directory`.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for name, query in EXPORT_QUERIES.items():
+        logging.info(f"Exporting {name}")
+        with open(Path(directory) / name, "w", newline="") as f:
+            db.cursor().copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mpfs_pricer.file_reference",
+        description="Exports the reference tables of the reference database for REFERENCE_BACKEND=files.",
+    )
+    parser.add_argument("directory", help="directory of the reference files")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    with get_db_pool("t_data").connection() as db:
+        export_reference(db, args.directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,34 @@
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer.database import Lookup, execute_statement
+from mpfs_pricer.lookup_cache import LookupCache, get_table_ttl
+
+GPCI_QUERY = """
+        SELECT
+            "Medicare Administrative Contractor", "Locality Number", "Locality Name", "PW GPCI",
+            "PE GPCI", "MP GPCI", eff_start_dt, eff_end_dt
+        FROM internal_reference.cms_gpci
+        where
+            "Medicare Administrative Contractor" = %s and
+            "Locality Number" = %s and
+            eff_start_dt <= %s and
+            eff_end_dt >= %s
+
+    """
+
+
 def get_gpci(db, carrier_to_find, locality_code_to_find, date_of_service):
-    query = """
-            SELECT
-                "Medicare Administrative Contractor", "Locality Number", "Locality Name", "PW GPCI",
-                "PE GPCI", "MP GPCI", eff_start_dt, eff_end_dt
-            FROM internal_reference.cms_gpci
-            where
-                "Medicare Administrative Contractor" = %s and
-                "Locality Number" = %s and
-                eff_start_dt <= %s and
-                eff_end_dt >= %s
-
-        """
-
-    cursor = db.cursor()
-    cursor.execute(query, [carrier_to_find, locality_code_to_find, date_of_service, date_of_service])
+    cursor = execute_statement(
+        db, "get_gpci", GPCI_QUERY, [carrier_to_find, locality_code_to_find, date_of_service, date_of_service]
+    )
 
     res = cursor.fetchone()
     if not res:
         return None
 
+    return gpci_from_row(res)
+
+
+def gpci_from_row(res: tuple) -> dict:
     carrier = res[0]
     locality_code = res[1]
     locality_name = res[2]
@@ -36,3 +46,19 @@ def get_gpci(db, carrier_to_find, locality_code_to_find, date_of_service):
     }
 
     return found_data
+
+
+GPCI_LOOKUP = Lookup(
+    "get_gpci_many", GPCI_QUERY,
+    lambda key: [key[0], key[1], key[2], key[2]],
+    lambda rows: gpci_from_row(rows[0]) if rows else None,
+    cache=LookupCache("gpci", get_table_ttl("gpci", 604800)),
+)
+
+
+def get_gpci_many(db, keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+    """
+    Batched get_gpci: resolves every (carrier, locality, date_of_service) key in one round trip.
+    Keys without GPCI values map to None.
+    """
+    return GPCI_LOOKUP.fetch(db, keys)
@@ -0,0 +1,87 @@
+import os
+from array import array
+from datetime import date
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer import gpci, metrics
+from mpfs_pricer.snapshots import IntervalIndex, Quarter, QuarterSnapshots, get_quarter_bounds, get_region_key
+from mpfs_pricer.utils import parse_date
+
+# Number of quarters kept in memory, least recently used quarters are evicted. 0 disables the snapshot.
+GPCI_SNAPSHOT_MAX_QUARTERS = int(os.environ.get("GPCI_SNAPSHOT_MAX_QUARTERS", "4"))
+
+GPCI_SNAPSHOT_QUERY = """
+        SELECT
+            "Medicare Administrative Contractor", "Locality Number", "Locality Name", "PW GPCI",
+            "PE GPCI", "MP GPCI", eff_start_dt, eff_end_dt
+        FROM internal_reference.cms_gpci
+        where
+            eff_start_dt <= %s and
+            eff_end_dt >= %s
+    """
+
+
+class GpciQuarterSnapshot:
+    """
+    Copy of the GPCI rows effective during one quarter, indexed by region and effective date interval.
+    """
+
+    def __init__(self, quarter: Quarter, rows: list):
+        self.quarter = quarter
+
+        # Last two columns are the effective date interval
+        self.rows = [tuple(row[:-2]) for row in rows]
+        self.intervals = IntervalIndex(
+            [get_region_key(row[0], row[1]) for row in rows],
+            array("i", [row[-2].toordinal() for row in rows]),
+            array("i", [row[-1].toordinal() for row in rows]),
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def find(self, carrier: str, locality: str, service_date: date):
+        row_index = self.intervals.find(get_region_key(carrier, locality), service_date)
+        if row_index is None:
+            return None
+
+        return gpci.gpci_from_row(self.rows[row_index])
+
+
+class GpciSnapshot(QuarterSnapshots):
+    """
+    Per-process cache of GPCI quarter snapshots.
+    """
+
+    def __init__(self, max_quarters: int = GPCI_SNAPSHOT_MAX_QUARTERS):
+        super().__init__(max_quarters)
+
+    def load_quarter(self, db, quarter: Quarter) -> GpciQuarterSnapshot:
+        start, end = get_quarter_bounds(quarter)
+
+        cursor = db.cursor()
+        cursor.execute(GPCI_SNAPSHOT_QUERY, [end, start])
+
+        return GpciQuarterSnapshot(quarter, cursor.fetchall())
+
+    def get_gpci(self, db, carrier, locality, date_of_service):
+        service_date = parse_date(date_of_service)
+        return self.get_service_date_snapshot(db, service_date).find(carrier, locality, service_date)
+
+
+gpci_snapshot = GpciSnapshot()
+
+
+def get_gpci(db, carrier, locality, date_of_service):
+    if not gpci_snapshot.enabled:
+        return gpci.get_gpci(db, carrier, locality, date_of_service)
+
+    return gpci_snapshot.get_gpci(db, carrier, locality, date_of_service)
+
+
+@metrics.timed(metrics.STAGE_GPCI)
+def get_gpci_many(db, keys: Iterable[Tuple[str, str, str]],
+                  snapshot: GpciSnapshot = gpci_snapshot) -> Dict[Tuple[str, str, str], dict]:
+    if not snapshot.enabled:
+        return gpci.get_gpci_many(db, keys)
+
+    return {key: snapshot.get_gpci(db, *key) for key in dict.fromkeys(keys)}
@@ -0,0 +1,114 @@
+from typing import List, Union
+
+# Field order of the serialized line item in pricing responses
+PRICED_LINE_ITEM_FIELDS = (
+    "code",
+    "mod1",
+    "mod2",
+    "mod3",
+    "mod4",
+    "charges",
+    "quantity",
+    "locality_name",
+    "quarter",
+    "wrvu",
+    "pe_rvu",
+    "mp_rvu",
+    "pw_gpci",
+    "pe_gpci",
+    "mp_gpci",
+    "conversion_factor",
+    "global_surgery_code",
+    "line_item_payment",
+    "comments",
+    "asst_surg",
+    "co_surg",
+    "team_surg",
+    "multi_proc",
+    "bilat_surg",
+    "pre_op",
+    "intra_op",
+    "post_op",
+    "provider_taxonomy_code",
+    "endo_base",
+    "service_date",
+    "anes_base_unit",
+    "anes_conversion_factor",
+)
+
+
+class PricedLineItem:
+    """
+    Payment details of a priced line item.
+
+    Adjustments read and update the attributes directly; the record is turned into a dict with to_dict only
+    when a response is serialized. Item access (line_item["line_item_payment"]) is kept for callers written
+    against the former dict representation.
+    """
+
+    __slots__ = PRICED_LINE_ITEM_FIELDS + ("mods",)
+
+    def __init__(self, code: str, mod1: str, mod2: str, mod3: str, mod4: str, charges: float, quantity: float,
+                 locality_name: str, quarter: str, wrvu: float, pe_rvu: float, mp_rvu: float, pw_gpci: float,
+                 pe_gpci: float, mp_gpci: float, conversion_factor: float, global_surgery_code: str,
+                 line_item_payment: float, comments: List[str], asst_surg: int, co_surg: int, team_surg: int,
+                 multi_proc: int, bilat_surg: int, pre_op: float, intra_op: float, post_op: float,
+                 provider_taxonomy_code: str, endo_base: str, service_date: str,
+                 anes_base_unit: Union[float, None], anes_conversion_factor: Union[float, None]):
+        self.code = code
+        self.mod1 = mod1
+        self.mod2 = mod2
+        self.mod3 = mod3
+        self.mod4 = mod4
+        self.charges = charges
+        self.quantity = quantity
+        self.locality_name = locality_name
+        self.quarter = quarter
+        self.wrvu = wrvu
+        self.pe_rvu = pe_rvu
+        self.mp_rvu = mp_rvu
+        self.pw_gpci = pw_gpci
+        self.pe_gpci = pe_gpci
+        self.mp_gpci = mp_gpci
+        self.conversion_factor = conversion_factor
+        self.global_surgery_code = global_surgery_code
+        self.line_item_payment = line_item_payment
+        self.comments = comments
+        self.asst_surg = asst_surg
+        self.co_surg = co_surg
+        self.team_surg = team_surg
+        self.multi_proc = multi_proc
+        self.bilat_surg = bilat_surg
+        self.pre_op = pre_op
+        self.intra_op = intra_op
+        self.post_op = post_op
+        self.provider_taxonomy_code = provider_taxonomy_code
+        self.endo_base = endo_base
+        self.service_date = service_date
+        self.anes_base_unit = anes_base_unit
+        self.anes_conversion_factor = anes_conversion_factor
+        # Modifiers are checked by most adjustments, keep them together
+        self.mods = (mod1, mod2, mod3, mod4)
+
+    def __getitem__(self, key: str):
+        if key not in PRICED_LINE_ITEM_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in PRICED_LINE_ITEM_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, PricedLineItem):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"PricedLineItem({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in PRICED_LINE_ITEM_FIELDS}
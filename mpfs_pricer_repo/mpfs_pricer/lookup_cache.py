@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+from mpfs_pricer.redis_client import get_redis
+
+# Number of lookup results kept in memory per table, least recently used results are evicted. 0 disables the
+# in-process tier.
+LOOKUP_CACHE_SIZE = int(os.environ.get("LOOKUP_CACHE_SIZE", "0"))
+
+# Set LOOKUP_CACHE_REDIS=true to share the lookup results of every process in Redis
+LOOKUP_CACHE_REDIS = os.environ.get("LOOKUP_CACHE_REDIS", "false").lower() == "true"
+
+LOOKUP_CACHE_KEY_PREFIX = "mpfs_pricer:lookup:1:"
+
+MISSING = object()
+
+
+def get_table_ttl(table: str, default: int) -> int:
+    # Seconds the lookup results of a table are kept in Redis, LOOKUP_CACHE_TTL_<TABLE> overrides the default
+    return int(os.environ.get(f"LOOKUP_CACHE_TTL_{table.upper()}", str(default)))
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {"t": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.toordinal()}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    raise TypeError(f"Can't cache values of type {type(value).__name__}")
+
+
+def decode_value(value: dict):
+    if "d" in value:
+        return date.fromordinal(value["d"])
+    if "n" in value:
+        return Decimal(value["n"])
+    return datetime.fromisoformat(value["t"])
+
+
+def encode_rows(rows: List[tuple]) -> bytes:
+    # Rows are cached rather than the values built from them: no repeated column names
+    return json.dumps(rows, separators=(",", ":"), default=encode_value).encode()
+
+
+def decode_rows(value: bytes) -> List[tuple]:
+    return [tuple(row) for row in json.loads(value, object_hook=decode_value)]
+
+
+class LookupCache:
+    """
+    Two-tier cache of the results of a batched lookup: a per-process LRU cache in front of Redis, which is
+    shared by every uWSGI and Celery process. Keys missing from both tiers are resolved with one call to the
+    database and Redis is read and written in one round trip per batch.
+
+    Results are cached per reference version: Redis keys include it and the in-process tier is cleared when a
+    lookup comes with a new version.
+    """
+
+    def __init__(self, table: str, ttl: int, max_size: int = None):
+        self.table = table
+        self.ttl = ttl
+        self.max_size = LOOKUP_CACHE_SIZE if max_size is None else max_size
+        self.values = OrderedDict()
+        self.version = None  # Reference version of the in-process tier
+        self.lock = Lock()
+
+    @property
+    def redis_enabled(self) -> bool:
+        return LOOKUP_CACHE_REDIS and self.ttl > 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 or self.redis_enabled
+
+    def __len__(self):
+        return len(self.values)
+
+    def get_redis_key(self, key: Hashable, version: str) -> str:
+        return f"{LOOKUP_CACHE_KEY_PREFIX}{version}:{self.table}:{json.dumps(key, separators=(',', ':'), default=str)}"
+
+    def fetch(self, keys: List[Hashable], fetch_rows: Callable[[List[Hashable]], List[List[tuple]]],
+              from_rows: Callable[[List[tuple]], Any], version: str = "") -> Dict[Hashable, Any]:
+        """
+        Returns the value of every key, built by `from_rows` from the rows of the key. `fetch_rows` returns
+        the rows of the keys found in neither tier of the reference `version`.
+        """
+        results, missing = self.get(keys, from_rows, version)
+        if missing:
+            results.update(self.add(missing, fetch_rows(missing), from_rows, version))
+        return results
+
+    def get(self, keys: List[Hashable], from_rows: Callable[[List[tuple]], Any],
+            version: str = "") -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        """
+        Returns the values of the keys found in either tier of the reference `version`, and the keys found in
+        neither. The async lookups query the missing keys themselves and cache their rows with `add`.
+        """
+        results = {}
+        missing = []
+        with self.lock:
+            if version != self.version:
+                # Results of the former reference data
+                self.values.clear()
+                self.version = version
+            for key in keys:
+                value = self.values.get(key, MISSING)
+                if value is MISSING:
+                    missing.append(key)
+                else:
+                    self.values.move_to_end(key)
+                    results[key] = value
+
+        if missing and self.redis_enabled:
+            fetched = self.get_redis_values(missing, from_rows, version)
+            self.add_local(fetched, version)
+            results.update(fetched)
+            missing = [key for key in missing if key not in fetched]
+
+        return results, missing
+
+    def add(self, keys: List[Hashable], rows: List[List[tuple]], from_rows: Callable[[List[tuple]], Any],
+            version: str = "") -> Dict[Hashable, Any]:
+        """
+        Caches the `rows` fetched for `keys` in both tiers of the reference `version` and returns their values.
+        """
+        fetched = {key: from_rows(key_rows) for key, key_rows in zip(keys, rows)}
+        if self.redis_enabled:
+            self.set_redis_rows(keys, rows, version)
+        self.add_local(fetched, version)
+        return fetched
+
+    def get_redis_values(self, keys: List[Hashable], from_rows: Callable[[List[tuple]], Any],
+                         version: str) -> Dict[Hashable, Any]:
+        from redis import RedisError
+
+        try:
+            encoded_rows = get_redis().mget([self.get_redis_key(key, version) for key in keys])
+        except RedisError:
+            logging.warning("Lookup cache Redis tier unavailable", exc_info=True)
+            return {}
+        return {key: from_rows(decode_rows(value)) for key, value in zip(keys, encoded_rows) if value is not None}
+
+    def set_redis_rows(self, keys: List[Hashable], rows: List[List[tuple]], version: str):
+        from redis import RedisError
+
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            for key, key_rows in zip(keys, rows):
+                pipeline.setex(self.get_redis_key(key, version), self.ttl, encode_rows(key_rows))
+            pipeline.execute()
+        except RedisError:
+            logging.warning("Lookup cache Redis tier unavailable", exc_info=True)
+
+    def add_local(self, values: dict, version: str):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            if version != self.version:
+                # Looked up in reference data that was replaced meanwhile
+                return
+            self.values.update(values)
+            for key in values:
+                self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
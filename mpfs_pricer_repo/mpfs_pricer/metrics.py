@@ -0,0 +1,370 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Set METRICS_ENABLED=true to time the pricing stages. Functions are only wrapped when metrics are enabled,
+# so disabled metrics cost nothing.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+
+# Directory where every process (uWSGI workers, Celery pool processes) writes its metrics for the exporters
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+
+# Seconds between two writes of the metrics of a process to METRICS_DIR
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "10"))
+
+# Port of the metrics exporter of the Celery worker
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+
+# Upper bounds (in seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# (Largest number of line items, label) of the claim size buckets
+CLAIM_SIZE_BUCKETS = ((1, "1"), (10, "2-10"), (100, "11-100"), (500, "101-500"))
+LARGEST_CLAIM_SIZE = "500+"
+UNKNOWN_CLAIM_SIZE = "unknown"
+
+# Metrics of the processes that exited, merged by the exporters so the directory doesn't grow with every restart
+EXITED_PROCESSES_FILE = "stages_exited.json"
+
+STAGE_PRICE_CLAIMS = "price_claims"
+STAGE_PREFETCH = "prefetch"
+STAGE_NPI = "npi"
+STAGE_ZIP_REGION = "zip_region"
+STAGE_GPCI = "gpci"
+STAGE_RVU = "rvu"
+STAGE_ANES_BASE_UNITS = "anes_base_units"
+STAGE_ANES_CONVERSION_FACTORS = "anes_conversion_factors"
+STAGE_NCCI = "ncci"
+STAGE_PREPARE = "prepare"
+STAGE_PRICE_CLAIM_GET = "price_claim_get"
+STAGE_BILATERAL_SURGERY = "bilateral_surgery"
+STAGE_MULTIPLE_PROCEDURES = "multiple_procedures"
+STAGE_ANESTHESIA_PRICING = "anesthesia_pricing"
+
+COUNTER_RVU_LOOKUPS = "rvu_lookups"
+COUNTER_RVU_MODIFIER_RETRIES = "rvu_modifier_retries"
+COUNTER_CLAIM_CACHE_HITS = "claim_cache_hits"
+COUNTER_CLAIM_CACHE_REDIS_HITS = "claim_cache_redis_hits"
+COUNTER_CLAIM_CACHE_MISSES = "claim_cache_misses"
+
+COUNTER_DESCRIPTIONS = (
+    (COUNTER_RVU_LOOKUPS, "RVU lookups of line items"),
+    (COUNTER_RVU_MODIFIER_RETRIES, "Modifiers tried after the first one to find RVUs"),
+    (COUNTER_CLAIM_CACHE_HITS, "Claims found in the in-process claim cache"),
+    (COUNTER_CLAIM_CACHE_REDIS_HITS, "Claims found in the Redis claim cache"),
+    (COUNTER_CLAIM_CACHE_MISSES, "Claims priced after a claim cache miss"),
+)
+
+
+def get_claim_size_bucket(line_count: int) -> str:
+    for largest, label in CLAIM_SIZE_BUCKETS:
+        if line_count <= largest:
+            return label
+    return LARGEST_CLAIM_SIZE
+
+
+# Bucket of every claim size up to the largest bounded bucket, the last one stands for the larger claims
+CLAIM_SIZE_LABELS = [get_claim_size_bucket(line_count) for line_count in range(CLAIM_SIZE_BUCKETS[-1][0] + 2)]
+
+# Size bucket of the claims being priced by the current thread or task, set by the sized stages
+current_claim_size = ContextVar("claim_size", default=UNKNOWN_CLAIM_SIZE)
+
+_flusher = None
+_flusher_lock = Lock()
+
+
+class StageRecorder:
+    """
+    Per-process stage timings. Recording only appends to a list; observations are aggregated into histograms
+    when the metrics are flushed or collected.
+    """
+
+    def __init__(self):
+        self.observations = []  # (stage, claim size, duration)
+        self.histograms = {}  # (stage, claim size) -> [bucket counts..., +Inf count, sum]
+        self.counters = {}  # (counter, claim size) -> value
+        # The flusher thread and the /metrics requests aggregate concurrently
+        self.lock = Lock()
+
+    def count(self, counter: str, value: int):
+        key = (counter, current_claim_size.get())
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def aggregate_observations(self):
+        # Observations appended by other threads meanwhile are kept for the next aggregation
+        observations = self.observations[:]
+        del self.observations[:len(observations)]
+        for stage, claim_size, duration in observations:
+            histogram = self.histograms.get((stage, claim_size))
+            if histogram is None:
+                histogram = self.histograms[(stage, claim_size)] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            histogram[bisect_left(DURATION_BUCKETS, duration)] += 1
+            histogram[-1] += duration
+
+    def aggregate(self):
+        with self.lock:
+            self.aggregate_observations()
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            self.aggregate_observations()
+            return to_metrics_dict(self.histograms, self.counters)
+
+    def flush(self):
+        """
+        Aggregates the observations and writes the metrics of this process to METRICS_DIR, where the exporters
+        of the other processes read them.
+        """
+        metrics = self.to_dict()
+        if not METRICS_DIR:
+            return
+        write_metrics_file(Path(METRICS_DIR) / f"stages_{os.getpid()}.json", metrics)
+
+
+def to_metrics_dict(histograms: Dict[tuple, list], counters: Dict[tuple, int]) -> dict:
+    return {
+        "histograms": [[stage, claim_size, list(values)] for (stage, claim_size), values in histograms.items()],
+        "counters": [[counter, claim_size, value] for (counter, claim_size), value in counters.items()],
+    }
+
+
+def write_metrics_file(path: Path, metrics: dict):
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "w") as f:
+        json.dump(metrics, f)
+    os.replace(temporary_path, path)
+
+
+recorder = StageRecorder()
+
+
+def timed(stage: str, size: Callable[..., int] = None):
+    """
+    Decorator recording the duration of every call under `stage`, labelled with the size bucket of the claims
+    being priced. With `size`, the number of line items the call prices (computed from its arguments) sets
+    the size bucket of the stages it runs. Returns the function itself when metrics are disabled.
+    """
+
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        # Names are bound here, the wrappers run for every stage of every claim
+        perf_counter = time.perf_counter
+        observe = recorder.observations.append
+        get_claim_size = current_claim_size.get
+        largest_size = len(CLAIM_SIZE_LABELS) - 1
+
+        if size is None:
+            @wraps(fn)
+            def timed_fn(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    observe((stage, get_claim_size(), perf_counter() - started))
+
+            return timed_fn
+
+        @wraps(fn)
+        def sized_fn(*args, **kwargs):
+            label = CLAIM_SIZE_LABELS[min(size(*args, **kwargs), largest_size)]
+            token = current_claim_size.set(label)
+            started = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe((stage, label, perf_counter() - started))
+                current_claim_size.reset(token)
+
+        return sized_fn
+
+    return decorator
+
+
+class MetricsFlusher(Thread):
+    """
+    Background thread flushing the metrics of the process every `interval` seconds, off the pricing path.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="metrics-flusher", daemon=True)
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                recorder.flush()
+            except Exception:
+                logging.exception("Metrics flush failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_flusher():
+    """
+    Starts the metrics flusher of the process when metrics are enabled. Threads don't survive a fork, so this
+    is called by every worker process.
+    """
+    global _flusher
+
+    if not METRICS_ENABLED:
+        return
+
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = MetricsFlusher(METRICS_FLUSH_INTERVAL)
+            _flusher.start()
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+
+def get_exited_process_paths(directory: Path) -> List[Path]:
+    paths = []
+    for path in directory.glob("stages_*.json"):
+        pid = path.stem[len("stages_"):]
+        if pid.isdigit() and not is_process_alive(int(pid)):
+            paths.append(path)
+    return paths
+
+
+def read_metrics_files(paths: Iterable[Path]) -> Iterable[dict]:
+    for path in paths:
+        try:
+            with open(path) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            # The process is writing or removed the file
+            continue
+
+
+def merge_exited_processes(directory: Path):
+    """
+    Merges the files of the processes that exited into EXITED_PROCESSES_FILE and removes them, like the
+    Prometheus multiprocess mode removes the files of dead processes. Their counts are kept, so the totals
+    never go backwards. The caller holds the directory lock.
+    """
+    paths = get_exited_process_paths(directory)
+    if not paths:
+        return
+    exited_path = directory / EXITED_PROCESSES_FILE
+    histograms, counters = merge_metrics(read_metrics_files([exited_path] + paths))
+    write_metrics_file(exited_path, to_metrics_dict(histograms, counters))
+    for path in paths:
+        path.unlink()
+
+
+def read_process_metrics() -> Iterable[dict]:
+    """
+    Yields the metrics of this process and the ones written to METRICS_DIR by the other processes, including
+    the merged metrics of the processes that exited.
+    """
+    yield recorder.to_dict()
+    if not METRICS_DIR:
+        return
+    directory = Path(METRICS_DIR)
+    own_file = f"stages_{os.getpid()}.json"
+    # Every worker serves /metrics: the lock keeps two exporters from merging the same exited processes twice,
+    # or one from reading the directory while another merges it
+    with open(directory / "stages.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        merge_exited_processes(directory)
+        yield from read_metrics_files(path for path in directory.glob("stages_*.json") if path.name != own_file)
+
+
+def merge_metrics(processes_metrics: Iterable[dict]) -> Tuple[Dict[tuple, list], Dict[tuple, int]]:
+    histograms = {}
+    counters = {}
+    for process_metrics in processes_metrics:
+        for stage, claim_size, values in process_metrics["histograms"]:
+            total = histograms.get((stage, claim_size))
+            histograms[(stage, claim_size)] = values if total is None else [a + b for a, b in zip(total, values)]
+        for counter, claim_size, value in process_metrics["counters"]:
+            counters[(counter, claim_size)] = counters.get((counter, claim_size), 0) + value
+    return histograms, counters
+
+
+class StageCollector:
+    """
+    Prometheus collector of the stage metrics of all the processes.
+    """
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+
+        histograms, counters = merge_metrics(read_process_metrics())
+
+        durations = HistogramMetricFamily(
+            "mpfs_pricer_stage_duration_seconds", "Duration of the pricing stages", labels=["stage", "claim_size"]
+        )
+        for (stage, claim_size), values in sorted(histograms.items()):
+            cumulative = 0
+            buckets = []
+            for upper_bound, bucket_count in zip(DURATION_BUCKETS + (float("inf"),), values[:-1]):
+                cumulative += bucket_count
+                buckets.append((str(upper_bound) if upper_bound != float("inf") else "+Inf", cumulative))
+            durations.add_metric([stage, claim_size], buckets, values[-1])
+        yield durations
+
+        for counter, description in COUNTER_DESCRIPTIONS:
+            family = CounterMetricFamily(f"mpfs_pricer_{counter}", description, labels=["claim_size"])
+            for (name, claim_size), value in sorted(counters.items()):
+                if name == counter:
+                    family.add_metric([claim_size], value)
+            yield family
+
+
+def get_registry():
+    from prometheus_client import CollectorRegistry
+
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(StageCollector())
+    return registry
+
+
+def generate_metrics() -> Tuple[bytes, str]:
+    """
+    Returns the Prometheus exposition of the stage metrics and its content type.
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int = METRICS_PORT):
+    """
+    Serves the stage metrics of all the processes writing to METRICS_DIR on `port`. Has to be called before
+    the worker processes are forked: without METRICS_DIR, they inherit a temporary directory.
+    """
+    global METRICS_DIR
+    from prometheus_client import start_http_server
+
+    if METRICS_DIR:
+        # Files left by the processes of a previous run
+        for path in Path(METRICS_DIR).glob("stages_*.json"):
+            path.unlink()
+    else:
+        METRICS_DIR = tempfile.mkdtemp(prefix="mpfs_pricer_metrics_")
+
+    start_http_server(port, registry=get_registry())
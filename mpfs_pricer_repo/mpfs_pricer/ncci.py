@@ -1,27 +1,27 @@
-from typing import List
-from psycopg2 import sql
-
-
-def get_ncci(db, code_1: str, code_2: str, service_date: str) -> List[dict]:
-    query = sql.SQL(
-        """
-            SELECT * FROM internal_reference.cms_ncci_ptp_practitioner_edits
-            WHERE col1 = {code_1}
-                AND col2 = {code_2}
-                AND effective_date IS NOT NULL
-                AND effective_date <= {service_date}
-                AND (deletion_date >= {service_date} OR deletion_date IS NULL);
-        """
-    ).format(
-        code_1=sql.Literal(code_1),
-        code_2=sql.Literal(code_2),
-        service_date=sql.Literal(service_date),
-    )
-
-    cursor = db.cursor()
-    cursor.execute(query)
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from mpfs_pricer.database import Lookup, execute_statement
+from mpfs_pricer.lookup_cache import LookupCache, get_table_ttl
+from mpfs_pricer.utils import parse_date
+
+NCCI_QUERY = """
+        SELECT * FROM internal_reference.cms_ncci_ptp_practitioner_edits
+        WHERE col1 = %s
+            AND col2 = %s
+            AND effective_date IS NOT NULL
+            AND effective_date <= %s
+            AND (deletion_date >= %s OR deletion_date IS NULL)
+    """
+
+
+def get_ncci(db, code_1: str, code_2: str, service_date: date) -> List[dict]:
+    cursor = execute_statement(db, "get_ncci", NCCI_QUERY, [code_1, code_2, service_date, service_date])
     res = cursor.fetchall()
 
+    return ncci_from_rows(res)
+
+
+def ncci_from_rows(res: List[tuple]) -> List[dict]:
     ncci_data = []
 
     for ncci_row in res:
@@ -34,3 +34,30 @@ def get_ncci(db, code_1: str, code_2: str, service_date: str) -> List[dict]:
         })
 
     return ncci_data
+
+
+NCCI_LOOKUP = Lookup(
+    "get_ncci_many", NCCI_QUERY,
+    lambda key: [key[0], key[1], key[2], key[2]],
+    ncci_from_rows,
+    first_row_only=False,
+    cache=LookupCache("ncci", get_table_ttl("ncci", 86400)),
+)
+
+
+def get_ncci_many(db, keys: Iterable[Tuple[str, str, date]]) -> Dict[Tuple[str, str, date], List[dict]]:
+    """
+    Batched get_ncci: resolves every (code_1, code_2, service_date) key in one round trip.
+    """
+    return NCCI_LOOKUP.fetch(db, keys)
+
+
+def get_ncci_pair_key(line_item_1: dict, line_item_2: dict) -> Optional[Tuple[str, str, date]]:
+    """
+    Returns the (code_1, code_2, service_date) NCCI key of a line item pair, or None when the two
+    line items were not performed on the same service date.
+    """
+    if line_item_1['service_date'] != line_item_2['service_date']:
+        return None
+
+    return line_item_1['code'], line_item_2['code'], parse_date(line_item_2['service_date'])
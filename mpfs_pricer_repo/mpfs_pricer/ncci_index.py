@@ -0,0 +1,164 @@
+import os
+from array import array
+from bisect import bisect_right
+from datetime import date
+from sys import intern
+from typing import Dict, Iterable, List, Tuple
+from mpfs_pricer import metrics, ncci
+from mpfs_pricer.snapshots import Quarter, QuarterSnapshots, get_quarter_bounds
+
+# Number of quarters kept in memory, least recently used quarters are evicted. 0 disables the index. A quarter
+# holds millions of edits, so the index is off by default: enable it with CACHE_WARMUP, which loads the current
+# quarter before the worker processes fork instead of in the first request of every process.
+NCCI_INDEX_MAX_QUARTERS = int(os.environ.get("NCCI_INDEX_MAX_QUARTERS", "0"))
+
+# Rows fetched per round trip while the index is streamed from the database
+NCCI_INDEX_FETCH_SIZE = 50000
+
+NCCI_INDEX_QUERY = """
+        SELECT col1, col2, effective_date, deletion_date, modifier
+        FROM internal_reference.cms_ncci_ptp_practitioner_edits
+        WHERE effective_date IS NOT NULL
+            AND effective_date <= %s
+            AND (deletion_date >= %s OR deletion_date IS NULL)
+        ORDER BY col1, col2, effective_date
+    """
+
+# Deletion date of edits that are still active
+OPEN_ENDED = 0
+
+
+class NcciQuarterIndex:
+    """
+    Compact copy of the NCCI PTP edits active during one quarter.
+
+    Codes are mapped to small integers and every (col1, col2) pair to a contiguous range of the flat
+    interval arrays, sorted by effective date. Dates are stored as ordinals and modifiers as indexes into
+    the few distinct modifier values, so a row costs 9 bytes plus a dict entry per code pair.
+    """
+
+    def __init__(self, quarter: Quarter, rows: Iterable[tuple]):
+        self.quarter = quarter
+        self.codes = {}  # code -> code id
+        self.index = {}  # code pair key -> interval range
+        self.offsets = array("I", [0])
+        self.starts = array("i")
+        self.ends = array("i")
+        self.modifier_ids = array("B")
+        self.modifiers = []
+
+        modifier_ids = {}
+        pair_key = None
+        for col1, col2, effective_date, deletion_date, modifier in rows:
+            row_pair_key = self.get_pair_key(self.get_code_id(col1), self.get_code_id(col2))
+            if row_pair_key != pair_key:
+                if pair_key is not None:
+                    self.close_range(pair_key)
+                pair_key = row_pair_key
+
+            modifier_id = modifier_ids.get(modifier)
+            if modifier_id is None:
+                modifier_id = modifier_ids[modifier] = len(self.modifiers)
+                self.modifiers.append(modifier)
+
+            self.starts.append(effective_date.toordinal())
+            self.ends.append(deletion_date.toordinal() if deletion_date is not None else OPEN_ENDED)
+            self.modifier_ids.append(modifier_id)
+
+        if pair_key is not None:
+            self.close_range(pair_key)
+
+        self.code_names = {code_id: code for code, code_id in self.codes.items()}
+
+    def __len__(self):
+        return len(self.starts)
+
+    @staticmethod
+    def get_pair_key(code_id_1: int, code_id_2: int) -> int:
+        return code_id_1 << 32 | code_id_2
+
+    def get_code_id(self, code: str) -> int:
+        code_id = self.codes.get(code)
+        if code_id is None:
+            code_id = self.codes[intern(code)] = len(self.codes)
+        return code_id
+
+    def close_range(self, pair_key: int):
+        # Rows are streamed ordered by code pair, so each pair is a single contiguous range
+        if pair_key in self.index:
+            raise ValueError("NCCI rows must be ordered by col1, col2, effective_date")
+        self.index[pair_key] = len(self.offsets) - 1
+        self.offsets.append(len(self.starts))
+
+    def find(self, code_1: str, code_2: str, service_date: date) -> List[dict]:
+        code_id_1 = self.codes.get(code_1)
+        code_id_2 = self.codes.get(code_2)
+        if code_id_1 is None or code_id_2 is None:
+            return []
+
+        range_index = self.index.get(self.get_pair_key(code_id_1, code_id_2))
+        if range_index is None:
+            return []
+
+        day = service_date.toordinal()
+        low = self.offsets[range_index]
+        high = bisect_right(self.starts, day, low, self.offsets[range_index + 1])
+
+        rows = []
+        for row_index in range(low, high):
+            end = self.ends[row_index]
+            if end == OPEN_ENDED or end >= day:
+                rows.append((
+                    self.code_names[code_id_1],
+                    self.code_names[code_id_2],
+                    date.fromordinal(self.starts[row_index]),
+                    date.fromordinal(end) if end != OPEN_ENDED else None,
+                    self.modifiers[self.modifier_ids[row_index]],
+                ))
+
+        return ncci.ncci_from_rows(rows)
+
+
+class NcciIndex(QuarterSnapshots):
+    """
+    Per-process cache of NCCI quarter indexes. An index is immutable once loaded: the quarter preloaded by the
+    uWSGI master or the Celery main process (CACHE_WARMUP) is shared copy-on-write by the worker processes,
+    quarters loaded after the fork, or by a reload, are loaded by every process.
+    """
+
+    def __init__(self, max_quarters: int = NCCI_INDEX_MAX_QUARTERS):
+        super().__init__(max_quarters)
+
+    def load_quarter(self, db, quarter: Quarter) -> NcciQuarterIndex:
+        start, end = get_quarter_bounds(quarter)
+
+        # Named cursors stream the table instead of materializing millions of rows client side
+        cursor = db.cursor(name=f"ncci_index_{quarter[0]}_{quarter[1]}")
+        cursor.itersize = NCCI_INDEX_FETCH_SIZE
+        try:
+            cursor.execute(NCCI_INDEX_QUERY, [end, start])
+            return NcciQuarterIndex(quarter, cursor)
+        finally:
+            cursor.close()
+
+    def get_ncci(self, db, code_1: str, code_2: str, service_date: date) -> List[dict]:
+        return self.get_service_date_snapshot(db, service_date).find(code_1, code_2, service_date)
+
+
+ncci_index = NcciIndex()
+
+
+def get_ncci(db, code_1: str, code_2: str, service_date: date) -> List[dict]:
+    if not ncci_index.enabled:
+        return ncci.get_ncci(db, code_1, code_2, service_date)
+
+    return ncci_index.get_ncci(db, code_1, code_2, service_date)
+
+
+@metrics.timed(metrics.STAGE_NCCI)
+def get_ncci_many(db, keys: Iterable[Tuple[str, str, date]],
+                  index: NcciIndex = ncci_index) -> Dict[Tuple[str, str, date], List[dict]]:
+    if not index.enabled:
+        return ncci.get_ncci_many(db, keys)
+
+    return {key: index.get_ncci(db, *key) for key in dict.fromkeys(keys)}
@@ -1,11 +1,15 @@
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer.database import Lookup, execute_statement
+from mpfs_pricer.lookup_cache import LookupCache, get_table_ttl
+
+
 def find_zip_by_npi(db, npi):
     query = """
     SELECT "Provider Business Practice Location Address Postal Code" FROM internal_reference.cms_nppes_npidata_pfile_20210411
     where npi = %s
     """
 
-    cursor = db.cursor()
-    cursor.execute(query, [npi])
+    cursor = execute_statement(db, "find_zip_by_npi", query, [npi])
 
     for row in cursor:
         return row[0]
@@ -19,10 +23,31 @@ def find_tc_by_npi(db, npi):
     where npi = %s
     """
 
-    cursor = db.cursor()
-    cursor.execute(query, [npi])
+    cursor = execute_statement(db, "find_tc_by_npi", query, [npi])
 
     for row in cursor:
         return row[0]
 
     return None
+
+
+PROVIDERS_LOOKUP = Lookup(
+    "find_providers_by_npis",
+    """
+    SELECT "Provider Business Practice Location Address Postal Code", "Healthcare Provider Taxonomy Code_1"
+    FROM internal_reference.cms_nppes_npidata_pfile_20210411
+    where npi = %s
+    """,
+    lambda npi: [npi],
+    lambda rows: tuple(rows[0]) if rows else (None, None),
+    # The provider cache is the in-process tier of the providers
+    cache=LookupCache("providers", get_table_ttl("providers", 86400), max_size=0),
+)
+
+
+def find_providers_by_npis(db, npis: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """
+    Batched find_zip_by_npi/find_tc_by_npi: resolves the (zip, taxonomy code) of every NPI in one round trip.
+    Unknown NPIs map to (None, None).
+    """
+    return PROVIDERS_LOOKUP.fetch(db, npis)
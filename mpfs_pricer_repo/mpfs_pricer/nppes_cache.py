@@ -0,0 +1,80 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+from mpfs_pricer import metrics, nppes
+
+# Number of providers kept in memory, least recently used providers are evicted. 0 disables the cache.
+PROVIDER_CACHE_SIZE = int(os.environ.get("PROVIDER_CACHE_SIZE", "50000"))
+
+# Seconds a provider is kept before it is fetched again, 0 keeps providers until they are evicted
+PROVIDER_CACHE_TTL = float(os.environ.get("PROVIDER_CACHE_TTL", "86400"))
+
+
+class ProviderCache:
+    """
+    Per-process LRU cache of NPI -> (zip, taxonomy code). The NPPES table is too large to snapshot, so only
+    the providers seen by the process (or preloaded at warm up) are kept, for `ttl` seconds or until the
+    reference data is reloaded. Unknown NPIs are cached too.
+    """
+
+    def __init__(self, max_size: int = PROVIDER_CACHE_SIZE, ttl: float = PROVIDER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.providers = OrderedDict()  # npi -> (provider, expires_at)
+        self.lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def __len__(self):
+        return len(self.providers)
+
+    def find_providers_by_npis(self, db, npis: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        found, missing = self.get(npis)
+        if missing:
+            found.update(self.add(nppes.find_providers_by_npis(db, missing)))
+        return found
+
+    def get(self, npis: Iterable[str]) -> Tuple[Dict[str, Tuple[str, str]], List[str]]:
+        # The providers cached and the NPIs to fetch, the async prefetch fetches them itself
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self.lock:
+            for npi in dict.fromkeys(npis):
+                entry = self.providers.get(npi)
+                if entry is None or entry[1] <= now:
+                    missing.append(npi)
+                else:
+                    self.providers.move_to_end(npi)
+                    found[npi] = entry[0]
+        return found, missing
+
+    def add(self, fetched: Dict[str, Tuple[str, str]]) -> Dict[str, Tuple[str, str]]:
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else math.inf
+        with self.lock:
+            for npi, provider in fetched.items():
+                self.providers[npi] = provider, expires_at
+                self.providers.move_to_end(npi)
+            while len(self.providers) > self.max_size:
+                self.providers.popitem(last=False)
+        return fetched
+
+    def clear(self):
+        with self.lock:
+            self.providers.clear()
+
+
+provider_cache = ProviderCache()
+
+
+@metrics.timed(metrics.STAGE_NPI)
+def find_providers_by_npis(db, npis: Iterable[str], cache: ProviderCache = provider_cache) -> Dict[str, Tuple[str, str]]:
+    if not cache.enabled:
+        return nppes.find_providers_by_npis(db, npis)
+
+    return cache.find_providers_by_npis(db, npis)
@@ -0,0 +1,140 @@
+import csv
+import math
+import os
+import re
+from array import array
+from pathlib import Path
+from sys import intern
+from threading import Lock
+from typing import Dict, Optional
+from mpfs_pricer.snapshots import Quarter, get_region_key
+
+# Directory of the OPPS cap files, the package data directory by default
+OPPS_CAP_DIR = os.environ.get("OPPS_CAP_DIR", "")
+
+# OPPS cap file of a quarter, named with its year: CMS publishes them without it (OPPSCAP_JUL.csv of RVU20C is
+# OPPSCAP_JUL2020.csv). Files without the year aren't read, so services of unknown years aren't capped.
+OPPS_CAP_FILE = re.compile(r"OPPSCAP_(JAN|APR|JUL|OCT)(\d{4})\.csv")
+OPPS_CAP_QUARTERS = {"JAN": 1, "APR": 2, "JUL": 3, "OCT": 4}
+
+_opps_cap_index = None
+_opps_cap_index_lock = Lock()
+
+
+def get_opps_cap_data_dir() -> Path:
+    return Path(OPPS_CAP_DIR) if OPPS_CAP_DIR else Path(__file__).parent / "data" / "pfs_relative_value_data_files"
+
+
+def get_opps_cap_files(data_dir: Path) -> Dict[Quarter, Path]:
+    """
+    Returns the OPPS cap file of every (year, quarter) found in `data_dir`.
+    """
+    files = {}
+    for path in sorted(data_dir.glob("OPPSCAP_*.csv")):
+        match = OPPS_CAP_FILE.fullmatch(path.name)
+        if match:
+            files[(int(match.group(2)), OPPS_CAP_QUARTERS[match.group(1)])] = path
+    return files
+
+
+class OppsCapIndex:
+    """
+    OPPS payment caps of imaging services by (hcpcs, mod, carrier, locality) and (year, quarter).
+
+    Every key maps to a slot of one price per file in typed arrays; quarters a key is missing from hold NaN.
+    Codes without any cap are rejected by a set lookup before the key is built, quarters without a file by
+    a dict lookup.
+    """
+
+    def __init__(self, paths: dict):
+        self.codes = set()
+        self.slots = {}  # (hcpcs, mod, carrier, locality) -> slot
+        self.columns = {quarter: column for column, quarter in enumerate(paths)}  # (year, quarter) -> column
+        self.facility_prices = array("d")
+        self.non_facility_prices = array("d")
+
+        for quarter, path in paths.items():
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                # Column names differ between the quarterly files, columns are read by position
+                next(reader, None)
+                for row in reader:
+                    # The files end with rows without prices (and a DOS end of file character)
+                    if len(row) >= 7 and row[5].strip() and row[6].strip():
+                        self.add(row, quarter)
+
+    def add(self, row: list, quarter: Quarter):
+        hcpcs, mod, _, carrier, locality, facility_price, non_facility_price = [value.strip() for value in row[:7]]
+        hcpcs = intern(hcpcs)
+        key = (hcpcs, intern(mod)) + get_region_key(carrier, locality)
+
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.slots)
+            self.facility_prices.extend([math.nan] * len(self.columns))
+            self.non_facility_prices.extend([math.nan] * len(self.columns))
+            self.codes.add(hcpcs)
+
+        index = slot * len(self.columns) + self.columns[quarter]
+        self.facility_prices[index] = float(facility_price)
+        self.non_facility_prices[index] = float(non_facility_price)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def find(self, hcpcs: str, mod: str, carrier, locality, quarter: Quarter, facility: bool) -> Optional[float]:
+        """
+        Returns the OPPS cap of one unit of the service in the (year, quarter), or None when the service isn't
+        capped.
+        """
+        column = self.columns.get(quarter)
+        if column is None or hcpcs not in self.codes:
+            return None
+
+        slot = self.slots.get((hcpcs, mod) + get_region_key(carrier, locality))
+        if slot is None:
+            return None
+
+        prices = self.facility_prices if facility else self.non_facility_prices
+        price = prices[slot * len(self.columns) + column]
+        return None if math.isnan(price) else price
+
+
+def get_opps_cap_index() -> OppsCapIndex:
+    """
+    Returns the OPPS cap index of the files of the OPPS cap directory, loaded once per process.
+    """
+    global _opps_cap_index
+
+    if _opps_cap_index is not None:
+        return _opps_cap_index
+
+    with _opps_cap_index_lock:
+        if _opps_cap_index is None:
+            _opps_cap_index = OppsCapIndex(get_opps_cap_files(get_opps_cap_data_dir()))
+        return _opps_cap_index
+
+
+def get_cap_mod(mods) -> Optional[str]:
+    # Only the technical component is capped: global services are capped as a whole, the PC (26) never is
+    if "TC" in mods:
+        return "TC"
+    if "26" in mods:
+        return None
+    return ""
+
+
+def find_opps_cap(hcpcs: str, mods, gpci_info: dict, quarter: Quarter, facility: bool) -> Optional[float]:
+    """
+    Returns the OPPS cap of one unit of a line item in the (year, quarter) of its service date, in the region
+    (carrier and locality) of its GPCI values.
+    """
+    index = get_opps_cap_index()
+    if hcpcs not in index.codes:
+        return None
+
+    mod = get_cap_mod(mods)
+    if mod is None:
+        return None
+
+    return index.find(hcpcs, mod, gpci_info["carrier"], gpci_info["locality_code"], quarter, facility)
@@ -47,14 +47,16 @@ def get_code_to_payment_mapping():
     return facilty_code_to_payment_type
 
 
+code_to_payment_mapping = get_code_to_payment_mapping()
+
+
 def requires_facilty_payment(place_of_service_code):
     """
     Returns true of a place of service code qualifies for facility payment, else false
     :param place_of_service_code:
     :return: Boolean
     """
-    mapping = get_code_to_payment_mapping()
-    if place_of_service_code in mapping:
-        return mapping[place_of_service_code]
+    if place_of_service_code in code_to_payment_mapping:
+        return code_to_payment_mapping[place_of_service_code]
     else:
         raise ValueError(f"Invalid place of service code for MPFS payment: {place_of_service_code}")
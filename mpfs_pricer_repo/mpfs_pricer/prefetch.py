@@ -0,0 +1,249 @@
+from typing import List
+from mpfs_pricer import metrics
+from mpfs_pricer.anes_snapshot import AnesSnapshot, anes_snapshot, get_base_units, get_conversion_factors
+from mpfs_pricer.data_files import find_region_by_zip
+from mpfs_pricer.gpci_snapshot import GpciSnapshot, get_gpci_many, gpci_snapshot
+from mpfs_pricer.ncci import get_ncci_pair_key
+from mpfs_pricer.ncci_index import NcciIndex, get_ncci_many, ncci_index
+from mpfs_pricer.nppes_cache import ProviderCache, find_providers_by_npis, provider_cache
+from mpfs_pricer.rvu_snapshot import RvuSnapshot, get_rvus_many, rvu_snapshot
+
+
+class ClaimReference:
+    """
+    Reference data resolved up front for a set of line items.
+
+    Every lookup table is keyed exactly like the arguments of the single-key lookup functions
+    (get_rvus, get_gpci, ...) so pricing can read it instead of querying the database per line.
+    """
+
+    def __init__(self):
+        self.providers = {}  # npi -> (zip, taxonomy code)
+        self.regions = {}  # provider zip -> medicare region
+        self.gpci = {}  # (carrier, locality, date_of_service) -> gpci info
+        self.rvus = {}  # (cpt, mod, date_of_service) -> rvus
+        self.anes_base_units = {}  # (cpt, date_of_service) -> base unit
+        self.anes_conversion_factors = {}  # (carrier, locality, date_of_service) -> conversion factor
+        self.ncci = {}  # (code_1, code_2, service_date) -> ncci rows
+
+    def get_provider(self, npi: str):
+        return self.providers.get(npi, (None, None))
+
+    def get_region(self, provider_zip: str):
+        region = self.regions.get(provider_zip)
+        return region if region is not None else find_region_by_zip(provider_zip)
+
+    def get_rvus(self, cpt: str, mods: List[str], date_of_service: str):
+        # Get RVU values for the first cpt/mod that has them
+        for mod in mods:
+            rvus = self.rvus.get((cpt, mod, date_of_service))
+            if rvus is not None:
+                return rvus
+        return None
+
+
+class ReferenceBackend:
+    """
+    Source of the reference data resolved by prefetch_claims_reference. Every method resolves many keys at
+    once and takes the keys of the matching batched lookup function (find_providers_by_npis, get_gpci_many...).
+    """
+
+    def find_providers_by_npis(self, npis: List[str]) -> dict:
+        raise NotImplementedError
+
+    def get_gpci_many(self, keys: List[tuple]) -> dict:
+        raise NotImplementedError
+
+    def get_rvus_many(self, keys: List[tuple]) -> dict:
+        raise NotImplementedError
+
+    def get_base_units(self, keys: List[tuple]) -> dict:
+        raise NotImplementedError
+
+    def get_conversion_factors(self, keys: List[tuple]) -> dict:
+        raise NotImplementedError
+
+    def get_ncci_many(self, keys: List[tuple]) -> dict:
+        raise NotImplementedError
+
+    def find_regions_by_zips(self, zips: List[str]) -> dict:
+        # ZIP regions come from the ZPLC file bundled with the package unless the backend has its own
+        return {provider_zip: find_region_by_zip(provider_zip) for provider_zip in dict.fromkeys(zips)}
+
+
+class DatabaseSnapshots:
+    """
+    Per-process snapshots of the RVU, GPCI, anesthesia and NCCI tables of one version of the reference
+    database, and the providers cached from it. Iterating yields the quarter snapshots.
+    """
+
+    def __init__(self, rvus: RvuSnapshot, gpci: GpciSnapshot, anes: AnesSnapshot, ncci: NcciIndex,
+                 providers: ProviderCache):
+        self.rvus = rvus
+        self.gpci = gpci
+        self.anes = anes
+        self.ncci = ncci
+        self.providers = providers
+
+    def __iter__(self):
+        return iter([self.rvus, self.gpci, self.anes, self.ncci])
+
+    def set_version(self, version: str):
+        # Quarters loaded from now on are checked against `version`
+        for snapshots in self:
+            snapshots.version = version
+
+    def reload(self, db, version: str) -> "DatabaseSnapshots":
+        """
+        Returns new snapshots of `version` with the quarters these snapshots hold, loaded from `db`. The
+        provider cache starts empty.
+        """
+        reloaded = DatabaseSnapshots(*[type(snapshots)(snapshots.max_quarters) for snapshots in self],
+                                     ProviderCache(self.providers.max_size, self.providers.ttl))
+        reloaded.set_version(version)
+        for snapshots, reloaded_snapshots in zip(self, reloaded):
+            with snapshots.lock:
+                quarters = list(snapshots.quarters)
+            for quarter in quarters:
+                reloaded_snapshots.get_quarter(db, quarter)
+        return reloaded
+
+    def close(self):
+        # The module level snapshots of the first version stay referenced, their data is dropped
+        for snapshots in self:
+            snapshots.clear()
+        self.providers.clear()
+
+
+database_snapshots = DatabaseSnapshots(rvu_snapshot, gpci_snapshot, anes_snapshot, ncci_index, provider_cache)
+
+
+class DatabaseBackend(ReferenceBackend):
+    """
+    Reference data of the reference database, served by the per-process snapshots and caches when enabled.
+    """
+
+    def __init__(self, db, snapshots: DatabaseSnapshots = database_snapshots):
+        self.db = db
+        self.snapshots = snapshots
+
+    def find_providers_by_npis(self, npis: List[str]) -> dict:
+        return find_providers_by_npis(self.db, npis, self.snapshots.providers)
+
+    def get_gpci_many(self, keys: List[tuple]) -> dict:
+        return get_gpci_many(self.db, keys, self.snapshots.gpci)
+
+    def get_rvus_many(self, keys: List[tuple]) -> dict:
+        return get_rvus_many(self.db, keys, self.snapshots.rvus)
+
+    def get_base_units(self, keys: List[tuple]) -> dict:
+        return get_base_units(self.db, keys, self.snapshots.anes)
+
+    def get_conversion_factors(self, keys: List[tuple]) -> dict:
+        return get_conversion_factors(self.db, keys, self.snapshots.anes)
+
+    def get_ncci_many(self, keys: List[tuple]) -> dict:
+        return get_ncci_many(self.db, keys, self.snapshots.ncci)
+
+
+def get_reference_backend(db) -> ReferenceBackend:
+    # Lookups take either a reference database connection or a ReferenceBackend
+    return db if isinstance(db, ReferenceBackend) else DatabaseBackend(db)
+
+
+def get_line_item_region(reference: ClaimReference, line_item: dict):
+    provider_zip, _ = reference.get_provider(line_item["rendering_provider_npi"])
+    return reference.get_region(provider_zip) if provider_zip else None
+
+
+def get_ncci_keys(line_items: List[dict]) -> List[tuple]:
+    # NCCI edits are checked for every (first, second) line item pair performed on the same service date
+    ncci_keys = []
+    for line_item_index in range(1, len(line_items), 2):
+        ncci_key = get_ncci_pair_key(line_items[line_item_index - 1], line_items[line_item_index])
+        if ncci_key is not None:
+            ncci_keys.append(ncci_key)
+    return ncci_keys
+
+
+def get_claims_ncci_keys(claims_line_items: List[List[dict]]) -> List[tuple]:
+    return [ncci_key for claim_line_items in claims_line_items for ncci_key in get_ncci_keys(claim_line_items)]
+
+
+def get_rvu_keys(line_items: List[dict]) -> List[tuple]:
+    # Every modifier of a line item is a candidate for its RVUs
+    return [
+        (line_item['code'], mod, line_item['service_date'])
+        for line_item in line_items
+        for mod in [line_item['mod1'], line_item['mod2'], line_item['mod3'], line_item['mod4']]
+    ]
+
+
+def get_base_unit_keys(line_items: List[dict]) -> List[tuple]:
+    return [(line_item['code'], line_item['service_date']) for line_item in line_items]
+
+
+@metrics.timed(metrics.STAGE_ZIP_REGION)
+def get_region_keys(reference: ClaimReference, line_items: List[dict], backend: ReferenceBackend = None) -> List[tuple]:
+    # (carrier, locality, date_of_service) of the line items whose provider region is known
+    if backend is not None:
+        reference.regions = backend.find_regions_by_zips(
+            [provider_zip for provider_zip, _ in reference.providers.values() if provider_zip]
+        )
+
+    region_keys = []
+    for line_item in line_items:
+        region = get_line_item_region(reference, line_item)
+        if region:
+            region_keys.append((region['carrier'], region['locality'], line_item['service_date']))
+    return region_keys
+
+
+def prefetch_reference(db, line_items: List[dict]) -> ClaimReference:
+    """
+    Resolves all reference data needed to price the given line items with one round trip per table.
+    """
+    return prefetch_claims_reference(db, [line_items])
+
+
+def count_claims_line_items(db, claims_line_items: List[List[dict]]) -> int:
+    return sum(len(claim_line_items) for claim_line_items in claims_line_items)
+
+
+def count_rvu_lookups(reference: ClaimReference, line_items: List[dict]):
+    # Modifiers tried after the first one until RVUs are found, like ClaimReference.get_rvus does
+    retries = 0
+    for line_item in line_items:
+        for mod in [line_item['mod1'], line_item['mod2'], line_item['mod3']]:
+            if reference.rvus.get((line_item['code'], mod, line_item['service_date'])) is not None:
+                break
+            retries += 1
+    metrics.recorder.count(metrics.COUNTER_RVU_LOOKUPS, len(line_items))
+    metrics.recorder.count(metrics.COUNTER_RVU_MODIFIER_RETRIES, retries)
+
+
+@metrics.timed(metrics.STAGE_PREFETCH, size=count_claims_line_items)
+def prefetch_claims_reference(db, claims_line_items: List[List[dict]]) -> ClaimReference:
+    """
+    Resolves the reference data of several claims at once from a reference database connection or a
+    ReferenceBackend. Lookup keys shared between claims are only resolved once; NCCI pairs are still built
+    per claim.
+    """
+    backend = get_reference_backend(db)
+    reference = ClaimReference()
+    line_items = [line_item for claim_line_items in claims_line_items for line_item in claim_line_items]
+
+    reference.providers = backend.find_providers_by_npis(
+        [line_item["rendering_provider_npi"] for line_item in line_items]
+    )
+
+    region_keys = get_region_keys(reference, line_items, backend)
+    reference.gpci = backend.get_gpci_many(region_keys)
+    reference.rvus = backend.get_rvus_many(get_rvu_keys(line_items))
+    if metrics.METRICS_ENABLED:
+        count_rvu_lookups(reference, line_items)
+    reference.anes_base_units = backend.get_base_units(get_base_unit_keys(line_items))
+    reference.anes_conversion_factors = backend.get_conversion_factors(region_keys)
+    reference.ncci = backend.get_ncci_many(get_claims_ncci_keys(claims_line_items))
+
+    return reference
@@ -1,22 +1,26 @@
-from datetime import datetime
+import logging
 from typing import List, Tuple, Union
-from mpfs_pricer.anes import get_base_unit, get_conversion_factor
+from mpfs_pricer import claim_schema, file_reference, metrics
+from mpfs_pricer.claim_cache import claim_cache, price_claims_cached
+from mpfs_pricer.ncci import get_ncci_pair_key
+from mpfs_pricer.ncci_index import get_ncci_many
+from mpfs_pricer.prefetch import (
+    ClaimReference, DatabaseBackend, get_ncci_keys, prefetch_reference, prefetch_claims_reference
+)
+from mpfs_pricer.adjustments import adjust_opps_cap, perform_adjustments, perform_claim_adjustments
+from mpfs_pricer.database import get_db_pool
+from mpfs_pricer.line_item import PricedLineItem
+from mpfs_pricer.opps_cap import find_opps_cap
 from mpfs_pricer.payment_type import requires_facilty_payment
-from mpfs_pricer.data_files import find_region_by_zip
-from mpfs_pricer.rvu import get_rvus
-from mpfs_pricer.gpci import get_gpci
-from mpfs_pricer.ncci import get_ncci
-from mpfs_pricer.nppes import find_zip_by_npi, find_tc_by_npi
-from mpfs_pricer.adjustments import perform_adjustments, perform_adjustments_multiple, \
-    perform_adjustments_bilateral_surgery, perform_adjustments_anesthesia_pricing
-from mpfs_pricer.database import get_db, get_db_config_from_env
-from mpfs_pricer.utils import get_quarter, fit_date, to_currency
+from mpfs_pricer.reference_swap import swappable_reference
+from mpfs_pricer.snapshots import StaleSnapshotError, get_service_quarter
+from mpfs_pricer.utils import fit_date, format_date, format_quarter, parse_date, to_currency
 
 
 def price_line_item_get(
         data_item: Tuple[dict, dict, dict, str, Union[float, None], Union[float, None]],
         data_item_index: int = 0,
-        ncci_info: List[List[dict]] = []):
+        ncci_info: List[List[dict]] = []) -> PricedLineItem:
     # Inputs
     line_item, gpci_info, rvus, provider_taxonomy_code, anes_base_unit, anes_conversion_factor = data_item
     date_of_service = line_item['service_date']
@@ -26,12 +30,13 @@ def price_line_item_get(
     mod2 = line_item['mod2']
     mod3 = line_item['mod3']
     mod4 = line_item['mod4']
-    charges = float(line_item['charges'])
-    units = float(line_item['quantity'])
+    charges = line_item['charges']
+    units = line_item['quantity']
 
     # Calculated fields
     comments = []
-    service_quarter = get_quarter(date_of_service)
+    service_date = parse_date(date_of_service)
+    service_quarter = format_quarter(service_date)
 
     pw_gpci = float(gpci_info["pw_gpci"])
     pe_gpci = float(gpci_info["pe_gpci"])
@@ -78,49 +83,57 @@ def price_line_item_get(
     # Main Payment Calculation
     payment = ((wrvu * pw_gpci) + (pe_rvu * pe_gpci) + (mp_rvu * mp_gpci)) * conversion_factor * units
 
-    line_item_payment_details = {
-        "code": cpt,
-        "mod1": mod1,
-        "mod2": mod2,
-        "mod3": mod3,
-        "mod4": mod4,
-        "charges": charges,
-        "quantity": units,
-        "locality_name": locality_name,
-        "quarter": service_quarter,
-        "wrvu": wrvu,
-        "pe_rvu": pe_rvu,
-        "mp_rvu": mp_rvu,
-        "pw_gpci": pw_gpci,
-        "pe_gpci": pe_gpci,
-        "mp_gpci": mp_gpci,
-        "conversion_factor": conversion_factor,
-        "global_surgery_code": global_days,
-        "line_item_payment": payment,
-        "comments": comments,
-        "asst_surg": asst_surg,
-        "co_surg": co_surg,
-        "team_surg": team_surg,
-        "multi_proc": multi_proc,
-        "bilat_surg": bilat_surg,
-        "pre_op": pre_op,
-        "intra_op": intra_op,
-        "post_op": post_op,
-        "provider_taxonomy_code": provider_taxonomy_code,
-        "endo_base": endo_base,
-        "service_date": fit_date(date_of_service),
-        "anes_base_unit": anes_base_unit,
-        "anes_conversion_factor": anes_conversion_factor
-    }
+    line_item_payment_details = PricedLineItem(
+        code=cpt,
+        mod1=mod1,
+        mod2=mod2,
+        mod3=mod3,
+        mod4=mod4,
+        charges=charges,
+        quantity=units,
+        locality_name=locality_name,
+        quarter=service_quarter,
+        wrvu=wrvu,
+        pe_rvu=pe_rvu,
+        mp_rvu=mp_rvu,
+        pw_gpci=pw_gpci,
+        pe_gpci=pe_gpci,
+        mp_gpci=mp_gpci,
+        conversion_factor=conversion_factor,
+        global_surgery_code=global_days,
+        line_item_payment=payment,
+        comments=comments,
+        asst_surg=asst_surg,
+        co_surg=co_surg,
+        team_surg=team_surg,
+        multi_proc=multi_proc,
+        bilat_surg=bilat_surg,
+        pre_op=pre_op,
+        intra_op=intra_op,
+        post_op=post_op,
+        provider_taxonomy_code=provider_taxonomy_code,
+        endo_base=endo_base,
+        service_date=format_date(service_date),
+        anes_base_unit=anes_base_unit,
+        anes_conversion_factor=anes_conversion_factor
+    )
 
     # Perform any needed adjustments
     if len(comments) == 0:
+        opps_cap = find_opps_cap(cpt, line_item_payment_details.mods, gpci_info, get_service_quarter(service_date),
+                                 facilty_payment)
+        if opps_cap is not None:
+            adjust_opps_cap(line_item_payment_details, opps_cap)
         line_item_payment_details = perform_adjustments(line_item_payment_details, data_item_index, ncci_info)
 
     return line_item_payment_details
 
 
-def price_line_item_prepare(db, line_item: dict) -> Tuple[dict, dict, dict, str, float, float]:
+def price_line_item_prepare(db, line_item: dict, reference: ClaimReference = None) -> \
+        Tuple[dict, dict, dict, str, float, float]:
+    if reference is None:
+        reference = prefetch_reference(db, [line_item])
+
     cpt = line_item['code']
     mod1 = line_item['mod1']
     mod2 = line_item['mod2']
@@ -130,30 +143,31 @@ def price_line_item_prepare(db, line_item: dict) -> Tuple[dict, dict, dict, str,
 
     rendering_provider_npi = line_item["rendering_provider_npi"]
 
-    provider_zip = find_zip_by_npi(db, rendering_provider_npi)
+    provider_zip, provider_taxonomy_code = reference.get_provider(rendering_provider_npi)
     if not provider_zip:
         raise ValueError(f"Couldn't find zip code for NPI {rendering_provider_npi}")
-    region = find_region_by_zip(provider_zip)
+    region = reference.get_region(provider_zip)
     if not region:
         raise ValueError(f"Couldn't find medicare region for zip code {provider_zip}")
-    provider_taxonomy_code = find_tc_by_npi(db, rendering_provider_npi)
     if not provider_taxonomy_code:
         raise ValueError(f"Couldn't find taxonomy code for NPI {rendering_provider_npi}")
-    gpci_info = get_gpci(db, region['carrier'], region['locality'], date_of_service)
+    gpci_info = reference.gpci.get((region['carrier'], region['locality'], date_of_service))
 
-    # Get RVU values for correct cpt/mod
-    for mod in [mod1, mod2, mod3, mod4]:
-        rvus = get_rvus(db, cpt, mod, date_of_service)
-        if rvus is not None:
-            break
+    rvus = reference.get_rvus(cpt, [mod1, mod2, mod3, mod4], date_of_service)
 
-    anes_base_unit = get_base_unit(db, cpt, date_of_service)
-    anes_conversion_factor = get_conversion_factor(db, region['carrier'], region['locality'], date_of_service)
+    anes_base_unit = reference.anes_base_units.get((cpt, date_of_service))
+    anes_conversion_factor = reference.anes_conversion_factors.get(
+        (region['carrier'], region['locality'], date_of_service)
+    )
 
     return line_item, gpci_info, rvus, provider_taxonomy_code, anes_base_unit, anes_conversion_factor
 
 
-def ncci_info_prepare(db, line_items: List[dict]) -> List[List[dict]]:
+def ncci_info_prepare(db, line_items: List[dict], reference: ClaimReference = None) -> List[List[dict]]:
+    if reference is None:
+        reference = ClaimReference()
+        reference.ncci = get_ncci_many(db, get_ncci_keys(line_items))
+
     ncci_info = []
 
     # 1. Check every line_items pair and compare code_1, code_2 with NCCI col_1, col_2
@@ -161,19 +175,16 @@ def ncci_info_prepare(db, line_items: List[dict]) -> List[List[dict]]:
     for line_item_index, line_item in enumerate(line_items):
         # If line_item second code
         if line_item_index % 2 != 0:
-            if line_items[line_item_index - 1]['service_date'] == line_item['service_date']:
-                service_date = datetime.strptime(line_item['service_date'], '%m/%d/%Y').strftime('%Y/%m/%d')
-
-                ncci_rows = get_ncci(
-                    db, line_items[line_item_index - 1]['code'], line_item['code'], service_date
-                )
-                ncci_info.append(ncci_rows)
+            ncci_key = get_ncci_pair_key(line_items[line_item_index - 1], line_item)
+            if ncci_key is not None:
+                ncci_info.append(reference.ncci[ncci_key])
         else:
             ncci_info.append([])
 
     return ncci_info
 
 
+@metrics.timed(metrics.STAGE_PRICE_CLAIM_GET, size=lambda claim, data, *args, **kwargs: len(data))
 def price_claim_get(claim: dict, data: List[Tuple[dict, dict, dict, str, float, float]], ncci_info: List[List[dict]]):
     total_payment = 0.0
     total_charges = 0.0
@@ -190,15 +201,13 @@ def price_claim_get(claim: dict, data: List[Tuple[dict, dict, dict, str, float,
             )
         )
 
-    perform_adjustments_bilateral_surgery(line_items)
-    perform_adjustments_multiple(line_items)
-    perform_adjustments_anesthesia_pricing(line_items)
+    perform_claim_adjustments(line_items)
 
     for line_item in line_items:
-        payment = to_currency(line_item["line_item_payment"])
-        line_item["line_item_payment"] = payment
+        payment = to_currency(line_item.line_item_payment)
+        line_item.line_item_payment = payment
         total_payment += payment
-        total_charges += line_item["charges"]
+        total_charges += line_item.charges
 
     return {
         "claim_number": claim_number,
@@ -211,24 +220,93 @@ def price_claim_get(claim: dict, data: List[Tuple[dict, dict, dict, str, float,
     }
 
 
+@metrics.timed(metrics.STAGE_PREPARE, size=lambda claim, reference: len(claim['line_items']))
+def price_claim_prepare(claim: dict, reference: ClaimReference) -> \
+        Tuple[List[Tuple[dict, dict, dict, str, float, float]], List[List[dict]]]:
+    data = [price_line_item_prepare(None, line_item, reference) for line_item in claim['line_items']]
+
+    ncci_info = ncci_info_prepare(None, claim['line_items'], reference)
+
+    return data, ncci_info
+
+
+def priced_claim_to_dict(priced_claim: dict) -> dict:
+    # Line items are only turned into dicts when the response is serialized
+    return {**priced_claim, "line_items": [line_item.to_dict() for line_item in priced_claim["line_items"]]}
+
+
 def price_claim(claim, reference_database_connection=None):
-    temporary_database_connection = None
+    return price_claims([claim], reference_database_connection)[0]
+
+
+def prefetch_database_reference(claims_line_items: List[List[dict]]) -> ClaimReference:
+    # Borrow a connection from the process pool
+    with get_db_pool("t_data").connection() as db, swappable_reference.acquire() as snapshots:
+        return prefetch_claims_reference(DatabaseBackend(db, snapshots), claims_line_items)
+
+
+def prefetch_default_reference(claims_line_items: List[List[dict]]) -> ClaimReference:
+    """
+    Resolves the reference data from the current generation of the REFERENCE_BACKEND. With
+    REFERENCE_FILES_FALLBACK, the reference files are used while the reference database can't be reached. A
+    quarter loaded after the reference database was reloaded swaps in the new generation and the claims are
+    resolved again from it.
+    """
+    if file_reference.is_local_backend():
+        with swappable_reference.acquire() as reference:
+            return prefetch_claims_reference(reference, claims_line_items)
+
+    import psycopg2.pool
+
+    try:
+        try:
+            return prefetch_database_reference(claims_line_items)
+        except StaleSnapshotError:
+            # The reference database was reloaded after the claims acquired their generation
+            swappable_reference.check()
+            return prefetch_database_reference(claims_line_items)
+    except (psycopg2.OperationalError, psycopg2.pool.PoolError):
+        if not file_reference.REFERENCE_FILES_FALLBACK:
+            raise
+        logging.warning("Reference database unavailable, pricing from the reference files", exc_info=True)
+        return prefetch_claims_reference(file_reference.get_file_reference(), claims_line_items)
+
+
+def count_line_items(claims: List[dict], reference_database_connection=None) -> int:
+    return sum(len(claim['line_items']) for claim in claims)
+
+
+@metrics.timed(metrics.STAGE_PRICE_CLAIMS, size=count_line_items)
+def price_claims(claims: List[dict], reference_database_connection=None) -> List[dict]:
+    """
+    Prices a batch of claims using one database connection. Claims are checked against the claim schema
+    first, unless they were decoded by claim_schema already. Reference data for the whole batch is prefetched
+    up front so lookups shared between claims hit the database only once. Claims priced before with the same
+    reference version are served from the claim cache when it is enabled.
+    """
+    claims = claim_schema.validate_claims(claims)
+    if claim_cache.enabled:
+        return price_claims_cached(claims, reference_database_connection, price_claims_uncached)
+
+    return price_claims_uncached(claims, reference_database_connection)
+
+
+def price_claims_uncached(claims: List[dict], reference_database_connection=None) -> List[dict]:
+    claims_line_items = [claim['line_items'] for claim in claims]
 
     if reference_database_connection is None:
-        # If a database connection wasn't provided, open one
-        db_config = get_db_config_from_env("t_data")
-        temporary_database_connection = get_db(db_config)
-        reference_database_connection = temporary_database_connection
+        reference = prefetch_default_reference(claims_line_items)
+    else:
+        reference = prefetch_claims_reference(reference_database_connection, claims_line_items)
 
-    data = [
-        price_line_item_prepare(reference_database_connection, line_item)
-        for line_item in claim['line_items']
-    ]
+    return price_claims_with_reference(claims, reference)
 
-    ncci_info = ncci_info_prepare(reference_database_connection, claim['line_items'])
 
-    # Clean up database connection if we opened it
-    if temporary_database_connection:
-        temporary_database_connection.close()
+def price_claims_with_reference(claims: List[dict], reference: ClaimReference) -> List[dict]:
+    """
+    Prices a batch of validated claims (see claim_schema.validate_claims) from reference data that was already
+    resolved.
+    """
+    prepared_claims = [price_claim_prepare(claim, reference) for claim in claims]
 
-    return price_claim_get(claim, data, ncci_info)
+    return [price_claim_get(claim, data, ncci_info) for claim, (data, ncci_info) in zip(claims, prepared_claims)]
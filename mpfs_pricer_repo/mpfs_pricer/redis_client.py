@@ -0,0 +1,23 @@
+import os
+from threading import Lock
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+
+_redis = None
+_redis_lock = Lock()
+
+
+def get_redis():
+    """
+    Returns the Redis client of the process, on the Redis of the Celery broker. Its connection pool reconnects
+    after a fork.
+    """
+    global _redis
+
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                import redis
+
+                _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
@@ -0,0 +1,179 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from mpfs_pricer import file_reference, reference_version
+from mpfs_pricer.database import get_db_pool
+from mpfs_pricer.prefetch import DatabaseSnapshots, database_snapshots
+
+# Seconds between two checks for a new version of the reference data, 0 disables hot swapping
+REFERENCE_RELOAD_INTERVAL = float(os.environ.get("REFERENCE_RELOAD_INTERVAL", "0"))
+
+_watcher = None
+_watcher_lock = Lock()
+
+
+class ReferenceGeneration:
+    """
+    One version of the reference data of the process: the local ReferenceBackend of REFERENCE_BACKEND=files
+    or snapshot, or the DatabaseSnapshots (and provider cache) of the reference database.
+    """
+
+    def __init__(self, version, reference):
+        self.version = version
+        self.reference = reference
+        self.readers = 0
+        self.retired = False
+
+    def release(self):
+        # Snapshot files are unmapped and database snapshots dropped, the rest is left to the garbage collector
+        close = getattr(self.reference, "close", None)
+        if close is not None:
+            close()
+
+
+def get_version(reference) -> str:
+    if isinstance(reference, DatabaseSnapshots):
+        with get_db_pool("t_data").connection() as db:
+            return reference_version.get_database_version(db)
+    return reference_version.get_files_version(reference.directory)
+
+
+def reload_reference(reference, version: str):
+    # Loads the current reference data into a new reference of the same kind, warmed like `reference`
+    if isinstance(reference, DatabaseSnapshots):
+        with get_db_pool("t_data").connection() as db:
+            return reference.reload(db, version)
+    return reference.reload()
+
+
+def is_swapping_enabled() -> bool:
+    return REFERENCE_RELOAD_INTERVAL > 0
+
+
+def get_initial_generation() -> ReferenceGeneration:
+    reference = file_reference.get_local_reference() if file_reference.is_local_backend() else database_snapshots
+    if not is_swapping_enabled():
+        # Never swapped: the generation isn't versioned and its quarters aren't checked against a version
+        return ReferenceGeneration(None, reference)
+
+    # Read before any quarter is loaded, so a reload published meanwhile is detected by the first check
+    version = get_version(reference)
+    if isinstance(reference, DatabaseSnapshots):
+        reference.set_version(version)
+    return ReferenceGeneration(version, reference)
+
+
+class SwappableReference:
+    """
+    Pointer to the current generation of the reference data.
+
+    Readers hold the generation they started with until they are done, so the reference data of a batch of
+    claims is resolved from a single version. New versions are loaded in the background and swapped in
+    atomically; a replaced generation is released once its last reader is done.
+    """
+
+    def __init__(self):
+        self.generation = None
+        self.lock = Lock()
+
+    def get_generation(self) -> ReferenceGeneration:
+        with self.lock:
+            if self.generation is None:
+                self.generation = get_initial_generation()
+            return self.generation
+
+    @contextmanager
+    def acquire(self):
+        with self.lock:
+            if self.generation is None:
+                self.generation = get_initial_generation()
+            generation = self.generation
+            generation.readers += 1
+        try:
+            yield generation.reference
+        finally:
+            with self.lock:
+                generation.readers -= 1
+                released = generation.retired and generation.readers == 0
+            if released:
+                generation.release()
+
+    def swap(self, generation: ReferenceGeneration):
+        with self.lock:
+            retired, self.generation = self.generation, generation
+            released = False
+            if retired is not None:
+                retired.retired = True
+                released = retired.readers == 0
+        if released:
+            retired.release()
+
+        # Claims priced from the new generation aren't cached under the former version, and the lookup caches
+        # drop the results of the former version
+        reference_version.reset_reference_version()
+
+    def check(self) -> bool:
+        """
+        Loads and swaps in the reference data when its version changed. Returns whether it did, never when
+        REFERENCE_RELOAD_INTERVAL disables hot swapping.
+        """
+        if not is_swapping_enabled():
+            return False
+
+        generation = self.get_generation()
+        version = get_version(generation.reference)
+        if version == generation.version:
+            return False
+
+        started = time.monotonic()
+        self.swap(ReferenceGeneration(version, reload_reference(generation.reference, version)))
+        logging.info(f"Reference data {version} swapped in after {time.monotonic() - started:.1f}s")
+        return True
+
+    def reset(self):
+        with self.lock:
+            self.generation = None
+
+
+swappable_reference = SwappableReference()
+
+
+class ReferenceWatcher(Thread):
+    """
+    Background thread checking for a new version of the reference data every `interval` seconds.
+    """
+
+    def __init__(self, reference: SwappableReference, interval: float):
+        super().__init__(name="reference-watcher", daemon=True)
+        self.reference = reference
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.reference.check()
+            except Exception:
+                # The current generation keeps serving until a reload succeeds
+                logging.exception("Reference data reload failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_reference_watcher():
+    """
+    Starts the reference watcher of the process when REFERENCE_RELOAD_INTERVAL is set. Threads don't survive a
+    fork, so this is called by every worker process.
+    """
+    global _watcher
+
+    if not is_swapping_enabled():
+        return
+
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = ReferenceWatcher(swappable_reference, REFERENCE_RELOAD_INTERVAL)
+            _watcher.start()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from mpfs_pricer import file_reference
+from mpfs_pricer.database import get_db_pool
+from mpfs_pricer.prefetch import DatabaseBackend, ReferenceBackend
+
+# Version of the reference data set by the deployment, bump it to invalidate what was priced with the former data
+REFERENCE_VERSION = os.environ.get("REFERENCE_VERSION", "")
+
+# Seconds a process reuses the reference version before checking it again
+REFERENCE_VERSION_CHECK_INTERVAL = float(os.environ.get("REFERENCE_VERSION_CHECK_INTERVAL", "60"))
+
+# Table the DAG inserts a (version, loaded_at) row into once it has loaded the reference tables
+REFERENCE_VERSION_TABLE = os.environ.get("REFERENCE_VERSION_TABLE", "internal_reference.reference_version")
+
+REFERENCE_VERSION_QUERY = f"""
+        SELECT version
+        FROM {REFERENCE_VERSION_TABLE}
+        ORDER BY loaded_at DESC
+        LIMIT 1
+    """
+
+_versions = {}  # backend key -> (version, checked at)
+_version_lock = Lock()
+
+
+def get_files_version(directory: Path) -> str:
+    digest = hashlib.md5()
+    for path in sorted(directory.iterdir()):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns},".encode())
+    return digest.hexdigest()
+
+
+def get_database_version(db) -> str:
+    """
+    Returns the version marker of the last reload of the reference tables, "" before the first one or while
+    REFERENCE_VERSION_TABLE doesn't exist. A failed query is rolled back, so `db` isn't left in an aborted
+    transaction.
+    """
+    import psycopg2
+    import psycopg2.errors
+
+    cursor = db.cursor()
+    try:
+        cursor.execute(REFERENCE_VERSION_QUERY)
+        row = cursor.fetchone()
+        return (row[0] or "") if row else ""
+    except psycopg2.Error as e:
+        if not db.closed:
+            db.rollback()
+        if isinstance(e, psycopg2.errors.UndefinedTable):
+            return ""
+        raise
+    finally:
+        cursor.close()
+
+
+def load_reference_version(db=None) -> str:
+    """
+    Returns the version of the reference data `db` (or the REFERENCE_BACKEND) serves: the reference files or
+    snapshots and bundled data files, or the version marker of the reference tables.
+    """
+    versions = [REFERENCE_VERSION, get_files_version(file_reference.BUNDLED_DATA_DIR)]
+
+    if isinstance(db, DatabaseBackend):
+        versions.append(get_database_version(db.db))
+    elif isinstance(db, ReferenceBackend):
+        # Backends served from local files (reference files, snapshots) have a directory
+        if getattr(db, "directory", None) is not None:
+            versions.append(get_files_version(db.directory))
+    elif db is not None:
+        versions.append(get_database_version(db))
+    elif file_reference.is_local_backend():
+        versions.append(get_files_version(file_reference.get_local_reference().directory))
+    else:
+        with get_db_pool("t_data").connection() as db:
+            versions.append(get_database_version(db))
+
+    return hashlib.md5("|".join(versions).encode()).hexdigest()
+
+
+def get_backend_key(db):
+    """
+    Identifies the reference data `db` serves: None for the REFERENCE_BACKEND, the directory of the backends
+    served from local files, the DSN of database connections.
+    """
+    if db is None:
+        return None
+    if isinstance(db, DatabaseBackend):
+        db = db.db
+    directory = getattr(db, "directory", None)
+    if directory is not None:
+        return str(directory)
+    return getattr(db, "dsn", None) or id(db)
+
+
+def get_reference_version(db=None) -> str:
+    """
+    Returns the version of the reference data `db` serves, checked at most every REFERENCE_VERSION_CHECK_INTERVAL
+    seconds per backend and process.
+    """
+    key = get_backend_key(db)
+    with _version_lock:
+        version, checked_at = _versions.get(key, (None, 0.0))
+        if version is None or time.monotonic() - checked_at >= REFERENCE_VERSION_CHECK_INTERVAL:
+            version = load_reference_version(db)
+            _versions[key] = (version, time.monotonic())
+        return version
+
+
+def reset_reference_version():
+    with _version_lock:
+        _versions.clear()
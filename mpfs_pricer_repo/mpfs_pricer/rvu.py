@@ -1,32 +1,44 @@
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer.database import Lookup, execute_statement
+from mpfs_pricer.lookup_cache import LookupCache, get_table_ttl
+
+RVU_COLUMNS = """
+            hcpcs, "MOD", description, "STATUS CODE", "WORK RVU", "NON-FAC PE RVU",
+            "NON-FAC NA INDICATOR", "FACILITY PE RVU", "FACILITY NA INDICATOR", "MP RVU", "NON-FACILITY TOTAL",
+            "FACILITY TOTAL", "PCTC IND", "GLOB DAYS", "PRE OP", "INTRA OP", "POST OP", "MULT PROC", "BILAT SURG",
+            "ASST SURG", "CO-SURG", "TEAM SURG", "ENDO BASE", "CONV FACTOR",
+            "PHYSICIAN SUPERVISION OF DIAGNOSTIC PROCEDURES", "CALCULATION FLAG",
+            "DIAGNOSTIC IMAGING FAMILY INDICATOR", "NON-FACILITY PE USED FOR OPPS PAYMENT AMOUNT",
+            "FACILITY PE USED FOR OPPS PAYMENT AMOUNT", "MP USED FOR OPPS PAYMENT AMOUNT"
+    """
+
+RVU_QUERY = f"""
+        SELECT
+            {RVU_COLUMNS}
+        FROM internal_reference.cms_pfs_rvu
+        where
+            hcpcs = %s and
+            "MOD" IS NOT DISTINCT FROM %s and
+            eff_start_dt <= %s and
+            eff_end_dt >= %s
+
+    """
+
+
 def get_rvus(db, cpt, mod, date_of_service):
     if mod == "":
         mod = None
 
-    query = """
-            SELECT
-                hcpcs, "MOD", description, "STATUS CODE", "WORK RVU", "NON-FAC PE RVU",
-                "NON-FAC NA INDICATOR", "FACILITY PE RVU", "FACILITY NA INDICATOR", "MP RVU", "NON-FACILITY TOTAL",
-                "FACILITY TOTAL", "PCTC IND", "GLOB DAYS", "PRE OP", "INTRA OP", "POST OP", "MULT PROC", "BILAT SURG",
-                "ASST SURG", "CO-SURG", "TEAM SURG", "ENDO BASE", "CONV FACTOR",
-                "PHYSICIAN SUPERVISION OF DIAGNOSTIC PROCEDURES", "CALCULATION FLAG",
-                "DIAGNOSTIC IMAGING FAMILY INDICATOR", "NON-FACILITY PE USED FOR OPPS PAYMENT AMOUNT",
-                "FACILITY PE USED FOR OPPS PAYMENT AMOUNT", "MP USED FOR OPPS PAYMENT AMOUNT"
-            FROM internal_reference.cms_pfs_rvu
-            where
-                hcpcs = %s and
-                "MOD" IS NOT DISTINCT FROM %s and
-                eff_start_dt <= %s and
-                eff_end_dt >= %s
-
-        """
-
-    cursor = db.cursor()
-    cursor.execute(query, [cpt, mod, date_of_service, date_of_service])
+    cursor = execute_statement(db, "get_rvus", RVU_QUERY, [cpt, mod, date_of_service, date_of_service])
 
     res = cursor.fetchone()
     if not res:
         return None
 
+    return rvus_from_row(res)
+
+
+def rvus_from_row(res: tuple) -> dict:
     cpt, mod, desc, status_code, work_rvu, nonfac_pe_rvu, nonfac_na_indicator, fac_pe_rvu, fac_na_indicator, mp_rvu, nonfac_total, fac_total, pctc_ind, glob_days, pre_op, intra_op, post_op, multi_proc, bilat_surg, asst_surg, co_surg, team_surg, endo_base, conv_factor, phys_super, calc_flag, imaging_ind, nonfac_pe_opps, fac_pe_opps, mp_opps = res
     return {
         "cpt": cpt,
@@ -60,3 +72,19 @@ def get_rvus(db, cpt, mod, date_of_service):
         "fac_pe_opps": fac_pe_opps,
         "mp_opps": mp_opps,
     }
+
+
+RVU_LOOKUP = Lookup(
+    "get_rvus_many", RVU_QUERY,
+    lambda key: [key[0], None if key[1] == "" else key[1], key[2], key[2]],
+    lambda rows: rvus_from_row(rows[0]) if rows else None,
+    cache=LookupCache("rvu", get_table_ttl("rvu", 604800)),
+)
+
+
+def get_rvus_many(db, keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+    """
+    Batched get_rvus: resolves every (cpt, mod, date_of_service) key in one round trip.
+    Keys without RVUs map to None.
+    """
+    return RVU_LOOKUP.fetch(db, keys)
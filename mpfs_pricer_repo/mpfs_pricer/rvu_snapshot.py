@@ -0,0 +1,101 @@
+import os
+from array import array
+from datetime import date
+from sys import intern
+from typing import Dict, Iterable, Tuple
+from mpfs_pricer import metrics, rvu
+from mpfs_pricer.snapshots import IntervalIndex, Quarter, QuarterSnapshots, get_quarter_bounds
+from mpfs_pricer.utils import parse_date
+
+# Number of quarters kept in memory, least recently used quarters are evicted. 0 disables the snapshot.
+RVU_SNAPSHOT_MAX_QUARTERS = int(os.environ.get("RVU_SNAPSHOT_MAX_QUARTERS", "4"))
+
+RVU_SNAPSHOT_QUERY = f"""
+        SELECT
+            {rvu.RVU_COLUMNS}, eff_start_dt, eff_end_dt
+        FROM internal_reference.cms_pfs_rvu
+        where
+            eff_start_dt <= %s and
+            eff_end_dt >= %s
+    """
+
+
+def to_column(values: list):
+    # Pure float columns are packed into a typed array, everything else is kept as-is with interned strings
+    if all(type(value) is float for value in values):
+        return array("d", values)
+    return [intern(value) if type(value) is str else value for value in values]
+
+
+class RvuQuarterSnapshot:
+    """
+    Columnar copy of the RVU rows effective during one quarter.
+
+    Rows are indexed by (hcpcs, mod) and effective date interval.
+    """
+
+    def __init__(self, quarter: Quarter, rows: list):
+        self.quarter = quarter
+
+        # Last two columns are the effective date interval
+        self.columns = [to_column(list(values)) for values in zip(*[row[:-2] for row in rows])]
+        self.starts = array("i", [row[-2].toordinal() for row in rows])
+        self.ends = array("i", [row[-1].toordinal() for row in rows])
+
+        self.intervals = IntervalIndex([(row[0], row[1]) for row in rows], self.starts, self.ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def row(self, row_index: int) -> tuple:
+        return tuple(column[row_index] for column in self.columns)
+
+    def find(self, cpt: str, mod: str, service_date: date):
+        row_index = self.intervals.find((cpt, mod), service_date)
+        if row_index is None:
+            return None
+
+        return rvu.rvus_from_row(self.row(row_index))
+
+
+class RvuSnapshot(QuarterSnapshots):
+    """
+    Per-process cache of RVU quarter snapshots.
+    """
+
+    def __init__(self, max_quarters: int = RVU_SNAPSHOT_MAX_QUARTERS):
+        super().__init__(max_quarters)
+
+    def load_quarter(self, db, quarter: Quarter) -> RvuQuarterSnapshot:
+        start, end = get_quarter_bounds(quarter)
+
+        cursor = db.cursor()
+        cursor.execute(RVU_SNAPSHOT_QUERY, [end, start])
+
+        return RvuQuarterSnapshot(quarter, cursor.fetchall())
+
+    def get_rvus(self, db, cpt, mod, date_of_service):
+        if mod == "":
+            mod = None
+
+        service_date = parse_date(date_of_service)
+        return self.get_service_date_snapshot(db, service_date).find(cpt, mod, service_date)
+
+
+rvu_snapshot = RvuSnapshot()
+
+
+def get_rvus(db, cpt, mod, date_of_service):
+    if not rvu_snapshot.enabled:
+        return rvu.get_rvus(db, cpt, mod, date_of_service)
+
+    return rvu_snapshot.get_rvus(db, cpt, mod, date_of_service)
+
+
+@metrics.timed(metrics.STAGE_RVU)
+def get_rvus_many(db, keys: Iterable[Tuple[str, str, str]],
+                  snapshot: RvuSnapshot = rvu_snapshot) -> Dict[Tuple[str, str, str], dict]:
+    if not snapshot.enabled:
+        return rvu.get_rvus_many(db, keys)
+
+    return {key: snapshot.get_rvus(db, *key) for key in dict.fromkeys(keys)}
@@ -0,0 +1,136 @@
+from bisect import bisect_right
+import copy
+from collections import OrderedDict
+from datetime import date
+from threading import Lock
+from typing import Hashable, Iterable, Optional, Sequence, Tuple
+
+Quarter = Tuple[int, int]
+
+
+class StaleSnapshotError(RuntimeError):
+    """
+    Raised when a quarter is loaded into the snapshots of a version of the reference database that was replaced.
+    """
+
+
+def get_service_quarter(service_date: date) -> Quarter:
+    return service_date.year, (service_date.month - 1) // 3 + 1
+
+
+def get_quarter_bounds(quarter: Quarter) -> Tuple[date, date]:
+    year, quarter_number = quarter
+    first_month = (quarter_number - 1) * 3 + 1
+    start = date(year, first_month, 1)
+    end = date(year + 1, 1, 1) if quarter_number == 4 else date(year, first_month + 3, 1)
+    return start, date.fromordinal(end.toordinal() - 1)
+
+
+def get_region_key(carrier, locality) -> tuple:
+    # Postgres coerces the zero padded ZPLC values ("02102", "01") to the type of the region columns, so
+    # numeric values are compared as numbers whatever their type
+    return tuple(int(value) if str(value).strip().isdigit() else value for value in (carrier, locality))
+
+
+class IntervalIndex:
+    """
+    Index of rows by key and effective date interval.
+
+    Every key maps to its intervals sorted by start date so a lookup is a dict access plus a bisect.
+    Starts and ends are date ordinals.
+    """
+
+    def __init__(self, keys: Iterable[Hashable], starts: Sequence[int], ends: Sequence[int]):
+        self.ends = ends
+
+        intervals = {}
+        for row_index, key in enumerate(keys):
+            intervals.setdefault(key, []).append(row_index)
+
+        self.index = {}
+        for key, row_indexes in intervals.items():
+            row_indexes.sort(key=lambda item: starts[item])
+            self.index[key] = (tuple(starts[item] for item in row_indexes), tuple(row_indexes))
+
+    def find(self, key: Hashable, service_date: date) -> Optional[int]:
+        """
+        Returns the index of the latest starting row of `key` effective on `service_date`.
+        """
+        intervals = self.index.get(key)
+        if intervals is None:
+            return None
+
+        starts, row_indexes = intervals
+        day = service_date.toordinal()
+        position = bisect_right(starts, day)
+        while position > 0:
+            position -= 1
+            row_index = row_indexes[position]
+            if self.ends[row_index] >= day:
+                return row_index
+
+        return None
+
+
+class QuarterSnapshots:
+    """
+    Per-process cache of reference data snapshots, one per quarter. Quarters are loaded from the database
+    the first time a service date falls in them and the least recently used ones are evicted above
+    `max_quarters`. Once `version` is set, quarters are only kept when the database still has that version.
+    """
+
+    def __init__(self, max_quarters: int):
+        self.max_quarters = max_quarters
+        self.quarters = OrderedDict()
+        self.version = None
+        self.lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_quarters > 0
+
+    def load_quarter(self, db, quarter: Quarter):
+        raise NotImplementedError
+
+    def get_quarter(self, db, quarter: Quarter):
+        with self.lock:
+            snapshot = self.quarters.get(quarter)
+            if snapshot is not None:
+                self.quarters.move_to_end(quarter)
+                return snapshot
+
+            snapshot = self.load_quarter(db, quarter)
+            if self.version is not None:
+                self.check_version(db)
+            self.quarters[quarter] = snapshot
+            while len(self.quarters) > self.max_quarters:
+                self.quarters.popitem(last=False)
+
+            return snapshot
+
+    def check_version(self, db):
+        # Imported here: the reference version module depends on the snapshot modules
+        from mpfs_pricer.reference_version import get_database_version
+
+        # The DAG writes its version marker with the tables, checking it after the load covers the rows read
+        version = get_database_version(db)
+        if version != self.version:
+            raise StaleSnapshotError(f"Reference data {self.version} was replaced by {version}")
+
+    def get_loaded(self) -> "QuarterSnapshots":
+        """
+        Returns a copy of these snapshots holding the quarters loaded so far, which never loads nor evicts any:
+        the async prefetch reads it without a database connection.
+        """
+        loaded = copy.copy(self)
+        with self.lock:
+            loaded.quarters = OrderedDict(self.quarters)
+        loaded.lock = Lock()
+        return loaded
+
+    def get_service_date_snapshot(self, db, service_date: date):
+        return self.get_quarter(db, get_service_quarter(service_date))
+
+    def clear(self):
+        with self.lock:
+            self.quarters.clear()
@@ -0,0 +1,79 @@
+import argparse
+import importlib
+import logging
+import subprocess
+import sys
+import time
+from typing import List, Sequence, Tuple
+
+# Modules imported once by the uWSGI master and the Celery main process before they fork, so every worker process
+# inherits them instead of importing them when it starts
+PRELOAD_MODULES = ["psycopg2.pool", "dateutil.parser", "numpy", "redis", "mpfs_pricer.pricer", "mpfs_pricer.warmup"]
+
+# Modules whose import cost is reported by default: the REST API and the Celery tasks
+REPORT_MODULES = ["restapi.app", "worker.tasks"]
+
+
+def preload(modules: Sequence[str] = PRELOAD_MODULES) -> List[Tuple[str, float]]:
+    """
+    Imports `modules` and returns the seconds each took, modules imported before take no time.
+    """
+    timings = []
+    for name in modules:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings.append((name, time.perf_counter() - started))
+
+    logging.info("Preloaded " + ", ".join(f"{name} ({seconds * 1000:.0f}ms)" for name, seconds in timings))
+    return timings
+
+
+def parse_import_times(output: str) -> List[Tuple[str, float, float]]:
+    # `python -X importtime` lines: "import time: <self us> | <cumulative us> | <indented module name>"
+    import_times = []
+    for line in output.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        self_us, cumulative_us = int(fields[0].split(":")[1]), int(fields[1])
+        import_times.append((fields[2].strip(), self_us / 1e6, cumulative_us / 1e6))
+    return import_times
+
+
+def get_import_times(module: str) -> List[Tuple[str, float, float]]:
+    """
+    Imports `module` in a new interpreter and returns the (module, self seconds, cumulative seconds) of every
+    module it imported, in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_import_times(result.stderr)
+
+
+def format_report(module: str, import_times: List[Tuple[str, float, float]], top: int) -> str:
+    total = next((cumulative for name, _, cumulative in reversed(import_times) if name == module), 0.0)
+    lines = [f"{module}: {total * 1000:.0f}ms, {len(import_times)} modules", f"{'self ms':>9} {'cumul. ms':>9}  module"]
+    for name, self_seconds, cumulative in sorted(import_times, key=lambda row: row[2], reverse=True)[:top]:
+        lines.append(f"{self_seconds * 1000:9.1f} {cumulative * 1000:9.1f}  {name}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mpfs_pricer.startup",
+        description="Reports what importing the REST API and the Celery tasks costs, per module.",
+    )
+    parser.add_argument("modules", nargs="*", default=REPORT_MODULES, help="modules to import")
+    parser.add_argument("--top", type=int, default=25, help="number of modules listed, by cumulative import time")
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        print(format_report(module, get_import_times(module), args.top))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,66 @@
 import math
-import dateutil.parser
+import re
 from datetime import date
+from functools import lru_cache
 
+# Number of distinct date strings remembered by the parsing helpers
+DATE_CACHE_SIZE = 4096
 
-def fit_date(val: str) -> str:
+# Formats parsed without dateutil: M/D/YYYY (claims), YYYY-MM-DD and YYYYMMDD
+US_DATE_PATTERN = re.compile(r"([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})")
+ISO_DATE_PATTERN = re.compile(r"([0-9]{4})(-?)([0-9]{2})\2([0-9]{2})")
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(val: str) -> date:
     if val is None:
         raise ValueError("Invalid date - Date can't be None")
 
-    val = dateutil.parser.parse(val).date().isoformat()
-    formatted_val = val.replace("-", "")
+    match = US_DATE_PATTERN.fullmatch(val)
+    if match:
+        month, day, year = match.groups()
+    else:
+        match = ISO_DATE_PATTERN.fullmatch(val)
+        if match:
+            year, _, month, day = match.groups()
+
+    if match:
+        try:
+            return date(int(year), int(month), int(day))
+        except ValueError:
+            # Let dateutil report invalid dates the way it always did
+            pass
+
+    # dateutil takes tens of milliseconds to import, it is only needed for the other formats
+    import dateutil.parser
+
+    return dateutil.parser.parse(val).date()
 
-    assert (len(formatted_val) == 8)
 
-    return formatted_val
+def format_date(val: date) -> str:
+    return f"{val.year:04}{val.month:02}{val.day:02}"
+
+
+def format_quarter(val: date) -> str:
+    return f"{val.year}_Q{math.ceil(val.month / 3)}"
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def fit_date(val: str) -> str:
+    return format_date(parse_date(val))
 
 
 def to_currency(value: float) -> float:
     return round(value, 2)
 
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def get_quarter(date_text: str) -> str:
-    date = dateutil.parser.parse(date_text)
-    return f"{date.year}_Q{math.ceil(date.month / 3)}"
+    return format_quarter(parse_date(date_text))
 
 
 def get_year(date_text: str) -> str:
-    date = dateutil.parser.parse(date_text)
-    return f"{date.year}"
+    return f"{parse_date(date_text).year}"
 
 
 def is_date_between_dates(service_date: date, date_1: date, date_2: date):
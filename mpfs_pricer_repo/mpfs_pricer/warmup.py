@@ -0,0 +1,112 @@
+import gc
+import logging
+import os
+import time
+from datetime import date
+from threading import Event
+from typing import List
+from mpfs_pricer import file_reference, metrics
+from mpfs_pricer.data_files import get_zplc_index
+from mpfs_pricer.database import get_db_pool
+from mpfs_pricer.opps_cap import get_opps_cap_index
+from mpfs_pricer.prefetch import DatabaseSnapshots
+from mpfs_pricer.reference_swap import start_reference_watcher, swappable_reference
+from mpfs_pricer.snapshots import get_service_quarter
+
+# Set CACHE_WARMUP=true to load the reference caches before the worker processes fork
+CACHE_WARMUP = os.environ.get("CACHE_WARMUP", "false").lower() == "true"
+
+# Seconds a Celery worker process may spend warming up (when the main process couldn't) before it is considered dead
+CACHE_WARMUP_TIMEOUT = float(os.environ.get("CACHE_WARMUP_TIMEOUT", "300"))
+
+# File with the NPIs preloaded in the provider cache, one per line
+HOT_NPIS_FILE = os.environ.get("HOT_NPIS_FILE", "")
+
+caches_warm = Event()
+
+
+def read_hot_npis(path: str) -> List[str]:
+    if not path:
+        return []
+
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def warm_caches(db, snapshots: DatabaseSnapshots, service_date: date = None):
+    """
+    Loads the reference data of the quarter of `service_date` (today by default) into `snapshots`, the current
+    generation of the reference database, and its provider cache.
+    """
+    quarter = get_service_quarter(service_date or date.today())
+
+    get_zplc_index()
+    get_opps_cap_index()
+    for quarter_snapshots in snapshots:
+        if quarter_snapshots.enabled:
+            quarter_snapshots.get_quarter(db, quarter)
+
+    if snapshots.providers.enabled:
+        snapshots.providers.find_providers_by_npis(db, read_hot_npis(HOT_NPIS_FILE))
+
+
+def load_caches():
+    if file_reference.is_local_backend():
+        get_zplc_index()
+        get_opps_cap_index()
+        file_reference.get_local_reference()
+    else:
+        with get_db_pool("t_data").connection() as db, swappable_reference.acquire() as snapshots:
+            warm_caches(db, snapshots)
+
+
+def preload_caches():
+    """
+    Warms the reference caches once in the uWSGI master or the Celery main process, before the worker processes
+    fork, so they share them copy-on-write instead of each loading its own copy. When it fails, every worker
+    process warms up on its own.
+    """
+    if not CACHE_WARMUP:
+        return
+
+    started = time.monotonic()
+    try:
+        load_caches()
+    except Exception:
+        logging.exception("Reference cache preload failed")
+        return
+    finally:
+        if not file_reference.is_local_backend():
+            # Worker processes open their own connections, the master doesn't keep a session open
+            get_db_pool("t_data").close()
+
+    # The garbage collector of the worker processes would otherwise write to every page holding the caches
+    gc.freeze()
+    logging.info(f"Reference caches preloaded in {time.monotonic() - started:.1f}s")
+    caches_warm.set()
+
+
+def warm_up():
+    """
+    Worker process start hook, which starts the reference watcher and the metrics flusher. Caches preloaded before
+    the fork are inherited; otherwise the process warms its own and is reported ready once they are warm. When
+    warming up fails the caches are filled lazily and the process stays unready.
+    """
+    start_reference_watcher()
+    metrics.start_flusher()
+    if not CACHE_WARMUP or caches_warm.is_set():
+        return
+
+    started = time.monotonic()
+    try:
+        load_caches()
+    except Exception:
+        logging.exception("Reference cache warm up failed")
+        return
+
+    logging.info(f"Reference caches warmed up in {time.monotonic() - started:.1f}s")
+    caches_warm.set()
+
+
+def is_ready() -> bool:
+    return not CACHE_WARMUP or caches_warm.is_set()
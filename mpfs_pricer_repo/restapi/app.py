@@ -1,14 +1,15 @@
 import json
 import os
-from pybrake.flask import init_app
-from flask import Flask, request, url_for, jsonify, Response
-from worker.tasks import price_claim_data
+from flask import Flask, request, url_for, Response
+from mpfs_pricer import claim_schema, metrics, warmup
 
 app = Flask(__name__)
 
 airbrake_project_id = os.environ.get('AIRBRAKE_PROJECT_ID', '')
 airbrake_project_key = os.environ.get('AIRBRAKE_PROJECT_KEY', '')
 if airbrake_project_id != '' and airbrake_project_key != '':
+    from pybrake.flask import init_app
+
     app.config["PYBRAKE"] = dict(
         project_id=airbrake_project_id,
         project_key=airbrake_project_key,
@@ -17,27 +18,43 @@ if airbrake_project_id != '' and airbrake_project_key != '':
     app = init_app(app)
 
 
+def get_price_claim_data():
+    # The Celery client and the pricer are imported by the first request, or by the uWSGI master (see wsgi.py)
+    from worker.tasks import price_claim_data
+
+    return price_claim_data
+
+
+def json_response(body, status: int = 200, headers: dict = None) -> Response:
+    return Response(claim_schema.dumps(body), status=status, headers=headers, mimetype="application/json")
+
+
 @app.route('/price_claim/', methods=['POST'])
 def price_claim():
-    data = request.json
-    if data is None:
+    payload = request.get_data(cache=False) if request.is_json else b""
+    if not payload:
         return Response(
             "No claims submitted. Please submit the claims to price as an application/json payload. ",
             status=400,
         )
+    try:
+        claims = claim_schema.decode_claims(payload)
+    except ValueError as e:
+        return Response(f"Invalid claims: {e}", status=400)
 
+    price_claim_data = get_price_claim_data()
     immediately = json.loads(request.args.get('immediately', 'false'))
     if immediately:
-        return jsonify({"result": price_claim_data(data)}), 200
-    task = price_claim_data.delay(data)
-    return jsonify({
+        return json_response({"result": price_claim_data(claims)})
+    task = price_claim_data.delay(claim_schema.to_compact(claims))
+    return json_response({
         "result_url": url_for('price_claim_result', task_id=task.id),
-    }), 202, {'Location': url_for('price_claim_result', task_id=task.id)}
+    }, 202, {'Location': url_for('price_claim_result', task_id=task.id)})
 
 
 @app.route('/price_claim/<task_id>', methods=['GET'])
 def price_claim_result(task_id):
-    task = price_claim_data.AsyncResult(task_id)
+    task = get_price_claim_data().AsyncResult(task_id)
     if task.state == 'PENDING':
         response = {
             'state': task.state,
@@ -57,7 +74,22 @@ def price_claim_result(task_id):
             'pricing': None,
             'error_message': str(task.info),
         }
-    return jsonify(response)
+    return json_response(response)
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    if not warmup.is_ready():
+        return json_response({'ready': False}, 503)
+    return json_response({'ready': True})
+
+
+@app.route('/metrics', methods=['GET'])
+def pricing_metrics():
+    if not metrics.METRICS_ENABLED:
+        return Response("Metrics are disabled, set METRICS_ENABLED=true to enable them.", status=404)
+    output, content_type = metrics.generate_metrics()
+    return Response(output, status=200, content_type=content_type)
 
 
 if __name__ == '__main__':
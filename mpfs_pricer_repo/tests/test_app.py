@@ -0,0 +1,75 @@
+import json
+import unittest
+from unittest import mock
+from mpfs_pricer import claim_schema
+from test_claim_schema import claim
+
+try:
+    from restapi import app
+except ImportError:
+    # Flask isn't installed (or doesn't match the installed Werkzeug)
+    app = None
+
+
+class FakeTask:
+    id = 'task-1'
+
+
+@unittest.skipIf(app is None, "Flask isn't available")
+class PriceClaimTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        self.price_claim_data = mock.Mock(return_value=[{'claim_number': 'A', 'total_claim_payment': 1.0}])
+        self.price_claim_data.delay.return_value = FakeTask()
+        patcher = mock.patch.object(app, 'get_price_claim_data', return_value=self.price_claim_data)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, payload, content_type='application/json', query=''):
+        return self.client.post(f'/price_claim/{query}', data=payload, content_type=content_type)
+
+    def test_missing_claims(self):
+        for payload, content_type in [(b'', 'application/json'), (json.dumps([claim()]), 'text/plain')]:
+            with self.subTest(content_type=content_type):
+                response = self.post(payload, content_type)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(b'No claims submitted', response.data)
+        self.price_claim_data.delay.assert_not_called()
+
+    def test_invalid_claims(self):
+        for payload, error in [
+            (b'[{"claim_number": ', b'Invalid claims: Invalid JSON'),
+            (json.dumps([claim(npi=None)]), b'Invalid claims: claims[0].npi: expected a string, got None'),
+        ]:
+            with self.subTest(error=error):
+                response = self.post(payload)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(response.data.startswith(error), response.data)
+        self.price_claim_data.assert_not_called()
+        self.price_claim_data.delay.assert_not_called()
+
+    def test_claims_are_sent_in_the_compact_form(self):
+        response = self.post(json.dumps([claim()]))
+
+        self.assertEqual(response.status_code, 202)
+        # Older Werkzeug versions make the location absolute
+        self.assertTrue(response.headers['Location'].endswith('/price_claim/task-1'))
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(json.loads(response.data), {'result_url': '/price_claim/task-1'})
+        claims = self.price_claim_data.delay.call_args[0][0]
+        self.assertEqual(claims, claim_schema.to_compact(claim_schema.decode_claims(json.dumps([claim()]))))
+
+    def test_claims_priced_immediately(self):
+        response = self.post(json.dumps([claim()]), query='?immediately=true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {'result': [{'claim_number': 'A', 'total_claim_payment': 1.0}]})
+        claims = self.price_claim_data.call_args[0][0]
+        self.assertIs(type(claims[0]), claim_schema.ValidatedClaim)
+        self.assertEqual(claims[0]['line_items'][0]['charges'], 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
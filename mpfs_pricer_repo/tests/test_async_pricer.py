@@ -0,0 +1,249 @@
+import asyncio
+import threading
+import unittest
+from contextlib import nullcontext
+from datetime import date
+from types import SimpleNamespace
+from unittest import mock
+from mpfs_pricer import anes, anes_snapshot, async_database, async_pricer, database, file_reference, gpci, \
+    gpci_snapshot, lookup_cache, ncci, ncci_index, nppes, nppes_cache, prefetch, pricer, rvu, rvu_snapshot
+from test_prefetch import line_item
+from test_rvu_snapshot import FakeDb, rvu_row
+
+
+def database_snapshots(rvu_quarters=0, providers=0):
+    return prefetch.DatabaseSnapshots(
+        rvu_snapshot.RvuSnapshot(rvu_quarters), gpci_snapshot.GpciSnapshot(0), anes_snapshot.AnesSnapshot(0),
+        ncci_index.NcciIndex(0), nppes_cache.ProviderCache(providers),
+    )
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, statement, *params):
+        self.pool.statements.append((statement, params))
+        self.pool.in_flight += 1
+        self.pool.max_in_flight = max(self.pool.max_in_flight, self.pool.in_flight)
+        await asyncio.sleep(0)
+        self.pool.in_flight -= 1
+        # Key k has the row (k * 10) unless k is 2
+        return [(index, int(key) * 10) for index, key in enumerate(params[0]) if key != '2']
+
+    async def prepare(self, statement):
+        self.pool.prepared.append(statement)
+        return mock.Mock(**{'get_parameters.return_value': [SimpleNamespace(name='int4', schema='pg_catalog')]})
+
+
+class FakeAcquire:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        return FakeConnection(self.pool)
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.statements = []
+        self.prepared = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+
+class FetchLookupAsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lookup = database.Lookup(
+            "lookup", "SELECT x FROM t WHERE k = %s", lambda key: [key], lambda rows: rows[0][0] if rows else None
+        )
+        patcher = mock.patch.dict(database.lookup_param_types, {"lookup": ["int4"]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetch_lookup_async(self):
+        pool = FakePool()
+
+        result = asyncio.run(async_database.fetch_lookup_async(pool, self.lookup, [1, 2, 3, 2]))
+
+        self.assertEqual(result, {1: 10, 2: None, 3: 30})
+        self.assertEqual(pool.statements, [(
+            "SELECT k.key_index - 1, q.* FROM unnest($1::text[]::int4[]) WITH ORDINALITY AS k(p0, key_index) "
+            "CROSS JOIN LATERAL (SELECT x FROM t WHERE k = k.p0 LIMIT 1) AS q",
+            (['1', '2', '3'],),
+        )])
+
+    def test_param_types_are_described_once(self):
+        pool = FakePool()
+        del database.lookup_param_types["lookup"]
+
+        for _ in range(2):
+            param_types = asyncio.run(async_database.get_param_types_async(pool, self.lookup))
+
+        self.assertEqual(param_types, ["pg_catalog.int4"])
+        self.assertEqual(pool.prepared, ["SELECT x FROM t WHERE k = $1"])
+
+    def test_batches_run_concurrently(self):
+        pool = FakePool()
+
+        with mock.patch.object(database, "LOOKUP_BATCH_SIZE", 2):
+            result = asyncio.run(async_database.fetch_lookup_async(pool, self.lookup, [1, 2, 3, 4, 5]))
+
+        self.assertEqual(result, {1: 10, 2: None, 3: 30, 4: 40, 5: 50})
+        self.assertEqual(len(pool.statements), 3)
+        self.assertEqual(pool.max_in_flight, 3)
+
+    def test_only_keys_missing_from_the_cache_are_queried(self):
+        pool = FakePool()
+        self.lookup.cache = lookup_cache.LookupCache("lookup", 0, max_size=10)
+
+        self.assertEqual(asyncio.run(async_database.fetch_lookup_async(pool, self.lookup, [1, 2], "v1")),
+                         {1: 10, 2: None})
+        self.assertEqual(asyncio.run(async_database.fetch_lookup_async(pool, self.lookup, [2, 1, 3], "v1")),
+                         {1: 10, 2: None, 3: 30})
+        self.assertEqual([params for _, params in pool.statements], [(['1', '2'],), (['3'],)])
+
+    def test_redis_cache_is_called_off_the_event_loop(self):
+        threads = []
+
+        def get(keys, from_rows, version):
+            threads.append(threading.get_ident())
+            return {}, keys
+
+        def add(keys, rows, from_rows, version):
+            threads.append(threading.get_ident())
+            return self.lookup.to_results(keys, rows)
+
+        self.lookup.cache = mock.Mock(enabled=True, redis_enabled=True, get=get, add=add)
+
+        self.assertEqual(asyncio.run(async_database.fetch_lookup_async(FakePool(), self.lookup, [1], "v1")), {1: 10})
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class PriceClaimAsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rvus = {'cpt': '57112', 'mod': '80', 'work_rvu': 1.0, 'fac_pe_rvu': 0.5, 'nonfac_pe_rvu': 0.7,
+                     'mp_rvu': 0.1, 'conv_factor': 36.0896, 'asst_surg': 9, 'co_surg': 9, 'team_surg': 9,
+                     'multi_proc': 0, 'bilat_surg': 0, 'pre_op': 0.1, 'intra_op': 0.8, 'post_op': 0.1,
+                     'glob_days': '090', 'endo_base': None}
+        self.gpci_info = {'locality_name': 'ALASKA', 'pw_gpci': 1.5, 'pe_gpci': 1.081, 'mp_gpci': 0.592}
+        self.lookups = {
+            nppes.PROVIDERS_LOOKUP: lambda npis: {npi: ('99501', '207XS0117X') for npi in npis},
+            gpci.GPCI_LOOKUP: lambda keys: {key: self.gpci_info for key in keys},
+            rvu.RVU_LOOKUP: lambda keys: {key: self.rvus if key[1] == '80' else None for key in keys},
+            anes.BASE_UNIT_LOOKUP: lambda keys: {key: None for key in keys},
+            anes.CONVERSION_FACTOR_LOOKUP: lambda keys: {key: 30.99 for key in keys},
+            ncci.NCCI_LOOKUP: lambda keys: {key: [] for key in keys},
+        }
+        self.in_flight = []
+        self.max_in_flight = 0
+        self.fetched = {}
+        self.use_snapshots(database_snapshots())
+
+    def use_snapshots(self, snapshots):
+        swappable_reference = mock.Mock()
+        swappable_reference.acquire.side_effect = lambda: nullcontext(snapshots)
+        for target, name, value in [(async_pricer, "swappable_reference", swappable_reference),
+                                    (file_reference, "REFERENCE_BACKEND", file_reference.DATABASE_BACKEND)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def fetch_lookup_async(self, pool, lookup, keys, version=None):
+        self.fetched.setdefault(lookup, []).extend(keys)
+        self.in_flight.append(lookup)
+        self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+        await asyncio.sleep(0)
+        self.in_flight.remove(lookup)
+        return self.lookups[lookup](list(keys))
+
+    def test_lookups_run_concurrently(self):
+        claims_line_items = [[line_item(mod1='80'), line_item(code='64451', mod2='80')]]
+
+        with mock.patch.object(async_pricer, "fetch_lookup_async", self.fetch_lookup_async):
+            reference = asyncio.run(async_pricer.prefetch_claims_reference_async(FakePool(), claims_line_items))
+
+        self.assertEqual(self.max_in_flight, 4)
+        self.assertEqual(reference.gpci, {('02102', '01', '09/01/2020'): self.gpci_info})
+        self.assertEqual(reference.anes_conversion_factors, {('02102', '01', '09/01/2020'): 30.99})
+        self.assertEqual(reference.get_rvus('64451', ['', '80', '', ''], '09/01/2020'), self.rvus)
+
+    def test_keys_are_resolved_from_the_generation_first(self):
+        snapshots = database_snapshots(rvu_quarters=1, providers=10)
+        db = FakeDb([rvu_row('57112', '80', 1.0, date(2020, 1, 1), date(2020, 12, 31))])
+        snapshots.rvus.get_quarter(db, (2020, 3))
+        snapshots.providers.add({'1659327898': ('99501', '207XS0117X')})
+        self.use_snapshots(snapshots)
+        claims_line_items = [[line_item(mod1='80'), line_item(service_date='12/31/2020', rendering_provider_npi='1073640454')]]
+
+        with mock.patch.object(async_pricer, "fetch_lookup_async", self.fetch_lookup_async):
+            reference = asyncio.run(async_pricer.prefetch_claims_reference_async(FakePool(), claims_line_items))
+
+        self.assertEqual(reference.get_rvus('57112', ['80'], '09/01/2020')['work_rvu'], 1.0)
+        self.assertEqual(self.fetched[nppes.PROVIDERS_LOOKUP], ['1073640454'])
+        # The fourth quarter isn't loaded, its keys are queried
+        self.assertEqual({key[2] for key in self.fetched[rvu.RVU_LOOKUP]}, {'12/31/2020'})
+        self.assertIn('1073640454', snapshots.providers.providers)
+
+    def test_local_reference_data_is_read_from_memory(self):
+        with mock.patch.object(file_reference, "REFERENCE_BACKEND", file_reference.FILES_BACKEND), \
+                mock.patch.object(async_pricer, "prefetch_claims_reference", return_value="reference") as prefetch_local, \
+                mock.patch.object(async_pricer, "fetch_lookup_async") as fetch_lookup_async:
+            reference = asyncio.run(async_pricer.prefetch_claims_reference_async(None, [[line_item()]]))
+
+        self.assertEqual(reference, "reference")
+        prefetch_local.assert_called_once()
+        fetch_lookup_async.assert_not_called()
+
+    def test_first_generation_is_created_off_the_event_loop(self):
+        threads = []
+        swappable_reference = async_pricer.swappable_reference
+        swappable_reference.generation = None
+        swappable_reference.get_generation.side_effect = lambda: threads.append(threading.get_ident())
+
+        with mock.patch.object(async_pricer, "fetch_lookup_async", self.fetch_lookup_async):
+            asyncio.run(async_pricer.prefetch_claims_reference_async(FakePool(), [[line_item(mod1='80')]]))
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+        swappable_reference.acquire.assert_called_once_with()
+
+    def test_lookups_version_unavailable(self):
+        cache = lookup_cache.LookupCache("rvu", 0, max_size=10)
+        with mock.patch.object(rvu.RVU_LOOKUP, "cache", cache), \
+                mock.patch.object(async_pricer, "get_reference_version", side_effect=OSError("connection refused")), \
+                self.assertLogs(level="WARNING"):
+            self.assertIsNone(asyncio.run(async_pricer.get_lookups_version()))
+
+    def test_same_result_as_price_claims(self):
+        claim = {'claim_number': 'A', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+                 'line_items': [line_item(mod1='80'), line_item(code='64451', mod2='80')]}
+
+        with mock.patch.object(async_pricer, "fetch_lookup_async", self.fetch_lookup_async):
+            result = asyncio.run(async_pricer.price_claim_async(claim, FakePool()))
+
+        patches = [
+            mock.patch.object(prefetch, name, lambda db, keys, snapshot=None, lookup=lookup: self.lookups[lookup](list(keys)))
+            for name, lookup in [
+                ("find_providers_by_npis", nppes.PROVIDERS_LOOKUP), ("get_gpci_many", gpci.GPCI_LOOKUP),
+                ("get_rvus_many", rvu.RVU_LOOKUP), ("get_base_units", anes.BASE_UNIT_LOOKUP),
+                ("get_conversion_factors", anes.CONVERSION_FACTOR_LOOKUP), ("get_ncci_many", ncci.NCCI_LOOKUP),
+            ]
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.assertEqual(result, pricer.price_claim(claim, reference_database_connection=object()))
+        self.assertGreater(result['total_claim_payment'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
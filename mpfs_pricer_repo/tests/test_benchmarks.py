@@ -0,0 +1,50 @@
+import unittest
+from benchmarks import run
+from benchmarks.claims import make_claims
+from benchmarks.reference_store import FakeReferenceStore
+from mpfs_pricer import pricer
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    def test_synthetic_claims_are_priced_from_the_store(self):
+        with FakeReferenceStore().installed() as store:
+            for shape, claim in make_claims():
+                with self.subTest(shape=shape):
+                    priced_claim = pricer.price_claim(claim, run.FAKE_DB)
+                    self.assertEqual(len(priced_claim['line_items']), len(claim['line_items']))
+                    self.assertGreater(priced_claim['total_claim_payment'], 0)
+        self.assertEqual(store.calls, 6 * len(make_claims()))
+
+    def test_claims_are_reproducible(self):
+        self.assertEqual(make_claims(), make_claims())
+
+    def test_run(self):
+        results = run.run('/imaging-1', iterations=2)
+
+        self.assertEqual(sorted(name for name in results if name.endswith('/imaging-1')), [
+            'anesthesia_pricing/imaging-1', 'bilateral_surgery/imaging-1', 'claim_adjustments/imaging-1',
+            'decode_claims/imaging-1', 'encode_response/imaging-1', 'line_adjustments/imaging-1',
+            'multiple_procedures/imaging-1', 'price_claim/imaging-1', 'price_claim_get/imaging-1',
+        ])
+        self.assertTrue(all('/imaging-1' in name for name in results))
+        result = results['price_claim/imaging-1']
+        self.assertEqual(result['iterations'], 2)
+        self.assertLessEqual(result['p50_us'], result['p99_us'])
+        self.assertGreater(result['peak_kib'], 0)
+
+    def test_find_regressions(self):
+        baseline = {'a': {'p50_us': 100.0, 'peak_kib': 10.0}, 'b': {'p50_us': 100.0, 'peak_kib': 10.0}}
+        results = {
+            'a': {'p50_us': 120.0, 'peak_kib': 20.0},
+            'b': {'p50_us': 130.0, 'peak_kib': 10.0},
+            'c': {'p50_us': 1000.0, 'peak_kib': 10.0},
+        }
+
+        self.assertEqual(run.find_regressions(results, baseline, 0.25), {
+            'a': 'peak_kib 10.0 -> 20.0',
+            'b': 'p50_us 100.0 -> 130.0',
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+from mpfs_pricer import binary_snapshot, file_reference, pricer, reference_swap
+from test_file_reference import write_reference_files
+from test_prefetch import line_item
+
+
+class BinarySnapshotTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.files_directory = tempfile.TemporaryDirectory()
+        cls.directory = tempfile.TemporaryDirectory()
+        write_reference_files(cls.files_directory.name)
+        for quarter in [(2020, 3), (2021, 3)]:
+            binary_snapshot.write_files_snapshot(
+                cls.files_directory.name, quarter,
+                Path(cls.directory.name) / binary_snapshot.get_snapshot_file_name(quarter),
+            )
+        cls.files = file_reference.FileReference(cls.files_directory.name)
+        cls.reference = binary_snapshot.SnapshotReference(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.reference.close()
+        cls.files_directory.cleanup()
+        cls.directory.cleanup()
+
+    def test_lookups_match_the_reference_files(self):
+        lookups = [
+            ("find_providers_by_npis", ["1659327898", "1", "", "abc"]),
+            ("get_gpci_many", [("02102", "01", "09/01/2020"), ("2102", "1", "09/01/2021"), ("02102", "02", "09/01/2020")]),
+            ("get_rvus_many", [("57112", "", "09/01/2020"), ("57112", "80", "09/01/2020"), ("57112", "51", "09/01/2020"),
+                               ("00100", "", "09/01/2021")]),
+            ("get_base_units", [("00100", "09/01/2020"), ("00100", "09/01/2021")]),
+            ("get_conversion_factors", [("02102", "01", "09/01/2020"), ("02102", "01", "09/01/2021")]),
+            ("get_ncci_many", [("57112", "64451", date(2020, 9, 1)), ("64451", "57112", date(2020, 9, 1))]),
+            ("find_regions_by_zips", ["99501", "99501-1234", "00000", "abc"]),
+        ]
+        for name, keys in lookups:
+            with self.subTest(name):
+                self.assertEqual(getattr(self.reference, name)(keys), getattr(self.files, name)(keys))
+
+    def test_quarters(self):
+        # Lookups are served by the snapshot of their quarter, quarters without a snapshot have no data
+        self.assertEqual(self.reference.get_gpci_many([("02102", "01", "09/01/2021")])[("02102", "01", "09/01/2021")]
+                         ["pe_gpci"], 1.1)
+        self.assertEqual(self.reference.get_rvus_many([("57112", "", "03/01/2020")]), {("57112", "", "03/01/2020"): None})
+        self.assertEqual(self.reference.get_ncci_many([("57112", "64451", date(2020, 3, 1))]),
+                         {("57112", "64451", date(2020, 3, 1)): []})
+
+        # Rows outside of the quarter aren't part of its snapshot
+        snapshot = self.reference.get_snapshot((2020, 3))
+        self.assertEqual(snapshot.quarter, (2020, 3))
+        self.assertIsNone(snapshot.find_string_id("2021-01-01"))
+        self.assertIsNone(snapshot.find_gpci("02102", "01", date(2021, 9, 1)))
+
+    def test_price_claim(self):
+        claim = {'claim_number': 'A', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+                 'line_items': [line_item(), line_item(code='00100')]}
+
+        self.assertEqual(pricer.priced_claim_to_dict(pricer.price_claim(claim, self.reference)),
+                         pricer.priced_claim_to_dict(pricer.price_claim(claim, self.files)))
+
+    def test_backend(self):
+        self.addCleanup(reference_swap.swappable_reference.reset)
+        with mock.patch.object(file_reference, "REFERENCE_BACKEND", file_reference.SNAPSHOT_BACKEND), \
+                mock.patch.object(binary_snapshot, "get_snapshot_reference", return_value=self.reference):
+            reference = pricer.prefetch_default_reference([[line_item()]])
+
+        self.assertEqual(reference.get_provider("1659327898"), ("99501", "207XS0117X"))
+        self.assertEqual(reference.get_region("99501")["locality"], "01")
+
+    def test_invalid_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / binary_snapshot.get_snapshot_file_name((2020, 3))
+            path.write_bytes(b"\0" * 64)
+            with self.assertRaisesRegex(ValueError, "isn't a reference snapshot"):
+                binary_snapshot.BinarySnapshot(path)
+
+            path.unlink()
+            with self.assertRaisesRegex(ValueError, "No reference snapshot found"):
+                binary_snapshot.SnapshotReference(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
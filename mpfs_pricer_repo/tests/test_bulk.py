@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from mpfs_pricer import bulk
+from test_line_item import priced_line_item
+
+CSV_HEADER = "claim_number,npi,service_from,service_to,service_date,place_of_service,code,mod1,mod2,mod3,mod4," \
+             "charges,quantity,rendering_provider_npi\n"
+
+
+def csv_row(claim_number, code):
+    return f"{claim_number},1,09/01/2020,09/01/2020,09/01/2020,11,{code},,,,,100.0,1,1659327898\n"
+
+
+def price_claims(claims):
+    if any(claim['claim_number'] == 'BAD' for claim in claims):
+        raise ValueError("Couldn't find zip code for NPI 1659327898")
+    return [{
+        'claim_number': claim['claim_number'], 'npi': claim['npi'], 'service_from': claim['service_from'],
+        'service_to': claim['service_to'], 'total_claim_charges': 100.0 * len(claim['line_items']),
+        'total_claim_payment': 50.0 * len(claim['line_items']),
+        'line_items': [priced_line_item(code=line_item['code'], comments=['a', 'b'])
+                       for line_item in claim['line_items']],
+    } for claim in claims]
+
+
+class BulkTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(bulk.pricer, 'price_claims', side_effect=price_claims)
+        self.price_claims = patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def path(self, name, content=None):
+        path = os.path.join(self.directory, name)
+        if content is not None:
+            with open(path, 'w') as f:
+                f.write(content)
+        return path
+
+    def read_output(self, path):
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_csv_rows_are_grouped_into_claims(self):
+        path = self.path('claims.csv', CSV_HEADER + csv_row('A', '27254') + csv_row('A', '29807') + csv_row('B', '70482'))
+
+        claims = list(bulk.read_csv(path))
+
+        self.assertEqual([claim['claim_number'] for claim in claims], ['A', 'B'])
+        self.assertEqual([line_item['code'] for line_item in claims[0]['line_items']], ['27254', '29807'])
+        self.assertEqual(claims[1]['line_items'][0]['rendering_provider_npi'], '1659327898')
+
+    def test_price_csv_file(self):
+        rows = [csv_row('A', '27254'), csv_row('A', '29807'), csv_row('BAD', '27254'), csv_row('C', '70482')]
+        input_path = self.path('claims.csv', CSV_HEADER + ''.join(rows))
+        output_path = self.path('priced.csv')
+
+        progress = bulk.price_file(input_path, output_path, processes=1, chunk_size=2)
+
+        rows = self.read_output(output_path)
+        self.assertEqual([(row['claim_number'], row['code'], row['error']) for row in rows], [
+            ('A', '27254', ''), ('A', '29807', ''), ('BAD', '', "Couldn't find zip code for NPI 1659327898"),
+            ('C', '70482', ''),
+        ])
+        self.assertEqual(rows[0]['comments'], 'a; b')
+        self.assertEqual(rows[0]['total_claim_payment'], '100.0')
+        self.assertEqual((progress.claims, progress.rows), (3, 4))
+        # The failed chunk is priced again claim by claim
+        self.assertEqual(self.price_claims.call_count, 4)
+
+    def test_price_ndjson_file_with_process_pool(self):
+        claims = [{'claim_number': str(number), 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+                   'line_items': [{'code': str(number)}]} for number in range(20)]
+        input_path = self.path('claims.ndjson', ''.join(json.dumps(claim) + '\n' for claim in claims))
+        output_path = self.path('priced.csv')
+
+        with mock.patch.object(bulk, 'BULK_PENDING_CHUNKS', 1):
+            bulk.price_file(input_path, output_path, processes=2, chunk_size=3)
+
+        self.assertEqual([row['code'] for row in self.read_output(output_path)], [str(number) for number in range(20)])
+
+    def test_unknown_formats(self):
+        with self.assertRaises(ValueError):
+            bulk.price_file(self.path('claims.xlsx'), self.path('priced.csv'))
+        with self.assertRaises(ValueError):
+            bulk.price_file(self.path('claims.csv', CSV_HEADER), self.path('priced.ndjson'))
+
+
+if __name__ == '__main__':
+    unittest.main()
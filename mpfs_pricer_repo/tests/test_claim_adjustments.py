@@ -0,0 +1,73 @@
+import random
+import unittest
+from mpfs_pricer import adjustments
+from test_line_item import priced_line_item
+
+
+def random_line_items(rng: random.Random, service_date: str, count: int):
+    line_items = []
+    for _ in range(count):
+        mods = [rng.choice(['', '', 'TC', 'LT', 'RT', 'AD', 'QX']) for _ in range(4)]
+        line_items.append(priced_line_item(
+            code=rng.choice(['27254', '29807', '70482', '00100', '01999']),
+            mod1=mods[0], mod2=mods[1], mod3=mods[2], mod4=mods[3], service_date=service_date,
+            multi_proc=rng.choice([0, 2, 3, 4, 5, 6, 7, 9]), bilat_surg=rng.choice([0, 1]),
+            endo_base=rng.choice(['', '43235', '45378']), quantity=float(rng.randint(1, 3)),
+            anes_base_unit=rng.choice([3, 5, 7]), anes_conversion_factor=22.5,
+            line_item_payment=round(rng.uniform(10.0, 500.0), 2),
+        ))
+    return line_items
+
+
+class ClaimAdjustmentsTestCase(unittest.TestCase):
+    def test_service_dates_are_adjusted_independently(self):
+        rng = random.Random(2020)
+        for _ in range(50):
+            days = [random_line_items(rng, service_date, rng.randint(2, 30))
+                    for service_date in ['20200901', '20200902', '20200903']]
+            claim_line_items = [line_item for day in days for line_item in day]
+            rng.shuffle(claim_line_items)
+            expected = {}
+            for day in days:
+                day_copy = [priced_line_item(**line_item.to_dict()) for line_item in day]
+                adjustments.perform_claim_adjustments(day_copy)
+                expected.update({id(line_item): copy.line_item_payment for line_item, copy in zip(day, day_copy)})
+
+            adjustments.perform_claim_adjustments(claim_line_items)
+
+            self.assertEqual({id(line_item): line_item.line_item_payment for line_item in claim_line_items}, expected)
+
+    def test_multiple_procedures_need_two_line_items(self):
+        line_item = priced_line_item(multi_proc=5, line_item_payment=100.0)
+        adjustments.perform_claim_adjustments([line_item])
+        self.assertEqual(line_item.line_item_payment, 100.0)
+
+        line_items = [priced_line_item(multi_proc=5, line_item_payment=100.0),
+                      priced_line_item(multi_proc=5, line_item_payment=100.0, service_date='09/02/2020')]
+        adjustments.perform_claim_adjustments(line_items)
+        self.assertEqual([line_item.line_item_payment for line_item in line_items], [50.0, 50.0])
+
+    def test_multiple_procedures_2_and_3(self):
+        line_items = [
+            priced_line_item(multi_proc=3, endo_base='43235', line_item_payment=100.0),
+            priced_line_item(multi_proc=3, endo_base='43235', line_item_payment=80.0),
+            priced_line_item(multi_proc=2, line_item_payment=150.0),
+            priced_line_item(multi_proc=2, line_item_payment=60.0),
+        ]
+        adjustments.perform_claim_adjustments(line_items)
+        # Endoscopy family (100 + 40) is ranked second after the 150 procedure
+        self.assertEqual([line_item.line_item_payment for line_item in line_items], [50.0, 20.0, 150.0, 15.0])
+
+    def test_ncci_rows_of_line_item(self):
+        ncci_info = [[], [{'modifier': '0'}]]
+        line_item = priced_line_item()
+        adjustments.ncci_adjustments(line_item, 1, ncci_info)
+        self.assertEqual(line_item.line_item_payment, 0)
+
+        line_item = priced_line_item()
+        adjustments.ncci_adjustments(line_item, 2, ncci_info)
+        self.assertEqual(line_item.line_item_payment, 50.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import tempfile
+import unittest
+from unittest import mock
+from mpfs_pricer import claim_cache, file_reference, pricer, reference_version
+from test_file_reference import write_reference_files
+from test_prefetch import line_item
+
+
+def claim(claim_number, **fields):
+    return {'claim_number': claim_number, 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+            'line_items': [line_item(**fields), line_item(code='00100')]}
+
+
+class ClaimCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        write_reference_files(cls.directory.name)
+        cls.reference = file_reference.FileReference(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.cache = claim_cache.ClaimCache(max_size=10, redis_ttl=0)
+        self.priced_batches = []
+        for target, name, value in [(claim_cache, "claim_cache", self.cache), (pricer, "claim_cache", self.cache),
+                                    (pricer, "price_claims_uncached", self.price_claims_uncached)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        reference_version.reset_reference_version()
+        self.addCleanup(reference_version.reset_reference_version)
+
+    def price_claims_uncached(self, claims, reference_database_connection=None):
+        self.priced_batches.append([claim['claim_number'] for claim in claims])
+        return pricer.price_claims_with_reference(
+            claims, pricer.prefetch_claims_reference(reference_database_connection, [c['line_items'] for c in claims])
+        )
+
+    def test_resubmitted_claims_are_cached(self):
+        priced_claim = pricer.price_claim(claim('A'), self.reference)
+        resubmitted_claim = pricer.price_claim(claim('B'), self.reference)
+
+        self.assertEqual(self.priced_batches, [['A']])
+        self.assertEqual(resubmitted_claim['claim_number'], 'B')
+        self.assertEqual(resubmitted_claim['total_claim_payment'], priced_claim['total_claim_payment'])
+        self.assertEqual([item.to_dict() for item in resubmitted_claim['line_items']],
+                         [item.to_dict() for item in priced_claim['line_items']])
+        self.assertIsNot(resubmitted_claim['line_items'][0], priced_claim['line_items'][0])
+
+    def test_pricing_inputs_are_part_of_the_key(self):
+        pricer.price_claims([claim('A'), claim('B'), claim('C', charges='10.0'), claim('D', mod1='80')], self.reference)
+
+        # Duplicated claims of a batch are priced once
+        self.assertEqual(self.priced_batches, [['A', 'C', 'D']])
+
+    def test_reference_version_invalidates(self):
+        pricer.price_claim(claim('A'), self.reference)
+        with mock.patch.object(reference_version, "REFERENCE_VERSION", "2021Q1"):
+            reference_version.reset_reference_version()
+            pricer.price_claim(claim('B'), self.reference)
+
+        self.assertEqual(self.priced_batches, [['A'], ['B']])
+
+    def test_redis_tier(self):
+        value = claim_cache.encode_priced_claim(pricer.price_claim(claim('A'), self.reference))
+        self.priced_batches.clear()
+        self.cache.clear()
+        self.cache.max_size = 0
+        self.cache.redis_ttl = 60
+        self.cache.redis = mock.Mock()
+        self.cache.redis.mget.return_value = [value, None]
+
+        priced_claims = pricer.price_claims([claim('B'), claim('C', charges='10.0')], self.reference)
+
+        self.assertEqual(self.priced_batches, [['C']])
+        self.assertEqual(priced_claims[0]['claim_number'], 'B')
+        self.assertEqual(self.cache.redis.mget.call_count, 1)
+        pipeline = self.cache.redis.pipeline.return_value
+        self.assertEqual(pipeline.setex.call_args[0][1], 60)
+        pipeline.execute.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import unittest
+from benchmarks import run
+from benchmarks.claims import make_claims
+from benchmarks.reference_store import FakeReferenceStore
+from mpfs_pricer import claim_schema, pricer
+from test_prefetch import line_item
+
+
+def claim(**kwargs):
+    return {'claim_number': 'A', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '2020-09-02',
+            'line_items': [line_item()], **kwargs}
+
+
+class ClaimSchemaTestCase(unittest.TestCase):
+    def test_decode_claims(self):
+        line_items = [line_item(), line_item(charges=25, quantity='2', mod1='80', mod2=None, service_date='2020-09-02')]
+        del line_items[1]['mod4']
+        payload = json.dumps([claim(line_items=line_items, extra='ignored')]).encode()
+
+        claims = claim_schema.decode_claims(payload)
+
+        self.assertEqual(claims, [claim(line_items=[
+            line_item(charges=100.0, quantity=1.0),
+            line_item(charges=25.0, quantity=2.0, mod1='80', mod2='', mod4='', service_date='2020-09-02'),
+        ])])
+        self.assertIs(type(claims[0]), claim_schema.ValidatedClaim)
+        # Validated claims are kept as they are
+        self.assertIs(claim_schema.validate_claims(claims)[0], claims[0])
+
+    def test_invalid_claims(self):
+        cases = [
+            (b'[{"claim_number": ', "Invalid JSON"),
+            (claim(), r"claims: expected a list of claims, got dict"),
+            ([claim(), "A"], r"claims\[1\]: expected an object"),
+            ([{**claim(), 'npi': None}], r"claims\[0\].npi: expected a string, got None"),
+            ([{k: v for k, v in claim().items() if k != 'npi'}], r"claims\[0\].npi: is missing"),
+            ([claim(service_from='yesterday')], r"claims\[0\].service_from: expected a date, got 'yesterday'"),
+            ([claim(line_items=None)], r"claims\[0\].line_items: expected a list of line items"),
+            ([claim(line_items=[line_item(), line_item(service_date='')])],
+             r"claims\[0\].line_items\[1\].service_date: expected a date"),
+            ([claim(line_items=[line_item(code=57112)])], r"line_items\[0\].code: expected a string, got 57112"),
+            ([claim(line_items=[line_item(charges='abc')])], r"line_items\[0\].charges: expected a number, got 'abc'"),
+            ([claim(line_items=[line_item(charges=True)])], r"line_items\[0\].charges: expected a number, got True"),
+            ([claim(line_items=[line_item(quantity='nan')])], r"line_items\[0\].quantity: expected a number"),
+        ]
+        for payload, error in cases:
+            with self.subTest(error):
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload)
+                with self.assertRaisesRegex(ValueError, error):
+                    claim_schema.decode_claims(payload)
+
+    def test_compact_form(self):
+        claims = claim_schema.decode_claims(json.dumps([claim()]))
+        compact = claim_schema.to_compact(claims)
+
+        self.assertEqual(compact, [['A', '1', '09/01/2020', '2020-09-02', [
+            ['09/01/2020', '11', '57112', '', '', '', '', '1659327898', 100.0, 1.0],
+        ]]])
+        self.assertEqual(claim_schema.from_compact(compact), claims)
+        self.assertIs(type(claim_schema.from_compact(compact)[0]), claim_schema.ValidatedClaim)
+        # Claims sent as dicts are priced as they are
+        self.assertEqual(claim_schema.from_compact([claim()]), [claim()])
+
+    def test_decoded_claims_are_priced_like_the_submitted_ones(self):
+        claims = [claim for _, claim in make_claims()]
+        decoded = claim_schema.from_compact(claim_schema.loads(claim_schema.dumps(
+            claim_schema.to_compact(claim_schema.decode_claims(claim_schema.dumps(claims)))
+        )))
+
+        with FakeReferenceStore().installed():
+            for submitted, priced in zip(claims, decoded):
+                self.assertEqual(pricer.priced_claim_to_dict(pricer.price_claim(priced, run.FAKE_DB)),
+                                 pricer.priced_claim_to_dict(pricer.price_claim(submitted, run.FAKE_DB)))
+
+    def test_claims_are_validated_before_pricing(self):
+        with self.assertRaisesRegex(ValueError, r"line_items\[0\].charges: expected a number, got 'abc'"):
+            pricer.price_claims([claim(line_items=[line_item(charges='abc')])], run.FAKE_DB)
+
+
+if __name__ == '__main__':
+    unittest.main()
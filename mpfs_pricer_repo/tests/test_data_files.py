@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from mpfs_pricer import data_files
+
+
+def zplc_row(zip_code: str, carrier: str, locality: str) -> str:
+    return f"XX{zip_code}{carrier}{locality}".ljust(79) + "\n"
+
+
+class ZplcIndexTestCase(unittest.TestCase):
+    def test_find_region_by_zip_matches_file_scan(self):
+        with open(data_files.get_zplc_data_file()) as f:
+            rows = f.readlines()
+
+        expected = {}
+        for row in rows:
+            expected.setdefault(row[2:7], {"zip": row[2:7], "carrier": row[7:12], "locality": row[12:14]})
+
+        for zip_code, region in expected.items():
+            self.assertEqual(data_files.find_region_by_zip(zip_code), region)
+
+    def test_find_region_by_zip_plus_four(self):
+        region = data_files.find_region_by_zip("99501-1234")
+        self.assertEqual(region, {"zip": "99501", "carrier": "02102", "locality": "01"})
+
+    def test_find_region_by_zip_not_found(self):
+        self.assertIsNone(data_files.find_region_by_zip(None))
+        self.assertIsNone(data_files.find_region_by_zip("00000"))
+        self.assertIsNone(data_files.find_region_by_zip("9950"))
+        self.assertIsNone(data_files.find_region_by_zip("ABCDE"))
+
+    def test_find_region_by_zip_invalid(self):
+        with self.assertRaises(ValueError):
+            data_files.find_region_by_zip(99501)
+
+    def test_index_reloads_when_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "ZIP5.txt"
+            path.write_text(zplc_row("12345", "11111", "01") + zplc_row("12345", "22222", "02"))
+
+            with mock.patch.object(data_files, "get_zplc_data_file", return_value=path), \
+                    mock.patch.object(data_files, "ZPLC_RELOAD_CHECK_INTERVAL", 0.0), \
+                    mock.patch.object(data_files, "_zplc_index", None):
+                self.assertEqual(data_files.find_region_by_zip("12345")["carrier"], "11111")
+
+                path.write_text(zplc_row("12345", "33333", "03") + zplc_row("54321", "44444", "04"))
+                stat = path.stat()
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+                self.assertEqual(data_files.find_region_by_zip("12345")["carrier"], "33333")
+                self.assertEqual(data_files.find_region_by_zip("54321")["locality"], "04")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+from unittest import mock
+import psycopg2
+import psycopg2.pool
+from mpfs_pricer import database
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params=None):
+        if self.connection.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.connection.statements.append(statement)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.dead = False
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.dead:
+            raise psycopg2.InterfaceError("connection already closed")
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(database, "get_db", side_effect=lambda db_config: FakeConnection())
+        self.get_db = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = database.ConnectionPool({}, min_size=1, max_size=2, timeout=0.01, max_idle=300,
+                                            health_check_after=30)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(self.get_db.call_count, 1)
+
+    def test_max_size(self):
+        with self.pool.connection(), self.pool.connection():
+            with self.assertRaises(psycopg2.pool.PoolError):
+                self.pool.getconn()
+        self.assertEqual(self.pool.size, 2)
+
+    def test_open_fills_min_size(self):
+        self.pool.open()
+        self.assertEqual(self.pool.size, 1)
+        self.assertEqual(len(self.pool.idle), 1)
+
+    def test_closed_connection_is_replaced(self):
+        with self.pool.connection() as first:
+            first.close()
+        with self.pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_health_check_after_idle(self):
+        self.pool.health_check_after = 0
+        with self.pool.connection() as first:
+            pass
+        first.dead = True
+
+        with self.pool.connection() as second:
+            self.assertEqual(second.statements, [])
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first.closed, 1)
+
+    def test_health_check_does_not_hold_the_pool(self):
+        self.pool.health_check_after = 0
+        with self.pool.connection() as first:
+            pass
+        pool_was_free = []
+
+        def execute(statement, params=None):
+            # Another thread can return a connection while the idle one is being pinged
+            pool_was_free.append(self.pool.condition.acquire(blocking=False))
+            self.pool.condition.release()
+
+        with mock.patch.object(FakeCursor, "execute", side_effect=execute):
+            with self.pool.connection() as second:
+                pass
+
+        self.assertIs(first, second)
+        self.assertEqual(pool_was_free, [True])
+
+    def test_idle_connections_are_recycled_down_to_min_size(self):
+        with self.pool.connection() as first, self.pool.connection() as second:
+            pass
+        self.assertEqual(self.pool.size, 2)
+
+        self.pool.max_idle = 0
+        with self.pool.connection():
+            pass
+
+        self.assertEqual(self.pool.size, 1)
+        self.assertEqual(first.closed + second.closed, 1)
+
+    def test_fork_does_not_reuse_parent_connections(self):
+        with self.pool.connection() as parent_connection:
+            pass
+
+        with mock.patch.object(database.os, "getpid", return_value=self.pool.pid + 1):
+            with self.pool.connection() as child_connection:
+                pass
+
+        self.assertIsNot(parent_connection, child_connection)
+        self.assertEqual(parent_connection.closed, 0)
+        self.assertIn(parent_connection, database.inherited_connections)
+
+
+if __name__ == '__main__':
+    unittest.main()
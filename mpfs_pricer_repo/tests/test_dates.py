@@ -1,4 +1,5 @@
 import unittest
+import dateutil.parser
 from mpfs_pricer import utils
 
 
@@ -40,6 +41,27 @@ class DatesTestCase(unittest.TestCase):
         quarter = utils.get_quarter('2/10/2021')
         self.assertEqual(quarter, '2021_Q1')
 
+    def test_fit_date(self):
+        self.assertEqual(utils.fit_date('9/1/2020'), '20200901')
+        self.assertEqual(utils.fit_date('09/01/2020'), '20200901')
+        self.assertEqual(utils.fit_date('2020-09-01'), '20200901')
+        self.assertEqual(utils.fit_date('Sep 1 2020'), '20200901')
+        with self.assertRaises(ValueError):
+            utils.fit_date(None)
+
+    def test_parse_date_matches_dateutil(self):
+        for val in ['1/1/2020', '12/31/2019', '13/1/2020', '2020-09-01', '20200901', '2020/09/01', ' 1/1/2020',
+                    '1/1/20', '2/29/2020']:
+            with self.subTest(val=val):
+                self.assertEqual(utils.parse_date(val), dateutil.parser.parse(val).date())
+
+        for val in ['2/30/2020', '0/1/2020', '2020-0901']:
+            with self.subTest(val=val):
+                with self.assertRaises(ValueError):
+                    dateutil.parser.parse(val)
+                with self.assertRaises(ValueError):
+                    utils.parse_date(val)
+
 
 if __name__ == '__main__':
     unittest.main()
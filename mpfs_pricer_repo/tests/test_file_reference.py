@@ -0,0 +1,134 @@
+import csv
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+import psycopg2
+from mpfs_pricer import file_reference, pricer, rvu
+from test_prefetch import line_item
+
+RVU_NAMES = [name.strip().strip('"') for name in rvu.RVU_COLUMNS.split(",")]
+
+
+def rvu_row(hcpcs, mod, start, end, **values):
+    row = {name: "" for name in RVU_NAMES}
+    row.update({"hcpcs": hcpcs, "MOD": mod, "WORK RVU": "1.0", "NON-FAC PE RVU": "0.7", "FACILITY PE RVU": "0.5",
+                "MP RVU": "0.1", "CONV FACTOR": "36.0896", "PRE OP": "0.1", "INTRA OP": "0.8", "POST OP": "0.1",
+                "MULT PROC": "0", "BILAT SURG": "0", "ASST SURG": "9", "CO-SURG": "9", "TEAM SURG": "9",
+                "GLOB DAYS": "090", **values})
+    return [row[name] for name in RVU_NAMES] + [start, end]
+
+
+def write_csv(directory, name, header, rows):
+    with open(os.path.join(directory, name), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_reference_files(directory):
+    write_csv(directory, file_reference.PROVIDERS_FILE, ["npi", "zip", "taxonomy"], [
+        ["1659327898", "99501", "207XS0117X"],
+    ])
+    write_csv(directory, file_reference.GPCI_FILE, ["carrier", "locality", "name", "pw", "pe", "mp", "start", "end"], [
+        ["02102", "01", "ALASKA", "1.5", "1.081", "0.592", "2020-01-01", "2020-12-31"],
+        ["02102", "01", "ALASKA", "1.5", "1.1", "0.6", "2021-01-01", "2021-12-31"],
+    ])
+    write_csv(directory, file_reference.RVU_FILE, RVU_NAMES + ["eff_start_dt", "eff_end_dt"], [
+        rvu_row("57112", "", "2020-01-01", "2020-12-31"),
+        rvu_row("57112", "80", "2020-01-01", "2020-12-31", **{"WORK RVU": "0.16"}),
+        rvu_row("00100", "", "2020-01-01", "2020-12-31"),
+    ])
+    write_csv(directory, file_reference.BASE_UNITS_FILE, ["code", "base_unit", "start", "end"], [
+        ["00100", "5", "2020-01-01", "2020-12-31"],
+    ])
+    write_csv(directory, file_reference.NCCI_FILE, ["col1", "col2", "effective_date", "deletion_date", "modifier"], [
+        ["57112", "64451", "2020-07-01", "", "1"],
+        ["57112", "64451", "2019-01-01", "2020-06-30", "0"],
+    ])
+
+
+class FileReferenceTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        write_reference_files(cls.directory.name)
+        cls.reference = file_reference.FileReference(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_lookups(self):
+        self.assertEqual(self.reference.find_providers_by_npis(["1659327898", "1"]), {
+            "1659327898": ("99501", "207XS0117X"), "1": (None, None),
+        })
+        gpci = self.reference.get_gpci_many([("02102", "01", "09/01/2020"), ("02102", "01", "09/01/2019")])
+        self.assertEqual(gpci[("02102", "01", "09/01/2020")]["pe_gpci"], 1.081)
+        self.assertIsNone(gpci[("02102", "01", "09/01/2019")])
+        rvus = self.reference.get_rvus_many([("57112", "", "09/01/2020"), ("57112", "80", "09/01/2020")])
+        self.assertEqual(rvus[("57112", "", "09/01/2020")]["work_rvu"], 1.0)
+        self.assertEqual(rvus[("57112", "80", "09/01/2020")]["work_rvu"], 0.16)
+        self.assertEqual(self.reference.get_base_units([("00100", "09/01/2020")]), {("00100", "09/01/2020"): 5.0})
+
+    def test_provider_index(self):
+        providers = file_reference.ProviderIndex([
+            ("1659327898", "99501", "T1"), ("1003000126", "99501", "T2"), ("X", "10001", "T3"),
+            ("1659327898", "10001", "T1"),
+        ])
+
+        self.assertEqual(len(providers), 3)
+        self.assertEqual(providers.find("1003000126"), ("99501", "T2"))
+        self.assertEqual(providers.find("1659327898"), ("10001", "T1"))
+        self.assertEqual([providers.find(npi) for npi in ["1", "X", "", "9" * 30]], [(None, None)] * 4)
+        self.assertEqual(providers.values, ["99501", "T1", "T2", "10001"])
+
+    def test_bundled_conversion_factors(self):
+        conversion_factors = self.reference.get_conversion_factors([
+            ("02102", "01", "09/01/2019"), ("02102", "01", "09/01/2020"), ("02102", "01", "09/01/2021"),
+            ("02102", "01", "09/01/2018"),
+        ])
+
+        self.assertEqual(list(conversion_factors.values()), [30.99, 30.86, 29.88, None])
+
+    def test_ncci(self):
+        ncci = self.reference.get_ncci_many([("57112", "64451", date(2020, 9, 1)), ("57112", "64451", date(2020, 3, 1))])
+
+        self.assertEqual([row["modifier"] for row in ncci[("57112", "64451", date(2020, 9, 1))]], ["1"])
+        self.assertEqual([row["modifier"] for row in ncci[("57112", "64451", date(2020, 3, 1))]], ["0"])
+
+    def test_price_claim(self):
+        claim = {'claim_number': 'A', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+                 'line_items': [line_item(), line_item(code='00100')]}
+
+        result = pricer.price_claim(claim, self.reference)
+
+        self.assertEqual(result['line_items'][0].wrvu, 1.0)
+        self.assertEqual(result['line_items'][0].pe_gpci, 1.081)
+        self.assertEqual(result['line_items'][1].anes_conversion_factor, 30.86)
+        self.assertGreater(result['total_claim_payment'], 0)
+
+    def test_missing_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaisesRegex(ValueError, "No providers.csv reference file found"):
+                file_reference.FileReference(directory)
+
+    def test_database_fallback(self):
+        claims_line_items = [[line_item()]]
+        pool = mock.Mock()
+        pool.connection.side_effect = psycopg2.OperationalError("could not connect to server")
+
+        with mock.patch.object(pricer, "get_db_pool", return_value=pool), \
+                mock.patch.object(file_reference, "get_file_reference", return_value=self.reference):
+            with self.assertRaises(psycopg2.OperationalError):
+                pricer.prefetch_default_reference(claims_line_items)
+
+            with mock.patch.object(file_reference, "REFERENCE_FILES_FALLBACK", True), self.assertLogs(level="WARNING"):
+                reference = pricer.prefetch_default_reference(claims_line_items)
+
+        self.assertEqual(reference.get_provider("1659327898"), ("99501", "207XS0117X"))
+
+
+if __name__ == '__main__':
+    unittest.main()
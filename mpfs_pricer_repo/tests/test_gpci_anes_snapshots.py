@@ -0,0 +1,81 @@
+import unittest
+from datetime import date
+from mpfs_pricer import anes_snapshot, gpci_snapshot
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, statement, params=None):
+        self.db.queries.append((statement, params))
+        end, start = params
+        table_rows = next(rows for table, rows in self.db.tables.items() if f".{table}\n" in statement)
+        self.rows = [row for row in table_rows if row[-2] <= end and row[-1] >= start]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeDb:
+    def __init__(self, **tables):
+        self.tables = tables
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class GpciSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDb(cms_gpci=[
+            (2102, 1, 'ALASKA', 1.5, 1.081, 0.592, date(2020, 1, 1), date(2020, 12, 31)),
+            (1112, 5, 'SAN FRANCISCO', 1.0, 1.2, 0.5, date(2020, 1, 1), date(2020, 3, 31)),
+            (1112, 5, 'SAN FRANCISCO', 1.1, 1.3, 0.6, date(2020, 4, 1), date(2020, 12, 31)),
+        ])
+        self.snapshot = gpci_snapshot.GpciSnapshot(max_quarters=2)
+
+    def test_zplc_region_values_match_numeric_columns(self):
+        self.assertEqual(self.snapshot.get_gpci(self.db, '02102', '01', '09/01/2020'), {
+            'carrier': 2102, 'locality_code': 1, 'locality_name': 'ALASKA',
+            'pw_gpci': 1.5, 'pe_gpci': 1.081, 'mp_gpci': 0.592,
+        })
+        self.assertIsNone(self.snapshot.get_gpci(self.db, '02102', '02', '09/01/2020'))
+
+    def test_effective_date_intervals(self):
+        self.assertEqual(self.snapshot.get_gpci(self.db, '01112', '05', '03/31/2020')['pw_gpci'], 1.0)
+        self.assertEqual(self.snapshot.get_gpci(self.db, '01112', '05', '04/01/2020')['pw_gpci'], 1.1)
+        self.assertEqual(len(self.db.queries), 2)
+
+
+class AnesSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDb(
+            cms_pfs_anesthesia_base_units=[
+                ('00100', 5, date(2020, 1, 1), date(2020, 12, 31)),
+                ('00102', 6, date(2020, 1, 1), date(2020, 6, 30)),
+            ],
+            cms_pfs_anes_conversion_factor=[
+                ('02102', '01', 30.99, date(2020, 1, 1), date(2020, 12, 31)),
+                ('01112', '05', 24.5, date(2019, 1, 1), date(2020, 12, 31)),
+            ],
+        )
+        self.snapshot = anes_snapshot.AnesSnapshot(max_quarters=2)
+
+    def test_base_units(self):
+        self.assertEqual(self.snapshot.get_base_unit(self.db, '00100', '09/01/2020'), 5)
+        self.assertEqual(self.snapshot.get_base_unit(self.db, '00102', '06/30/2020'), 6)
+        self.assertIsNone(self.snapshot.get_base_unit(self.db, '00102', '09/01/2020'))
+        self.assertIsNone(self.snapshot.get_base_unit(self.db, '99213', '09/01/2020'))
+
+    def test_conversion_factors(self):
+        self.assertEqual(self.snapshot.get_conversion_factor(self.db, '02102', '01', '09/01/2020'), 30.99)
+        self.assertEqual(self.snapshot.get_conversion_factor(self.db, '01112', '05', '09/01/2020'), 24.5)
+        self.assertIsNone(self.snapshot.get_conversion_factor(self.db, '01112', '01', '09/01/2020'))
+        # Both tables of a quarter are loaded together
+        self.assertEqual(len(self.db.queries), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
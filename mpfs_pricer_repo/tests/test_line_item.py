@@ -0,0 +1,43 @@
+import json
+import unittest
+from mpfs_pricer import line_item, pricer
+
+
+def priced_line_item(**fields):
+    values = {field: None for field in line_item.PRICED_LINE_ITEM_FIELDS}
+    values.update(code='27254', mod1='', mod2='TC', mod3='', mod4='', charges=100.0, line_item_payment=50.0,
+                  comments=[], service_date='09/01/2020')
+    values.update(fields)
+    return line_item.PricedLineItem(**values)
+
+
+class PricedLineItemTestCase(unittest.TestCase):
+    def test_item_access(self):
+        item = priced_line_item()
+        self.assertEqual(item['line_item_payment'], 50.0)
+        item['line_item_payment'] = 25.0
+        self.assertEqual(item.line_item_payment, 25.0)
+        self.assertEqual(item.mods, ('', 'TC', '', ''))
+        with self.assertRaises(KeyError):
+            item['mods']
+        with self.assertRaises(KeyError):
+            item['unknown'] = 1
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            priced_line_item().unknown = 1
+
+    def test_to_dict(self):
+        item = priced_line_item()
+        self.assertEqual(list(item.to_dict()), list(line_item.PRICED_LINE_ITEM_FIELDS))
+        self.assertEqual(item.to_dict()['mod2'], 'TC')
+
+    def test_priced_claim_to_dict(self):
+        priced_claim = {'claim_number': 'A', 'total_claim_payment': 50.0, 'line_items': [priced_line_item()]}
+        result = json.loads(json.dumps(pricer.priced_claim_to_dict(priced_claim)))
+        self.assertEqual(result['line_items'][0]['code'], '27254')
+        self.assertIs(priced_claim['line_items'][0].__class__, line_item.PricedLineItem)
+
+
+if __name__ == '__main__':
+    unittest.main()
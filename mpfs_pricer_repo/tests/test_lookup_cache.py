@@ -0,0 +1,137 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from mpfs_pricer import database, lookup_cache, reference_version
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.mget_calls = 0
+
+    def mget(self, keys):
+        self.mget_calls += 1
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+        self.ttls[key] = ttl
+
+    def execute(self):
+        pass
+
+
+class LookupCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        for name, value in [("get_redis", lambda: self.redis), ("LOOKUP_CACHE_REDIS", True)]:
+            patcher = mock.patch.object(lookup_cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.fetched_keys = []
+
+    def fetch_rows(self, keys):
+        self.fetched_keys.append(keys)
+        return [[(key, Decimal("1.50"), date(2020, 1, 1))] if key != "unknown" else [] for key in keys]
+
+    @staticmethod
+    def from_rows(rows):
+        return {"code": rows[0][0], "value": rows[0][1], "start": rows[0][2]} if rows else None
+
+    def test_tiers(self):
+        cache = lookup_cache.LookupCache("rvu", 60, max_size=2)
+
+        first = cache.fetch(["27254", "unknown"], self.fetch_rows, self.from_rows)
+        self.assertEqual(first, {"27254": {"code": "27254", "value": Decimal("1.50"), "start": date(2020, 1, 1)},
+                                 "unknown": None})
+        self.assertEqual(set(self.redis.ttls.values()), {60})
+
+        # Results of the other processes are read from Redis, the in-process tier avoids the round trip
+        other_process = lookup_cache.LookupCache("rvu", 60, max_size=2)
+        self.assertEqual(other_process.fetch(["27254", "unknown", "70482"], self.fetch_rows, self.from_rows), {
+            **first, "70482": {"code": "70482", "value": Decimal("1.50"), "start": date(2020, 1, 1)}
+        })
+        self.assertEqual(self.fetched_keys, [["27254", "unknown"], ["70482"]])
+        mget_calls = self.redis.mget_calls
+        cache.fetch(["27254", "unknown"], self.fetch_rows, self.from_rows)
+        self.assertEqual(self.redis.mget_calls, mget_calls)
+        self.assertEqual(len(other_process), 2)
+
+    def test_redis_unavailable(self):
+        from redis import ConnectionError
+
+        cache = lookup_cache.LookupCache("gpci", 60, max_size=0)
+        self.redis.mget = mock.Mock(side_effect=ConnectionError("Connection refused"))
+
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(cache.fetch(["27254"], self.fetch_rows, self.from_rows)["27254"]["code"], "27254")
+
+    def test_lookup_queries_missing_keys(self):
+        lookup = database.Lookup("get_rvus_many", "", lambda key: [key], self.from_rows,
+                                 cache=lookup_cache.LookupCache("rvu", 60, max_size=10))
+
+        with mock.patch.object(lookup, "fetch_rows", lambda db, keys: self.fetch_rows(keys)), \
+                mock.patch.object(reference_version, "get_reference_version", return_value="1") as get_version:
+            lookup.fetch(None, ["27254"])
+            result = lookup.fetch(None, ["27254", "70482", "27254"])
+            get_version.return_value = "2"
+            lookup.fetch(None, ["27254"])
+
+        self.assertEqual(list(result), ["27254", "70482"])
+        self.assertEqual(self.fetched_keys, [["27254"], ["70482"], ["27254"]])
+
+    def test_lookup_without_reference_version(self):
+        import psycopg2
+
+        lookup = database.Lookup("get_rvus_many", "", lambda key: [key], self.from_rows,
+                                 cache=lookup_cache.LookupCache("rvu", 60, max_size=10))
+        db = mock.Mock(closed=0)
+
+        with mock.patch.object(lookup, "fetch_rows", lambda db, keys: self.fetch_rows(keys)), \
+                mock.patch.object(reference_version, "get_reference_version",
+                                  side_effect=psycopg2.OperationalError("server closed the connection")), \
+                self.assertLogs(level="WARNING"):
+            result = lookup.fetch(db, ["27254", "27254"])
+
+        self.assertEqual(list(result), ["27254"])
+        db.rollback.assert_called_once_with()
+        self.assertEqual(len(lookup.cache), 0)
+
+    def test_versions(self):
+        cache = lookup_cache.LookupCache("rvu", 60, max_size=2)
+        cache.fetch(["27254"], self.fetch_rows, self.from_rows, "1")
+
+        # A new reference version misses both tiers and clears the in-process one
+        cache.fetch(["70482"], self.fetch_rows, self.from_rows, "2")
+        self.assertEqual(len(cache), 1)
+        cache.fetch(["27254"], self.fetch_rows, self.from_rows, "2")
+
+        self.assertEqual(self.fetched_keys, [["27254"], ["70482"], ["27254"]])
+        self.assertEqual(sorted(self.redis.values), [
+            'mpfs_pricer:lookup:1:1:rvu:"27254"', 'mpfs_pricer:lookup:1:2:rvu:"27254"', 'mpfs_pricer:lookup:1:2:rvu:"70482"',
+        ])
+
+    def test_results_of_a_replaced_version_are_not_kept(self):
+        cache = lookup_cache.LookupCache("rvu", 60, max_size=2)
+
+        def fetch_rows(keys):
+            # The reference data is swapped while the rows of the former version are read
+            cache.fetch([], self.fetch_rows, self.from_rows, "2")
+            return self.fetch_rows(keys)
+
+        cache.fetch(["27254"], fetch_rows, self.from_rows, "1")
+
+        self.assertEqual(len(cache), 0)
+
+    def test_rows_encoding(self):
+        rows = [("57112", "64451", date(2020, 7, 1), None, "1", Decimal("0.16"), 2)]
+        self.assertEqual(lookup_cache.decode_rows(lookup_cache.encode_rows(rows)), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
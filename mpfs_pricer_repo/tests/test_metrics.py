@@ -0,0 +1,171 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from mpfs_pricer import metrics, prefetch
+from test_prefetch import line_item
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.recorder = metrics.StageRecorder()
+        patcher = mock.patch.object(metrics, "recorder", self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enable(self, metrics_dir=""):
+        for name, value in [("METRICS_ENABLED", True), ("METRICS_DIR", metrics_dir)]:
+            patcher = mock.patch.object(metrics, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_disabled_returns_function(self):
+        def stage():
+            pass
+
+        with mock.patch.object(metrics, "METRICS_ENABLED", False):
+            self.assertIs(metrics.timed("stage")(stage), stage)
+
+    def test_claim_size_bucket(self):
+        self.assertEqual([metrics.get_claim_size_bucket(size) for size in [1, 2, 10, 11, 500, 501]],
+                         ["1", "2-10", "2-10", "11-100", "101-500", "500+"])
+
+    def test_stages_are_labelled_by_claim_size(self):
+        self.enable()
+
+        @metrics.timed("inner")
+        def inner():
+            return "priced"
+
+        @metrics.timed("outer", size=lambda line_items: len(line_items))
+        def outer(line_items):
+            return inner()
+
+        self.assertEqual(outer([{}] * 3), "priced")
+        inner()
+
+        self.recorder.aggregate()
+        self.assertEqual(set(self.recorder.histograms), {("inner", "2-10"), ("outer", "2-10"), ("inner", "unknown")})
+        self.assertEqual(metrics.current_claim_size.get(), "unknown")
+
+    def test_concurrent_claims_keep_their_claim_size(self):
+        self.enable()
+        started = threading.Barrier(2)
+
+        @metrics.timed("inner")
+        def inner():
+            # Both threads are inside their sized stage before either records its inner stage
+            started.wait(timeout=5)
+
+        @metrics.timed("outer", size=lambda line_items: len(line_items))
+        def outer(line_items):
+            inner()
+
+        threads = [threading.Thread(target=outer, args=([{}] * size,)) for size in [1, 50]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.recorder.aggregate()
+        self.assertEqual(set(self.recorder.histograms),
+                         {("inner", "1"), ("outer", "1"), ("inner", "11-100"), ("outer", "11-100")})
+
+    def test_failed_stages_are_recorded(self):
+        self.enable()
+
+        @metrics.timed("stage")
+        def stage():
+            raise ValueError("Couldn't price")
+
+        with self.assertRaises(ValueError):
+            stage()
+
+        self.assertEqual([observation[:2] for observation in self.recorder.observations], [("stage", "unknown")])
+
+    def test_processes_are_merged(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.enable(metrics_dir)
+        other_process = metrics.StageRecorder()
+        token = metrics.current_claim_size.set("1")
+        self.addCleanup(metrics.current_claim_size.reset, token)
+        other_process.observations.append(("rvu", "1", 0.002))
+        other_process.count(metrics.COUNTER_RVU_MODIFIER_RETRIES, 2)
+        with open(os.path.join(metrics_dir, "stages_0.json"), "w") as f:
+            json.dump(other_process.to_dict(), f)
+        self.recorder.observations.append(("rvu", "1", 0.00002))
+        self.recorder.count(metrics.COUNTER_RVU_MODIFIER_RETRIES, 1)
+
+        output, _ = metrics.generate_metrics()
+
+        output = output.decode()
+        self.assertIn('mpfs_pricer_stage_duration_seconds_bucket{claim_size="1",le="5e-05",stage="rvu"} 1.0', output)
+        self.assertIn('mpfs_pricer_stage_duration_seconds_bucket{claim_size="1",le="0.005",stage="rvu"} 2.0', output)
+        self.assertIn('mpfs_pricer_stage_duration_seconds_count{claim_size="1",stage="rvu"} 2.0', output)
+        self.assertIn('mpfs_pricer_rvu_modifier_retries_total{claim_size="1"} 3.0', output)
+
+    def test_exited_processes_are_merged_once(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.enable(metrics_dir)
+        exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        exited_pid = int(exited.stdout)
+        for pid, value in [(exited_pid, 2), (0, 1)]:
+            with open(os.path.join(metrics_dir, f"stages_{pid}.json"), "w") as f:
+                json.dump({"histograms": [], "counters": [[metrics.COUNTER_RVU_LOOKUPS, "1", value]]}, f)
+
+        for _ in range(2):
+            output, _ = metrics.generate_metrics()
+            self.assertIn('mpfs_pricer_rvu_lookups_total{claim_size="1"} 3.0', output.decode())
+
+        self.assertEqual(sorted(name for name in os.listdir(metrics_dir) if name.endswith(".json")),
+                         ["stages_0.json", metrics.EXITED_PROCESSES_FILE])
+
+    def test_flush(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.enable(metrics_dir)
+        self.recorder.observations.append(("npi", "unknown", 0.001))
+
+        self.recorder.flush()
+
+        with open(os.path.join(metrics_dir, f"stages_{os.getpid()}.json")) as f:
+            self.assertEqual(json.load(f)["histograms"][0][:2], ["npi", "unknown"])
+
+    def test_flusher(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.enable(metrics_dir)
+        self.recorder.observations.append(("npi", "unknown", 0.001))
+        flusher = metrics.MetricsFlusher(0.01)
+        flusher.start()
+        self.addCleanup(flusher.join)
+        self.addCleanup(flusher.stop)
+
+        path = os.path.join(metrics_dir, f"stages_{os.getpid()}.json")
+        for _ in range(500):
+            if os.path.exists(path):
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.recorder.observations, [])
+        self.assertTrue(os.path.exists(path))
+
+    def test_rvu_modifier_retries(self):
+        self.enable()
+        reference = prefetch.ClaimReference()
+        reference.rvus = {('57112', '80', '09/01/2020'): {}, ('64451', '', '09/01/2020'): {}}
+
+        prefetch.count_rvu_lookups(reference, [
+            line_item(mod2='80'), line_item(code='64451'), line_item(code='99211', mod1='80'),
+        ])
+
+        self.assertEqual(self.recorder.counters, {
+            (metrics.COUNTER_RVU_LOOKUPS, "unknown"): 3, (metrics.COUNTER_RVU_MODIFIER_RETRIES, "unknown"): 4,
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
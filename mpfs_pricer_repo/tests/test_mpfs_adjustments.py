@@ -46,8 +46,9 @@ class AdjustmentsTestCase(unittest.TestCase):
             'mod2': f'{kwargs.get("mod2", "")}',
             'mod3': f'{kwargs.get("mod3", "")}',
             'mod4': f'{kwargs.get("mod4", "")}',
-            'charges': f'{float(kwargs.get("charges", 100.00)) * int(kwargs.get("quantity", 1))}',
-            'quantity': f'{kwargs.get("quantity", 1)}',
+            # Validated line items, as the pricer reads them
+            'charges': float(kwargs.get("charges", 100.00)) * int(kwargs.get("quantity", 1)),
+            'quantity': float(kwargs.get("quantity", 1)),
             'rendering_provider_npi': f'{kwargs.get("rendering_provider_npi", "1659327898")}',
         }
 
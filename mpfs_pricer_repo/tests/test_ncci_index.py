@@ -0,0 +1,100 @@
+import unittest
+from datetime import date
+from mpfs_pricer import ncci_index
+
+
+class FakeCursor:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.itersize = None
+        self.rows = []
+
+    def execute(self, statement, params=None):
+        self.db.queries.append((self.name, params))
+        end, start = params
+        self.rows = sorted(
+            [row for row in self.db.rows if row[2] <= end and (row[3] is None or row[3] >= start)],
+            key=lambda row: row[:3],
+        )
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+
+class NcciIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDb([
+            ('57112', '64451', date(2020, 1, 1), date(2020, 12, 31), '0'),
+            ('57112', '99211', date(2020, 10, 1), date(2020, 12, 31), '1'),
+            ('57112', '99211', date(2019, 1, 1), date(2020, 9, 30), '0'),
+            ('46948', '99212', date(2020, 1, 1), date(2020, 1, 1), '9'),
+            ('46948', '99213', date(2020, 1, 1), None, '1'),
+            ('46948', '99213', date(2020, 8, 1), None, '9'),
+        ])
+        self.index = ncci_index.NcciIndex(max_quarters=2)
+
+    def test_effective_date_intervals(self):
+        self.assertEqual(self.index.get_ncci(self.db, '57112', '99211', date(2020, 9, 30)), [
+            {'col_1': '57112', 'col_2': '99211', 'effective_date': date(2019, 1, 1),
+             'deletion_date': date(2020, 9, 30), 'modifier': '0'},
+        ])
+        self.assertEqual(
+            [row['modifier'] for row in self.index.get_ncci(self.db, '57112', '99211', date(2020, 10, 1))], ['1']
+        )
+        self.assertEqual(
+            [row['modifier'] for row in self.index.get_ncci(self.db, '46948', '99212', date(2020, 1, 1))], ['9']
+        )
+        self.assertEqual(self.index.get_ncci(self.db, '46948', '99212', date(2020, 1, 2)), [])
+
+    def test_open_ended_edits(self):
+        rows = self.index.get_ncci(self.db, '46948', '99213', date(2020, 8, 15))
+        self.assertEqual([row['modifier'] for row in rows], ['1', '9'])
+        self.assertIsNone(rows[0]['deletion_date'])
+        self.assertEqual(
+            [row['modifier'] for row in self.index.get_ncci(self.db, '46948', '99213', date(2020, 7, 31))], ['1']
+        )
+
+    def test_unknown_codes(self):
+        self.assertEqual(self.index.get_ncci(self.db, '99999', '64451', date(2020, 9, 1)), [])
+        self.assertEqual(self.index.get_ncci(self.db, '64451', '57112', date(2020, 9, 1)), [])
+
+    def test_quarters_are_loaded_once(self):
+        self.index.get_ncci(self.db, '57112', '64451', date(2020, 7, 1))
+        self.index.get_ncci(self.db, '57112', '99211', date(2020, 9, 30))
+        self.index.get_ncci(self.db, '57112', '99211', date(2020, 10, 1))
+        self.assertEqual([params for _, params in self.db.queries], [
+            [date(2020, 9, 30), date(2020, 7, 1)],
+            [date(2020, 12, 31), date(2020, 10, 1)],
+        ])
+        self.assertEqual(len(self.index.quarters[(2020, 4)]), 4)
+
+    def test_unordered_rows(self):
+        with self.assertRaises(ValueError):
+            ncci_index.NcciQuarterIndex((2020, 1), [
+                ('57112', '64451', date(2020, 1, 1), None, '0'),
+                ('57112', '99211', date(2020, 1, 1), None, '0'),
+                ('57112', '64451', date(2020, 2, 1), None, '0'),
+            ])
+
+    def test_same_shape_as_get_ncci_many(self):
+        keys = [('57112', '64451', date(2020, 9, 1)), ('57112', '99211', date(2020, 9, 1))]
+        result = {key: self.index.get_ncci(self.db, *key) for key in keys}
+        self.assertEqual(result[keys[0]], ncci_index.ncci.ncci_from_rows([self.db.rows[0]]))
+        self.assertEqual(result[keys[1]], ncci_index.ncci.ncci_from_rows([self.db.rows[2]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from mpfs_pricer import adjustments, opps_cap
+from test_line_item import priced_line_item
+
+GPCI_INFO = {'carrier': '12402', 'locality_code': '99'}
+
+
+class OppsCapTestCase(unittest.TestCase):
+    def test_files_are_read_by_year(self):
+        bundled_dir = opps_cap.get_opps_cap_data_dir()
+        with tempfile.TemporaryDirectory() as directory:
+            for name, dated_name in [("OPPSCAP_JUL.csv", "OPPSCAP_JUL2020.csv"), ("OPPSCAP_OCT.csv", "OPPSCAP_OCT2020.csv"),
+                                     ("OPPSCAP_JAN.csv", "OPPSCAP_JAN.csv")]:
+                shutil.copy(bundled_dir / name, os.path.join(directory, dated_name))
+            files = opps_cap.get_opps_cap_files(Path(directory))
+            index = opps_cap.OppsCapIndex(files)
+
+        self.assertEqual(list(files), [(2020, 3), (2020, 4)])
+        with mock.patch.object(opps_cap, "_opps_cap_index", index):
+            self.assertEqual(opps_cap.find_opps_cap('70482', ('', 'TC', '', ''), GPCI_INFO, (2020, 3), False), 206.18)
+            self.assertEqual(opps_cap.find_opps_cap('70482', ('', '', '', ''), GPCI_INFO, (2020, 3), False), 274.23)
+            self.assertEqual(opps_cap.find_opps_cap('70482', ('', '', '', ''), GPCI_INFO, (2020, 4), True), 304.17)
+            self.assertIsNone(opps_cap.find_opps_cap('70482', ('26', '', '', ''), GPCI_INFO, (2020, 3), False))
+            self.assertIsNone(opps_cap.find_opps_cap('27254', ('', '', '', ''), GPCI_INFO, (2020, 3), False))
+            self.assertIsNone(opps_cap.find_opps_cap('70482', ('', '', '', ''), GPCI_INFO, (2020, 1), False))
+            self.assertIsNone(opps_cap.find_opps_cap('70482', ('', '', '', ''), GPCI_INFO, (2021, 3), False))
+
+    def test_bundled_files_without_year_are_not_used(self):
+        self.assertEqual(opps_cap.get_opps_cap_files(opps_cap.get_opps_cap_data_dir()), {})
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for quarter, prices in [((2020, 1), "10.50,20.25"), ((2020, 2), ",")]:
+                paths[quarter] = os.path.join(directory, f"{quarter[1]}.csv")
+                with open(paths[quarter], "w") as f:
+                    f.write(f"HCPCS,MOD,PROCSTAT,CARRIER,LOCALITY,FACILITY PRICE,NON-FACILTY PRICE\n"
+                            f"70450,TC,A,01112,05,{prices}\n\x1a\n")
+
+            index = opps_cap.OppsCapIndex(paths)
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.find('70450', 'TC', '01112', '05', (2020, 1), True), 10.5)
+        self.assertEqual(index.find('70450', 'TC', 1112, 5, (2020, 1), False), 20.25)
+        self.assertIsNone(index.find('70450', 'TC', '01112', '05', (2020, 2), False))
+        self.assertIsNone(index.find('70450', '', '01112', '05', (2020, 1), False))
+        self.assertIsNone(index.find('70450', 'TC', '01112', '05', (2021, 1), True))
+
+    def test_adjust_opps_cap(self):
+        item = priced_line_item(line_item_payment=300.0, quantity=2.0)
+        adjustments.adjust_opps_cap(item, 100.0)
+        self.assertEqual(item.line_item_payment, 200.0)
+        self.assertEqual(len(item.comments), 1)
+
+        item = priced_line_item(line_item_payment=150.0, quantity=2.0)
+        adjustments.adjust_opps_cap(item, 100.0)
+        self.assertEqual(item.line_item_payment, 150.0)
+        self.assertEqual(item.comments, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import unittest
+from datetime import date
+from unittest import mock
+from mpfs_pricer import database, prefetch, pricer
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, statement, params=None):
+        self.db.statements.append((statement, params))
+        if not statement.startswith(("PREPARE", "DEALLOCATE")):
+            self.rows = self.db.rows.pop(0) if self.db.rows else []
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeDb:
+    def __init__(self, rows=None):
+        self.statements = []
+        self.rows = rows or []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def line_item(**kwargs):
+    return {
+        'service_date': '09/01/2020',
+        'place_of_service': '11',
+        'code': '57112',
+        'mod1': '',
+        'mod2': '',
+        'mod3': '',
+        'mod4': '',
+        'charges': '100.0',
+        'quantity': '1',
+        'rendering_provider_npi': '1659327898',
+        **kwargs,
+    }
+
+
+class FetchLookupsTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(database.lookup_param_types, {"lookup": ["integer", "date"]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rows_are_grouped_by_key(self):
+        db = FakeDb([[(0, 'a'), (2, 'c1'), (2, 'c2'), (1, 'b')]])
+
+        result = database.fetch_lookups(db, "lookup", "SELECT x FROM t WHERE k = %s AND d >= %s",
+                                        [[1, '09/01/2020'], [2, None], [3, date(2020, 9, 1)]], first_row_only=False)
+
+        self.assertEqual(result, [[('a',)], [('b',)], [('c1',), ('c2',)]])
+        prepare, execute = db.statements
+        self.assertEqual(prepare[0], (
+            "PREPARE lookup AS SELECT k.key_index - 1, q.* "
+            "FROM unnest($1::text[]::integer[], $2::text[]::date[]) WITH ORDINALITY AS k(p0, p1, key_index) "
+            "CROSS JOIN LATERAL (SELECT x FROM t WHERE k = k.p0 AND d >= k.p1) AS q"
+        ))
+        self.assertEqual(execute, ("EXECUTE lookup (%s, %s)", [['1', '2', '3'], ['09/01/2020', None, '2020-09-01']]))
+
+    def test_keys_are_chunked(self):
+        db = FakeDb([[(0, 'a')], [(0, 'c')]])
+
+        with mock.patch.object(database, "LOOKUP_BATCH_SIZE", 2):
+            result = database.fetch_lookups(db, "lookup", "SELECT x FROM t WHERE k = %s", [[1], [2], [3]])
+
+        self.assertEqual(result, [[('a',)], [], [('c',)]])
+        # One statement whatever the number of keys
+        self.assertEqual(db.statements[1:], [("EXECUTE lookup (%s)", [['1', '2']]), ("EXECUTE lookup (%s)", [['3']])])
+        self.assertIn("LIMIT 1", db.statements[0][0])
+
+    def test_param_types_are_read_once(self):
+        db = FakeDb([[(['character varying', 'date'],)]])
+
+        for _ in range(2):
+            param_types = database.get_param_types(db, "get_x", "SELECT x FROM t WHERE a = %s AND b >= %s")
+
+        self.assertEqual(param_types, ['character varying', 'date'])
+        self.assertEqual(db.statements, [
+            ("PREPARE get_x_types AS SELECT x FROM t WHERE a = $1 AND b >= $2", None),
+            (database.PARAM_TYPES_QUERY, ['get_x_types']),
+            ("DEALLOCATE get_x_types", None),
+        ])
+
+    def test_no_keys(self):
+        db = FakeDb()
+        self.assertEqual(database.fetch_lookups(db, "lookup", "SELECT 1", []), [])
+        self.assertEqual(db.statements, [])
+
+
+class ExecuteStatementTestCase(unittest.TestCase):
+    def test_statement_is_prepared_once_per_connection(self):
+        first_db = FakeDb()
+        second_db = FakeDb()
+
+        for db in [first_db, first_db, second_db]:
+            database.execute_statement(db, "get_x", "SELECT x FROM t WHERE a = %s AND b >= %s", ['a', '01/01/2020'])
+
+        self.assertEqual(first_db.statements, [
+            ("PREPARE get_x AS SELECT x FROM t WHERE a = $1 AND b >= $2", None),
+            ("EXECUTE get_x (%s, %s)", ['a', '01/01/2020']),
+            ("EXECUTE get_x (%s, %s)", ['a', '01/01/2020']),
+        ])
+        self.assertEqual(len(second_db.statements), 2)
+
+    def test_prepared_statements_disabled(self):
+        db = FakeDb()
+
+        with mock.patch.object(database, "DB_PREPARED_STATEMENTS", False):
+            database.execute_statement(db, "get_x", "SELECT x FROM t WHERE a = %s", ['a'])
+
+        self.assertEqual(db.statements, [("SELECT x FROM t WHERE a = %s", ['a'])])
+
+
+class PrefetchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rvus = {'cpt': '57112', 'mod': '80'}
+        self.gpci_info = {'locality_name': 'ALASKA', 'pw_gpci': 1.5, 'pe_gpci': 1.081, 'mp_gpci': 0.592}
+        patches = {
+            "find_providers_by_npis": lambda db, npis: {npi: ('99501', '207XS0117X') for npi in npis},
+            "get_gpci_many": lambda db, keys: {key: self.gpci_info for key in keys},
+            "get_rvus_many": lambda db, keys: {key: self.rvus if key[1] == '80' else None for key in keys},
+            "get_base_units": lambda db, keys: {key: None for key in keys},
+            "get_conversion_factors": lambda db, keys: {key: 30.99 for key in keys},
+            "get_ncci_many": lambda db, keys: {key: [{'modifier': '0'}] for key in keys},
+        }
+        self.calls = {name: [] for name in patches}
+        for name, func in patches.items():
+            patcher = mock.patch.object(prefetch, name, side_effect=self.record(name, func))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record(self, name, func):
+        def wrapper(db, keys, snapshot=None):
+            keys = list(keys)
+            self.calls[name].append(keys)
+            return func(db, keys)
+        return wrapper
+
+    def test_one_lookup_per_table(self):
+        line_items = [
+            line_item(),
+            line_item(code='64451', mod2='80'),
+            line_item(code='99211', service_date='09/02/2020'),
+        ]
+
+        reference = prefetch.prefetch_reference(None, line_items)
+
+        for name, calls in self.calls.items():
+            self.assertEqual(len(calls), 1, name)
+        self.assertEqual(len(self.calls["get_rvus_many"][0]), 12)
+        self.assertEqual(self.calls["get_ncci_many"][0], [('57112', '64451', date(2020, 9, 1))])
+        self.assertEqual(self.calls["get_gpci_many"][0][0], ('02102', '01', '09/01/2020'))
+
+        data = pricer.price_line_item_prepare(None, line_items[1], reference)
+        self.assertEqual(data, (line_items[1], self.gpci_info, self.rvus, '207XS0117X', None, 30.99))
+
+        ncci_info = pricer.ncci_info_prepare(None, line_items, reference)
+        self.assertEqual(ncci_info, [[], [{'modifier': '0'}], []])
+
+    def test_claims_share_lookups(self):
+        claims_line_items = [
+            [line_item(), line_item(code='64451')],
+            [line_item(code='99211')],
+            [line_item(code='64451'), line_item()],
+        ]
+
+        prefetch.prefetch_claims_reference(None, claims_line_items)
+
+        for name, calls in self.calls.items():
+            self.assertEqual(len(calls), 1, name)
+        self.assertEqual(len(set(self.calls["find_providers_by_npis"][0])), 1)
+        self.assertEqual(len(set(self.calls["get_base_units"][0])), 3)
+        # NCCI pairs never span two claims
+        self.assertEqual(self.calls["get_ncci_many"][0], [
+            ('57112', '64451', date(2020, 9, 1)),
+            ('64451', '57112', date(2020, 9, 1)),
+        ])
+
+    def test_price_claims(self):
+        claims = [
+            {'claim_number': 'A', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+             'line_items': [line_item(), line_item(code='99211')]},
+            {'claim_number': 'B', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020',
+             'line_items': [line_item()]},
+        ]
+
+        results = pricer.price_claims(claims, reference_database_connection=FakeDb())
+
+        self.assertEqual([result['claim_number'] for result in results], ['A', 'B'])
+        self.assertEqual([len(result['line_items']) for result in results], [2, 1])
+        self.assertEqual(len(self.calls["get_rvus_many"]), 1)
+
+    def test_unknown_npi(self):
+        with mock.patch.object(prefetch, "find_providers_by_npis", return_value={}):
+            reference = prefetch.prefetch_reference(None, [line_item()])
+
+        with self.assertRaisesRegex(ValueError, "Couldn't find zip code for NPI 1659327898"):
+            pricer.price_line_item_prepare(None, line_item(), reference)
+
+
+if __name__ == '__main__':
+    unittest.main()
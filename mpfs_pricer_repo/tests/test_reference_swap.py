@@ -0,0 +1,177 @@
+import math
+import tempfile
+import unittest
+from contextlib import nullcontext
+from datetime import date
+from pathlib import Path
+from unittest import mock
+from mpfs_pricer import anes_snapshot, binary_snapshot, file_reference, gpci_snapshot, ncci_index, reference_swap
+from mpfs_pricer import nppes_cache, pricer, reference_version, rvu_snapshot
+from mpfs_pricer.prefetch import DatabaseBackend, DatabaseSnapshots
+from mpfs_pricer.snapshots import StaleSnapshotError
+from test_file_reference import write_csv, write_reference_files
+from test_rvu_snapshot import FakeDb, rvu_row
+
+GPCI_KEY = ("02102", "01", "09/01/2020")
+
+
+def write_gpci(directory, pe_gpci):
+    write_csv(directory, file_reference.GPCI_FILE, ["carrier", "locality", "name", "pw", "pe", "mp", "start", "end"], [
+        ["02102", "01", "ALASKA", "1.5", pe_gpci, "0.592", "2020-01-01", "2020-12-31"],
+    ])
+
+
+class SwappableReferenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        write_reference_files(self.directory.name)
+        self.swappable = reference_swap.SwappableReference()
+        reference_version.reset_reference_version()
+        self.addCleanup(reference_version.reset_reference_version)
+        patcher = mock.patch.object(reference_swap, "REFERENCE_RELOAD_INTERVAL", 60.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_backend(self, backend, reference):
+        for target, name, value in [(file_reference, "REFERENCE_BACKEND", backend),
+                                    (file_reference, "get_local_reference", lambda: reference)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_in_flight_readers_keep_their_generation(self):
+        self.use_backend(file_reference.FILES_BACKEND, file_reference.FileReference(self.directory.name))
+        self.assertFalse(self.swappable.check())
+
+        with self.swappable.acquire() as reference:
+            write_gpci(self.directory.name, "1.2345")
+            self.assertTrue(self.swappable.check())
+
+            self.assertEqual(reference.get_gpci_many([GPCI_KEY])[GPCI_KEY]["pe_gpci"], 1.081)
+            with self.swappable.acquire() as reloaded:
+                self.assertEqual(reloaded.get_gpci_many([GPCI_KEY])[GPCI_KEY]["pe_gpci"], 1.2345)
+
+        self.assertFalse(self.swappable.check())
+
+    def test_retired_snapshots_are_unmapped_after_their_last_reader(self):
+        snapshot_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_directory.cleanup)
+        path = Path(snapshot_directory.name) / binary_snapshot.get_snapshot_file_name((2020, 3))
+        binary_snapshot.write_files_snapshot(self.directory.name, (2020, 3), path)
+        self.use_backend(file_reference.SNAPSHOT_BACKEND, binary_snapshot.SnapshotReference(snapshot_directory.name))
+
+        with self.swappable.acquire() as reference:
+            reference.get_gpci_many([GPCI_KEY])
+            write_gpci(self.directory.name, "1.2345")
+            binary_snapshot.write_files_snapshot(self.directory.name, (2020, 3), path)
+            self.assertTrue(self.swappable.check())
+
+            # The new generation maps the quarters the former one had mapped
+            self.assertEqual(list(self.swappable.generation.reference.snapshots), [(2020, 3)])
+            self.assertEqual(list(reference.snapshots), [(2020, 3)])
+            self.assertEqual(reference.get_gpci_many([GPCI_KEY])[GPCI_KEY]["pe_gpci"], 1.081)
+
+        self.assertEqual(reference.snapshots, {})
+        with self.swappable.acquire() as reloaded:
+            self.assertEqual(reloaded.get_gpci_many([GPCI_KEY])[GPCI_KEY]["pe_gpci"], 1.2345)
+
+    def use_database(self, db):
+        snapshots = DatabaseSnapshots(
+            rvu_snapshot.RvuSnapshot(2), gpci_snapshot.GpciSnapshot(0), anes_snapshot.AnesSnapshot(0),
+            ncci_index.NcciIndex(0), nppes_cache.ProviderCache(10),
+        )
+        pool = mock.Mock()
+        pool.connection.side_effect = lambda: nullcontext(db)
+        for target, name, value in [(file_reference, "REFERENCE_BACKEND", file_reference.DATABASE_BACKEND),
+                                    (reference_swap, "database_snapshots", snapshots),
+                                    (reference_swap, "get_db_pool", lambda name: pool),
+                                    (reference_version, "get_database_version", lambda db: db.version)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return snapshots
+
+    def test_database_snapshots(self):
+        db = FakeDb([rvu_row('27254', None, 10.0, date(2020, 1, 1), date(2020, 12, 31))])
+        db.version = "1"
+        snapshots = self.use_database(db)
+        rvu_key = ('27254', '', '09/01/2020')
+
+        with self.swappable.acquire() as current:
+            self.assertEqual(DatabaseBackend(db, current).get_rvus_many([rvu_key])[rvu_key]['work_rvu'], 10.0)
+            current.providers.providers['1'] = ('99501', 'T1'), math.inf
+        self.assertEqual(self.swappable.generation.version, "1")
+        self.assertFalse(self.swappable.check())
+
+        db.rows = [rvu_row('27254', None, 12.0, date(2020, 1, 1), date(2020, 12, 31))]
+        db.version = "2"
+        self.assertTrue(self.swappable.check())
+
+        # Quarters the former generation held are loaded before the swap, providers are fetched again
+        with self.swappable.acquire() as reloaded:
+            self.assertEqual(list(reloaded.rvus.quarters), [(2020, 3)])
+            self.assertEqual(len(reloaded.providers), 0)
+            self.assertEqual(DatabaseBackend(db, reloaded).get_rvus_many([rvu_key])[rvu_key]['work_rvu'], 12.0)
+        # The first generation is released even though the module level snapshots still reference it
+        self.assertEqual(list(snapshots.rvus.quarters), [])
+        self.assertEqual(len(snapshots.providers), 0)
+
+    def test_initial_version_is_read_before_quarters_are_loaded(self):
+        db = FakeDb([rvu_row('27254', None, 10.0, date(2020, 1, 1), date(2020, 12, 31))])
+        db.version = "1"
+        self.use_database(db)
+        rvu_key = ('27254', '', '09/01/2020')
+
+        with self.swappable.acquire() as current:
+            # Published after the generation was created but before its first quarter is loaded
+            db.rows = [rvu_row('27254', None, 12.0, date(2020, 1, 1), date(2020, 12, 31))]
+            db.version = "2"
+            with self.assertRaises(StaleSnapshotError):
+                DatabaseBackend(db, current).get_rvus_many([rvu_key])
+            self.assertEqual(list(current.rvus.quarters), [])
+
+        self.assertTrue(self.swappable.check())
+        with self.swappable.acquire() as reloaded:
+            self.assertEqual(DatabaseBackend(db, reloaded).get_rvus_many([rvu_key])[rvu_key]['work_rvu'], 12.0)
+
+    def test_disabled_swapping_reads_no_version(self):
+        db = FakeDb([rvu_row('27254', None, 10.0, date(2020, 1, 1), date(2020, 12, 31))])
+        snapshots = self.use_database(db)
+        rvu_key = ('27254', '', '09/01/2020')
+
+        with mock.patch.object(reference_swap, "REFERENCE_RELOAD_INTERVAL", 0.0), \
+                mock.patch.object(reference_version, "get_database_version") as get_database_version:
+            with self.swappable.acquire() as current:
+                self.assertEqual(DatabaseBackend(db, current).get_rvus_many([rvu_key])[rvu_key]['work_rvu'], 10.0)
+            self.assertFalse(self.swappable.check())
+
+        get_database_version.assert_not_called()
+        self.assertIsNone(self.swappable.generation.version)
+        self.assertIsNone(snapshots.rvus.version)
+
+    def test_stale_claims_are_resolved_from_the_new_generation(self):
+        with mock.patch.object(file_reference, "REFERENCE_BACKEND", file_reference.DATABASE_BACKEND), \
+                mock.patch.object(pricer, "prefetch_database_reference",
+                                  side_effect=[StaleSnapshotError("1 was replaced by 2"), "reference"]) as prefetch, \
+                mock.patch.object(pricer, "swappable_reference") as swappable:
+            self.assertEqual(pricer.prefetch_default_reference([]), "reference")
+
+        swappable.check.assert_called_once_with()
+        self.assertEqual(prefetch.call_count, 2)
+
+    def test_watcher_survives_failed_reloads(self):
+        self.use_backend(file_reference.FILES_BACKEND, file_reference.FileReference(self.directory.name))
+        watcher = reference_swap.ReferenceWatcher(self.swappable, 0.01)
+
+        with mock.patch.object(self.swappable, "check", side_effect=[ValueError("No gpci.csv"), True, True]) as check, \
+                self.assertLogs(level="ERROR"):
+            watcher.start()
+            while check.call_count < 3:
+                watcher.join(0.01)
+            watcher.stop()
+            watcher.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
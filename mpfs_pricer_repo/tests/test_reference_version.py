@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from unittest import mock
+import psycopg2
+import psycopg2.errors
+from mpfs_pricer import file_reference, reference_version
+from mpfs_pricer.prefetch import DatabaseBackend
+from test_file_reference import write_reference_files
+
+
+class FakeCursor:
+    def __init__(self, rows, error=None):
+        self.rows = rows
+        self.error = error
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        if self.error is not None:
+            raise self.error
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeDb:
+    def __init__(self, dsn, rows, error=None):
+        self.dsn = dsn
+        self.closed = False
+        self.rollbacks = 0
+        self.cursor_ = FakeCursor(rows, error)
+
+    def cursor(self):
+        return self.cursor_
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class ReferenceVersionTestCase(unittest.TestCase):
+    def setUp(self):
+        reference_version.reset_reference_version()
+        self.addCleanup(reference_version.reset_reference_version)
+
+    def test_database_version_marker(self):
+        db = FakeDb("dbname=reference", [("2020Q3-1",)])
+
+        self.assertEqual(reference_version.get_database_version(db), "2020Q3-1")
+        self.assertIn(reference_version.REFERENCE_VERSION_TABLE, db.cursor_.statements[0])
+        # Before the first reload
+        self.assertEqual(reference_version.get_database_version(FakeDb("dbname=reference", [])), "")
+
+    def test_database_version_failures_are_rolled_back(self):
+        db = FakeDb("dbname=reference", [], psycopg2.errors.UndefinedTable("relation does not exist"))
+
+        # The table is created by the first DAG run
+        self.assertEqual(reference_version.get_database_version(db), "")
+        self.assertEqual(db.rollbacks, 1)
+
+        db = FakeDb("dbname=reference", [], psycopg2.OperationalError("server closed the connection"))
+        with self.assertRaises(psycopg2.OperationalError):
+            reference_version.get_database_version(db)
+        self.assertEqual(db.rollbacks, 1)
+
+    def test_versions_are_cached_per_backend(self):
+        directories = [tempfile.TemporaryDirectory() for _ in range(2)]
+        for directory in directories:
+            self.addCleanup(directory.cleanup)
+            write_reference_files(directory.name)
+        with open(f"{directories[1].name}/extra.csv", "w") as f:
+            f.write("code\n")
+        references = [file_reference.FileReference(directory.name) for directory in directories]
+        db = FakeDb("dbname=reference", [("2020Q3-1",)])
+
+        versions = [reference_version.get_reference_version(backend)
+                    for backend in references + [db, DatabaseBackend(db)]]
+
+        self.assertNotEqual(versions[0], versions[1])
+        # A database backend has the version of its connection
+        self.assertEqual(versions[2], versions[3])
+        self.assertEqual(len(db.cursor_.statements), 1)
+        with mock.patch.object(reference_version, "load_reference_version") as load_reference_version:
+            self.assertEqual([reference_version.get_reference_version(backend) for backend in references], versions[:2])
+        load_reference_version.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from datetime import date
+from mpfs_pricer import rvu_snapshot, snapshots
+
+
+def rvu_row(cpt, mod, work_rvu, eff_start_dt, eff_end_dt):
+    row = [cpt, mod, 'Description', 'A', work_rvu, 1.25, None, 0.5, None, 0.1, 2.0, 1.0, 0.0, '090', 0.1, 0.8, 0.1,
+           2.0, 1.0, 2.0, 0.0, 0.0, None, 36.0896, '09', 0.0, 99.0, 0.0, 0.0, 0.0]
+    return tuple(row + [eff_start_dt, eff_end_dt])
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, statement, params=None):
+        self.db.queries.append(params)
+
+    def fetchall(self):
+        end, start = self.db.queries[-1]
+        return [row for row in self.db.rows if row[-2] <= end and row[-1] >= start]
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class RvuSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDb([
+            rvu_row('27254', None, 10.0, date(2020, 1, 1), date(2020, 3, 31)),
+            rvu_row('27254', None, 11.0, date(2020, 4, 1), date(2020, 12, 31)),
+            rvu_row('27254', 'TC', 1.5, date(2020, 1, 1), date(2020, 12, 31)),
+            rvu_row('70482', None, 2.5, date(2020, 2, 15), date(2020, 2, 20)),
+        ])
+        self.snapshot = rvu_snapshot.RvuSnapshot(max_quarters=2)
+
+    def test_get_quarter_bounds(self):
+        self.assertEqual(snapshots.get_quarter_bounds((2020, 1)), (date(2020, 1, 1), date(2020, 3, 31)))
+        self.assertEqual(snapshots.get_quarter_bounds((2020, 4)), (date(2020, 10, 1), date(2020, 12, 31)))
+        self.assertEqual(snapshots.get_service_quarter(date(2020, 9, 30)), (2020, 3))
+
+    def test_effective_date_intervals(self):
+        self.assertEqual(self.snapshot.get_rvus(self.db, '27254', '', '03/31/2020')['work_rvu'], 10.0)
+        self.assertEqual(self.snapshot.get_rvus(self.db, '27254', '', '04/01/2020')['work_rvu'], 11.0)
+        self.assertEqual(self.snapshot.get_rvus(self.db, '27254', 'TC', '04/01/2020')['work_rvu'], 1.5)
+        self.assertEqual(self.snapshot.get_rvus(self.db, '70482', None, '02/20/2020')['work_rvu'], 2.5)
+        self.assertIsNone(self.snapshot.get_rvus(self.db, '70482', None, '02/21/2020'))
+        self.assertIsNone(self.snapshot.get_rvus(self.db, '27254', '26', '02/21/2020'))
+        self.assertIsNone(self.snapshot.get_rvus(self.db, '99999', None, '02/21/2020'))
+
+    def test_same_shape_as_get_rvus(self):
+        rvus = self.snapshot.get_rvus(self.db, '27254', 'TC', '09/01/2020')
+        expected = rvu_snapshot.rvu.rvus_from_row(self.db.rows[2][:-2])
+        self.assertEqual(rvus, expected)
+
+    def test_quarters_are_loaded_lazily_and_evicted(self):
+        self.snapshot.get_rvus(self.db, '27254', '', '01/01/2020')
+        self.snapshot.get_rvus(self.db, '27254', '', '02/01/2020')
+        self.assertEqual(len(self.db.queries), 1)
+
+        self.snapshot.get_rvus(self.db, '27254', '', '05/01/2020')
+        self.snapshot.get_rvus(self.db, '27254', '', '01/05/2020')
+        self.snapshot.get_rvus(self.db, '27254', '', '08/01/2020')
+        self.assertEqual(len(self.db.queries), 3)
+        self.assertEqual(list(self.snapshot.quarters), [(2020, 1), (2020, 3)])
+
+        self.snapshot.get_rvus(self.db, '27254', '', '05/01/2020')
+        self.assertEqual(len(self.db.queries), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from mpfs_pricer import startup
+
+
+class StartupTestCase(unittest.TestCase):
+    def test_parse_import_times(self):
+        output = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       407 |       5773 |   psycopg2._psycopg",
+            "import time:      1200 |      12000 | psycopg2",
+            "Traceback (most recent call last):",
+        ])
+
+        self.assertEqual(startup.parse_import_times(output), [
+            ("psycopg2._psycopg", 0.000407, 0.005773), ("psycopg2", 0.0012, 0.012),
+        ])
+
+    def test_heavy_modules_are_imported_lazily(self):
+        import_times = startup.get_import_times("mpfs_pricer.pricer")
+        names = {name.split(".")[0] for name, _, _ in import_times}
+
+        self.assertIn("mpfs_pricer", names)
+        self.assertFalse(names & {"psycopg2", "dateutil", "pybrake", "celery"})
+        self.assertIn("mpfs_pricer.pricer: ", startup.format_report("mpfs_pricer.pricer", import_times, 5))
+
+    def test_preload(self):
+        with self.assertLogs(level="INFO"):
+            timings = startup.preload(["json", "mpfs_pricer.utils"])
+
+        self.assertEqual([name for name, _ in timings], ["json", "mpfs_pricer.utils"])
+
+
+if __name__ == '__main__':
+    unittest.main()
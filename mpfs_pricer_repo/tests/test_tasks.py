@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+from kombu import serialization
+from worker import tasks
+
+
+def claim(claim_number):
+    return {'claim_number': claim_number, 'line_items': []}
+
+
+class PriceClaimDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.priced_batches = []
+        patcher = mock.patch.object(tasks, 'price_claims_to_dicts', self.price_claims_to_dicts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def price_claims_to_dicts(self, claims):
+        self.priced_batches.append([claim['claim_number'] for claim in claims])
+        return [{'claim_number': claim['claim_number'], 'total_claim_payment': 1.0} for claim in claims]
+
+    def test_chunks_are_reassembled_in_order(self):
+        data = [claim(str(number)) for number in range(7)]
+
+        with mock.patch.object(tasks, 'CLAIM_CHUNK_SIZE', 3), \
+                mock.patch.object(tasks.price_claim_data, 'replace') as replace:
+            tasks.price_claim_data.apply(args=[data])
+
+        # The task is replaced by a chord of chunk tasks joined by its callback
+        chord = replace.call_args[0][0]
+        chunk_task_ids = [chunk_task.options['task_id'] for chunk_task in chord.tasks]
+        self.assertEqual([chunk_task.args[2] for chunk_task in chord.tasks], [chunk_task_ids] * 3)
+        priced_chunks = [chunk_task.apply().get() for chunk_task in chord.tasks]
+        result = chord.body.apply(args=(priced_chunks,)).get()
+
+        self.assertEqual(self.priced_batches, [['0', '1', '2'], ['3', '4', '5'], ['6']])
+        self.assertEqual([priced_claim['claim_number'] for priced_claim in result], [str(n) for n in range(7)])
+
+    def test_small_payloads_are_priced_in_one_task(self):
+        data = [claim(str(number)) for number in range(3)]
+
+        with mock.patch.object(tasks, 'CLAIM_CHUNK_SIZE', 3):
+            result = tasks.price_claim_data.apply(args=[data]).get()
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(self.priced_batches, [['0', '1', '2']])
+
+    def test_called_directly(self):
+        data = [claim(str(number)) for number in range(7)]
+
+        with mock.patch.object(tasks, 'CLAIM_CHUNK_SIZE', 3):
+            result = tasks.price_claim_data(data)
+
+        self.assertEqual(len(result), 7)
+        self.assertEqual(self.priced_batches, [[str(n) for n in range(7)]])
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.locked = []
+
+    def lock(self, name, timeout):
+        self.locked.append(name)
+        return mock.MagicMock()
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def expire(self, key, seconds):
+        self.expires[key] = seconds
+
+
+class ChunkProgressTestCase(unittest.TestCase):
+    def test_progress_is_counted_per_payload(self):
+        redis = FakeRedis()
+        task = mock.Mock()
+
+        with mock.patch.object(tasks, 'get_redis', return_value=redis):
+            for _ in range(4):
+                tasks.store_chunk_progress(task, 'parent', 3)
+
+        self.assertEqual([call.kwargs['meta'] for call in task.update_state.call_args_list], [
+            {'chunks_done': 1, 'chunks': 3}, {'chunks_done': 2, 'chunks': 3}, {'chunks_done': 3, 'chunks': 3},
+            {'chunks_done': 3, 'chunks': 3},
+        ])
+        self.assertEqual(task.update_state.call_args.kwargs['task_id'], 'parent')
+        self.assertEqual(redis.locked, ['mpfs_pricer:progress:parent:lock'] * 4)
+        self.assertEqual(redis.expires, {'mpfs_pricer:progress:parent': tasks.app.conf.result_expires})
+
+
+class TaskSerializationTestCase(unittest.TestCase):
+    def test_compact_claims_are_sent_with_orjson(self):
+        claims = [['A', '1', '09/01/2020', '09/01/2020', [['09/01/2020', '11', '57112', '', '', '', '', '1', 1.5, 1.0]]]]
+        signature = tasks.price_claim_data.s(claims)
+
+        content_type, content_encoding, body = serialization.dumps(
+            ((claims,), {}, {'chord': signature}), serializer=tasks.app.conf.task_serializer,
+        )
+        args, _, embed = serialization.loads(
+            body, content_type, content_encoding,
+            accept=serialization.prepare_accept_content(tasks.app.conf.accept_content),
+        )
+
+        self.assertEqual(content_type, 'application/x-orjson')
+        self.assertEqual(args, [claims])
+        self.assertEqual(embed['chord']['args'], [claims])
+
+    def test_compact_claims_are_priced_as_dicts(self):
+        with mock.patch('mpfs_pricer.pricer.price_claims', return_value=[]) as price_claims:
+            tasks.price_claims_to_dicts([['A', '1', '09/01/2020', '09/01/2020', []]])
+
+        price_claims.assert_called_once_with([{
+            'claim_number': 'A', 'npi': '1', 'service_from': '09/01/2020', 'service_to': '09/01/2020', 'line_items': [],
+        }])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+from contextlib import nullcontext
+from datetime import date
+from unittest import mock
+from mpfs_pricer import nppes_cache, warmup
+from mpfs_pricer.snapshots import get_service_quarter
+
+
+class FakeSnapshots:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.quarters = []
+
+    def get_quarter(self, db, quarter):
+        self.quarters.append(quarter)
+
+
+class FakeDatabaseSnapshots:
+    def __init__(self):
+        self.snapshots = {name: FakeSnapshots() for name in ['rvus', 'gpci', 'anes']}
+        self.snapshots['ncci'] = FakeSnapshots(enabled=False)
+        self.providers = mock.Mock(enabled=True)
+
+    def __iter__(self):
+        return iter(self.snapshots.values())
+
+
+class ProviderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+        patcher = mock.patch.object(nppes_cache.nppes, 'find_providers_by_npis', self.find_providers_by_npis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def find_providers_by_npis(self, db, npis):
+        self.fetched.append(list(npis))
+        return {npi: (None, None) if npi == '0' else ('99501', 'T' + npi) for npi in npis}
+
+    def test_only_missing_providers_are_fetched(self):
+        cache = nppes_cache.ProviderCache(max_size=10)
+
+        self.assertEqual(cache.find_providers_by_npis(None, ['1', '2', '0', '1']),
+                         {'1': ('99501', 'T1'), '2': ('99501', 'T2'), '0': (None, None)})
+        self.assertEqual(cache.find_providers_by_npis(None, ['0', '2', '3']),
+                         {'0': (None, None), '2': ('99501', 'T2'), '3': ('99501', 'T3')})
+        self.assertEqual(self.fetched, [['1', '2', '0'], ['3']])
+
+    def test_least_recently_used_providers_are_evicted(self):
+        cache = nppes_cache.ProviderCache(max_size=2)
+
+        cache.find_providers_by_npis(None, ['1', '2'])
+        cache.find_providers_by_npis(None, ['1'])
+        cache.find_providers_by_npis(None, ['3'])
+
+        self.assertEqual(list(cache.providers), ['1', '3'])
+
+    def test_expired_providers_are_fetched_again(self):
+        cache = nppes_cache.ProviderCache(max_size=10, ttl=60)
+
+        with mock.patch.object(nppes_cache.time, 'monotonic', side_effect=[0, 0, 30, 61, 61]):
+            cache.find_providers_by_npis(None, ['1'])
+            cache.find_providers_by_npis(None, ['1'])
+            self.assertEqual(cache.find_providers_by_npis(None, ['1']), {'1': ('99501', 'T1')})
+
+        self.assertEqual(self.fetched, [['1'], ['1']])
+
+
+class WarmUpTestCase(unittest.TestCase):
+    def setUp(self):
+        self.snapshots = FakeDatabaseSnapshots()
+        swappable_reference = mock.Mock()
+        swappable_reference.acquire.side_effect = lambda: nullcontext(self.snapshots)
+        for patcher in [mock.patch.object(warmup, 'swappable_reference', swappable_reference),
+                        mock.patch.object(warmup, 'get_zplc_index')]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.addCleanup(warmup.caches_warm.clear)
+
+    def test_warm_caches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hot_npis.txt')
+            with open(path, 'w') as f:
+                f.write('1659327898\n\n1073640454\n')
+
+            with mock.patch.object(warmup, 'HOT_NPIS_FILE', path):
+                warmup.warm_caches('db', self.snapshots, date(2020, 9, 1))
+
+        self.assertEqual({name: snapshots.quarters for name, snapshots in self.snapshots.snapshots.items()}, {
+            'rvus': [(2020, 3)], 'gpci': [(2020, 3)], 'anes': [(2020, 3)], 'ncci': [],
+        })
+        self.snapshots.providers.find_providers_by_npis.assert_called_once_with('db', ['1659327898', '1073640454'])
+
+    def test_ready_once_caches_are_warm(self):
+        with mock.patch.object(warmup, 'CACHE_WARMUP', True), \
+                mock.patch.object(warmup, 'get_db_pool') as get_db_pool:
+            self.assertFalse(warmup.is_ready())
+            get_db_pool.return_value.connection.side_effect = RuntimeError("database is down")
+            with self.assertLogs(level='ERROR'):
+                warmup.warm_up()
+            self.assertFalse(warmup.is_ready())
+
+            get_db_pool.return_value.connection.side_effect = None
+            warmup.warm_up()
+            self.assertTrue(warmup.is_ready())
+        self.assertEqual(self.snapshots.snapshots['rvus'].quarters, [get_service_quarter(date.today())])
+
+    def test_caches_preloaded_before_the_fork(self):
+        with mock.patch.object(warmup, 'CACHE_WARMUP', True), \
+                mock.patch.object(warmup, 'get_db_pool') as get_db_pool, \
+                mock.patch.object(warmup.gc, 'freeze') as freeze:
+            warmup.preload_caches()
+            self.assertTrue(warmup.is_ready())
+            get_db_pool.return_value.close.assert_called_once_with()
+            freeze.assert_called_once_with()
+
+            # Worker processes inherit the caches, they only start their threads
+            warmup.warm_up()
+
+        self.assertEqual(self.snapshots.snapshots['rvus'].quarters, [get_service_quarter(date.today())])
+
+    def test_workers_warm_up_when_the_preload_failed(self):
+        with mock.patch.object(warmup, 'CACHE_WARMUP', True), \
+                mock.patch.object(warmup, 'get_db_pool') as get_db_pool, \
+                mock.patch.object(warmup.gc, 'freeze') as freeze:
+            get_db_pool.return_value.connection.side_effect = [RuntimeError("database is down"), nullcontext('db')]
+            with self.assertLogs(level='ERROR'):
+                warmup.preload_caches()
+            self.assertFalse(warmup.is_ready())
+
+            warmup.warm_up()
+            self.assertTrue(warmup.is_ready())
+
+        freeze.assert_not_called()
+        self.assertEqual(self.snapshots.snapshots['rvus'].quarters, [get_service_quarter(date.today())])
+
+    def test_ready_without_warm_up(self):
+        with mock.patch.object(warmup, 'CACHE_WARMUP', False):
+            warmup.warm_up()
+            self.assertTrue(warmup.is_ready())
+        self.assertEqual(self.snapshots.snapshots['rvus'].quarters, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
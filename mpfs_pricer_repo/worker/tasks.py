@@ -1,8 +1,21 @@
 import os
+from typing import List
 import celery
-import pybrake
-from pybrake.celery import patch_celery
-from mpfs_pricer import pricer
+from celery.signals import task_postrun, worker_init, worker_process_init
+from celery.utils import uuid
+from kombu import serialization
+from mpfs_pricer import claim_schema, metrics, startup, warmup
+from mpfs_pricer.redis_client import get_redis
+
+# Payloads with more claims are split into chunks priced in parallel by the workers. 0 disables chunking.
+CLAIM_CHUNK_SIZE = int(os.environ.get('CLAIM_CHUNK_SIZE', '200'))
+
+# Redis counters of the chunks priced per payload, keyed by the task id of the payload
+PROGRESS_KEY_PREFIX = "mpfs_pricer:progress:"
+
+# Task messages and results are encoded with orjson, messages of the json serializer are still accepted
+serialization.register('orjson', claim_schema.dumps, claim_schema.loads,
+                       content_type='application/x-orjson', content_encoding='binary')
 
 app = celery.Celery('mpfs_pricer')
 
@@ -10,17 +23,115 @@ app.conf.update(
     broker_url=os.environ.get('REDIS_URL', 'redis://localhost:6379'),
     result_backend=os.environ.get('REDIS_URL', 'redis://localhost:6379'),
     task_default_queue="mpfs",
+    task_serializer='orjson',
+    result_serializer='orjson',
+    accept_content=['orjson', 'json'],
+    result_accept_content=['orjson', 'json'],
 )
 
+if warmup.CACHE_WARMUP:
+    # Worker processes only take tasks once their caches are warm, they warm up when the main process couldn't
+    app.conf.worker_proc_alive_timeout = warmup.CACHE_WARMUP_TIMEOUT
+
 airbrake_project_id = os.environ.get('AIRBRAKE_PROJECT_ID', '')
 airbrake_project_key = os.environ.get('AIRBRAKE_PROJECT_KEY', '')
 if airbrake_project_id != '' and airbrake_project_key != '':
+    import pybrake
+    from pybrake.celery import patch_celery
+
     notifier = pybrake.Notifier(project_id=airbrake_project_id,
                                 project_key=airbrake_project_key,
                                 environment="production")
     patch_celery(notifier)
 
 
+@worker_init.connect
+def preload_modules(**kwargs):
+    # Imported and loaded once by the main process, the pool processes inherit them
+    startup.preload()
+    warmup.preload_caches()
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    if metrics.METRICS_ENABLED:
+        metrics.start_exporter()
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    warmup.warm_up()
+
+
+@task_postrun.connect
+def flush_metrics(**kwargs):
+    if metrics.METRICS_ENABLED:
+        metrics.recorder.flush()
+
+
+def price_claims_to_dicts(claims: list) -> List[dict]:
+    # The REST API imports the tasks to send them, the pricer is only imported where claims are priced
+    from mpfs_pricer import pricer
+
+    priced_claims = pricer.price_claims(claim_schema.from_compact(claims))
+    return [pricer.priced_claim_to_dict(priced_claim) for priced_claim in priced_claims]
+
+
+def split_claims(claims: list, chunk_size: int) -> List[list]:
+    return [claims[start:start + chunk_size] for start in range(0, len(claims), chunk_size)]
+
+
+def get_progress(chunks_done: int, chunks: int) -> dict:
+    return {'chunks_done': chunks_done, 'chunks': chunks}
+
+
+def store_chunk_progress(task, parent_task_id: str, chunks: int):
+    """
+    Counts a priced chunk of the payload and stores the progress of the payload. Chunks finishing together
+    store their progress one at a time, in the order of the counter, so progress never goes backwards.
+    """
+    redis = get_redis()
+    key = f"{PROGRESS_KEY_PREFIX}{parent_task_id}"
+    with redis.lock(f"{key}:lock", timeout=30):
+        chunks_done = redis.incr(key)
+        redis.expire(key, app.conf.result_expires)
+        task.update_state(task_id=parent_task_id, state='PROGRESS', meta=get_progress(min(chunks_done, chunks), chunks))
+
+
+@app.task(bind=True)
+def price_claim_data(self, data):
+    """
+    Prices the submitted claims, in the compact form of claim_schema (or as validated claims when the task is
+    called directly). Payloads larger than CLAIM_CHUNK_SIZE are
+    replaced by a chord of chunk tasks, the chord callback inherits the task id so the priced claims are stored
+    under it as before.
+    """
+    if self.request.called_directly or CLAIM_CHUNK_SIZE <= 0 or len(data) <= CLAIM_CHUNK_SIZE:
+        return price_claims_to_dicts(data)
+
+    chunks = split_claims(data, CLAIM_CHUNK_SIZE)
+    chunk_task_ids = [uuid() for _ in chunks]
+    header = celery.group([
+        price_claim_chunk.s(chunk, self.request.id, chunk_task_ids).set(task_id=chunk_task_id)
+        for chunk, chunk_task_id in zip(chunks, chunk_task_ids)
+    ])
+    if not self.request.is_eager:
+        self.update_state(state='PROGRESS', meta=get_progress(0, len(chunks)))
+
+    return self.replace(celery.chord(header, join_priced_chunks.s()))
+
+
+@app.task(bind=True)
+def price_claim_chunk(self, claims, parent_task_id, chunk_task_ids):
+    priced_claims = price_claims_to_dicts(claims)
+
+    if not self.request.is_eager:
+        # Progress is stored before the chunk result, so the chord callback always stores the final state last
+        store_chunk_progress(self, parent_task_id, len(chunk_task_ids))
+
+    return priced_claims
+
+
 @app.task
-def price_claim_data(data):
-    return [pricer.price_claim(claim) for claim in data]
+def join_priced_chunks(priced_chunks):
+    return [priced_claim for priced_chunk in priced_chunks for priced_claim in priced_chunk]
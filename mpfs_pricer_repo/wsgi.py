@@ -1,4 +1,19 @@
+from mpfs_pricer import startup, warmup
 from restapi.app import app
 
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    # Not running under uWSGI
+    postfork = None
+
+if postfork is not None:
+    # Imported once by the uWSGI master: workers, respawned ones included, inherit them when forked
+    startup.preload(startup.PRELOAD_MODULES + ["worker.tasks"])
+    warmup.preload_caches()
+
+    # Starts the reference watcher of every worker, which only warms its own caches when the master couldn't
+    postfork(warmup.warm_up)
+
 if __name__ == "__main__":
     app.run()